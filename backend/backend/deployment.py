@@ -8,6 +8,8 @@ DEBUG = False
 SECRET_KEY = os.environ['MY_SECRET_KEY']
 
 MIDDLEWARE = [
+    'budgetmanager.middleware.RequestTimingMiddleware', # first, so its total covers the whole stack
+    'budgetmanager.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -19,6 +21,22 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# request timing is switched on with the REQUEST_TIMING_ENABLED app setting, for a sample of the requests
+REQUEST_TIMING_ENABLED = os.environ.get('REQUEST_TIMING_ENABLED', '').lower() in ('1', 'true', 'yes')
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', '0.1'))
+
+# App Service runs several workers, live events travel between them through the database
+BUDGET_EVENTS_BACKEND = 'budgetmanager.events.DatabaseBackend'
+
+# cache shared by the workers through the primary database (table created by build_script.sh), for entries that are
+# invalidated on writes: a per worker cache would only drop them in the worker that served the write
+CACHES["shared"] = {
+    "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+    "LOCATION": "budgetmanager_shared_cache",
+}
+MEMBERSHIP_CACHE_ALIAS = "shared"
+USER_STATUS_CACHE_ALIAS = "shared"
+
 CORS_ALLOWED_ORIGINS = [
     'https://victorious-mushroom-0edb7f303.5.azurestaticapps.net'
 ]
@@ -45,4 +63,19 @@ DATABASES = {
     }
 }
 
+# optional read replica of the Azure PostgreSQL server, same format as the primary's connection string
+REPLICA_CONNECTION = os.environ.get('AZURE_POSTGRESQL_REPLICA_CONNECTIONSTRING')
+if REPLICA_CONNECTION:
+    REPLICA_CONNECTION_STR = {pair.split('=')[0]:pair.split('=')[1] for pair in REPLICA_CONNECTION.split(' ')}
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": REPLICA_CONNECTION_STR['dbname'],
+        "HOST": REPLICA_CONNECTION_STR['host'],
+        "USER": REPLICA_CONNECTION_STR['user'],
+        "PASSWORD": REPLICA_CONNECTION_STR['password'],
+    }
+    DATABASE_REPLICAS = ["replica"]
+    # the workers share the users who wrote recently
+    DATABASE_REPLICA_STICKY_CACHE_ALIAS = "shared"
+
 STATIC_ROOT = BASE_DIR/'staticfiles'
\ No newline at end of file
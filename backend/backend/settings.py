@@ -47,7 +47,9 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # builds request.user from the token claims instead of fetching the User row on every request,
+        # switch back to 'rest_framework_simplejwt.authentication.JWTAuthentication' for a per-request lookup
+        'budgetmanager.authentication.StatelessJWTAuthentication',
     )
 }
 
@@ -62,6 +64,8 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    'budgetmanager.middleware.RequestTimingMiddleware', # first, so its total covers the whole stack
+    'budgetmanager.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -100,7 +104,122 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # a local stand-in for a read replica (same database file, mirrored in tests), unused unless listed in DATABASE_REPLICAS
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# read replicas, see budgetmanager/routing.py
+DATABASE_ROUTERS = ['budgetmanager.routing.ReplicaRouter']
+DATABASE_REPLICAS = [] # aliases of DATABASES that safe-method requests read from
+DATABASE_REPLICA_STICKY_SECONDS = 5 # a user reads from the primary for this long after a write, 0 disables it
+# cache remembering the recent writers, it has to be shared between workers (not the local memory cache below),
+# checked at startup as soon as DATABASE_REPLICAS isn't empty
+DATABASE_REPLICA_STICKY_CACHE_ALIAS = 'default'
+DATABASE_REPLICA_HEALTH_INTERVAL = 10 # seconds between replica health checks per worker
+DATABASE_REPLICA_MAX_LAG_SECONDS = 30 # replicas further behind the primary are skipped (PostgreSQL only)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# the local memory cache is bounded by MAX_ENTRIES and private to each worker process,
+# point it to a shared backend (e.g. Redis or Memcached) when running several workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # rendered responses of per-budget read endpoints, least recently used ones are evicted beyond MAX_BYTES per worker
+    # (any other backend works too, e.g. FileBasedCache or a shared Redis cache)
+    'responses': {
+        'BACKEND': 'budgetmanager.responsecache.LRUMemoryCache',
+        'OPTIONS': {
+            'MAX_BYTES': 64 * 1024 * 1024,
+        },
+    },
+}
+
+# response cache of the operations, members and user access lists (budgetmanager/responsecache.py)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TIMEOUT = 300 # seconds, entries of older budget versions are unreachable anyway and only wait for eviction
+RESPONSE_CACHE_MAX_ENTRY_BYTES = 1024 * 1024 # larger responses aren't cached
+
+# budget membership/role cache used by permission checks (budgetmanager/membership.py)
+MEMBERSHIP_CACHE_ALIAS = 'default' # invalidations only reach the other workers through a shared cache (see deployment.py)
+MEMBERSHIP_CACHE_TIMEOUT = 60 # seconds, bounds staleness for workers that can't see each other's invalidations
+
+# active/deleted status of token users checked by StatelessJWTAuthentication (budgetmanager/authentication.py)
+USER_STATUS_CACHE_ALIAS = 'default'
+USER_STATUS_CACHE_TIMEOUT = 30 # seconds, how long another worker may still accept a deactivated account
+
+# operation categories/types cached in every worker (budgetmanager/reference.py)
+REFERENCE_DATA_CACHE_ALIAS = 'default'
+REFERENCE_DATA_CACHE_TIMEOUT = 300 # seconds, bounds staleness for workers that can't see each other's invalidations
+REFERENCE_DATA_MAX_AGE = 86400 # Cache-Control max-age of the operation-categories/ and operation-types/ responses
+
+# largest list accepted by budget-managers/<id>/operations/bulk-add/, bounds the memory a single request can take
+OPERATION_BULK_MAX_BATCH_SIZE = 500
+
+# largest list of ids accepted by the access-requests/batch/ and user-access/batch/ endpoints
+ACCESS_BATCH_MAX_SIZE = 200
+
+# rows validated and inserted together by the CSV importer (budgetmanager/importers.py)
+OPERATION_IMPORT_CHUNK_SIZE = 1000
+
+# rows fetched per round trip by the streaming export (budgetmanager/exporters.py)
+OPERATION_EXPORT_CHUNK_SIZE = 2000
+
+# registration emails are queued in the database and sent by `manage.py run_email_outbox` (budgetmanager/mail.py)
+EMAIL_OUTBOX_TRANSPORT = 'budgetmanager.mail.WebhookTransport' # budgetmanager.mail.LocmemTransport keeps emails in memory
+EMAIL_WEBHOOK_URL = 'https://prod2-01.germanywestcentral.logic.azure.com:443/workflows/2ea9f7197eb545cd8bca2e4845cedc0d/triggers/When_a_HTTP_request_is_received/paths/invoke?api-version=2016-10-01&sp=%2Ftriggers%2FWhen_a_HTTP_request_is_received%2Frun&sv=1.0&sig=HKgkkRmRKlDPNilqpFhWTtr1BeHEA6PGANXifu3K5ao'
+EMAIL_WEBHOOK_TIMEOUT = (3.05, 10) # (connect, read) seconds
+EMAIL_OUTBOX_MAX_ATTEMPTS = 8 # failed sends after which an email is moved to dead letters
+EMAIL_OUTBOX_BACKOFF_BASE_SECONDS = 30 # delay after the first failure, doubled after every next one
+EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = 3600
+EMAIL_OUTBOX_LEASE_SECONDS = 300 # how long a claimed email is hidden from other workers
+
+# deleted budget managers are hidden at once and purged by `manage.py purge_deleted_budgets` (budgetmanager/deletion.py)
+BUDGET_DELETION_CHUNK_SIZE = 1000 # rows deleted per transaction, bounds how long the purge holds its locks
+BUDGET_DELETION_LEASE_SECONDS = 300 # how long a purge in progress is hidden from other workers
+
+# live change events streamed by api/async/budget-managers/<id>/events/ (budgetmanager/events.py)
+BUDGET_EVENTS_BACKEND = 'budgetmanager.events.LocalBackend' # budgetmanager.events.DatabaseBackend shares events between workers
+BUDGET_EVENTS_POLL_INTERVAL = 1.0 # seconds between polls of the DatabaseBackend
+BUDGET_EVENTS_RETENTION_SECONDS = 300 # how long the DatabaseBackend keeps published events
+BUDGET_EVENTS_QUEUE_SIZE = 100 # unread events after which a stream is closed with an overflow event
+BUDGET_EVENTS_HEARTBEAT_SECONDS = 15
+BUDGET_EVENTS_MAX_STREAM_SECONDS = 3600 # streams also end when their access token expires
+
+# per-request query count and timings (budgetmanager/middleware.py), logged to 'budgetmanager.timing'
+REQUEST_TIMING_ENABLED = False # when off the middleware removes itself from the stack
+REQUEST_TIMING_SAMPLE_RATE = 1.0 # fraction of the requests that are instrumented
+REQUEST_TIMING_SLOW_MS = 500 # requests taking longer also log their SQL
+REQUEST_TIMING_MAX_LOGGED_QUERIES = 50
+REQUEST_TIMING_SERVER_TIMING = True # send the timings in a Server-Timing response header
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'budgetmanager.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -0,0 +1,161 @@
+"""
+Concurrency benchmark of the sync (WSGI) and async (ASGI) read endpoints under many concurrent, optionally slow, clients.
+
+Start the same project under both servers (see README.md in this directory), then e.g.:
+
+    python benchmarks/concurrency.py --username demo --password demo \
+        --target wsgi=http://127.0.0.1:8000/api/budget-managers/1/operations/ \
+        --target asgi=http://127.0.0.1:8001/api/async/budget-managers/1/operations/ \
+        --connections 200 --requests 2000 --slow-client-delay 0.5
+
+Only the standard library is used, every request opens its own connection (Connection: close) so a slow client
+holds a server connection for the whole time it takes to send its request.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+def login(base_url, username, password):
+    request = urllib.request.Request(
+        f'{base_url}/api/login/',
+        data=json.dumps({'username': username, 'password': password}).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)['access']
+
+def build_request(url, token):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path = f'{path}?{parts.query}'
+    lines = [
+        f'GET {path} HTTP/1.1',
+        f'Host: {parts.netloc}',
+        'Accept: application/json',
+        'Connection: close',
+    ]
+    if token:
+        lines.append(f'Authorization: Bearer {token}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('ascii')
+
+async def fetch(host, port, payload, slow_client_delay, timeout):
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        if slow_client_delay:
+            # a slow client: the request line arrives right away, the rest of the headers only after the delay
+            split = payload.index(b'\r\n') + 2
+            writer.write(payload[:split])
+            await writer.drain()
+            await asyncio.sleep(slow_client_delay)
+            writer.write(payload[split:])
+        else:
+            writer.write(payload)
+        await writer.drain()
+
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+
+    status = int(response.split(b' ', 2)[1]) if response.startswith(b'HTTP/') else 0
+    return status, time.perf_counter() - started
+
+async def run_target(url, token, connections, requests, slow_client_delay, timeout):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    payload = build_request(url, token)
+
+    latencies = []
+    statuses = {}
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            try:
+                status, latency = await fetch(host, port, payload, slow_client_delay, timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                errors += 1
+                continue
+            statuses[status] = statuses.get(status, 0) + 1
+            latencies.append(latency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, statuses, errors, elapsed)
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+def summarize(latencies, statuses, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': statuses,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+            'p50': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+            'max': round(latencies[-1] * 1000, 1) if latencies else None,
+        },
+    }
+
+def parse_target(value):
+    label, separator, url = value.partition('=')
+    if not separator or not url.startswith('http://'):
+        raise argparse.ArgumentTypeError('expected LABEL=http://host:port/path')
+    return label, url
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', type=parse_target, action='append', required=True, help='LABEL=URL, repeatable')
+    parser.add_argument('--token', help='JWT access token (or use --username/--password)')
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--connections', type=int, default=100, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per target')
+    parser.add_argument('--slow-client-delay', type=float, default=0.0, help='seconds each client stalls mid-request')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for label, url in args.target:
+        token = args.token
+        if token is None and args.username:
+            parts = urlsplit(url)
+            token = login(f'{parts.scheme}://{parts.netloc}', args.username, args.password)
+
+        results[label] = asyncio.run(run_target(url, token, args.connections, args.requests, args.slow_client_delay, args.timeout))
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f'{"target":<10} {"ok":>7} {"errors":>7} {"req/s":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}  statuses')
+    for label, result in results.items():
+        latency = result['latency_ms']
+        print(
+            f'{label:<10} {result["requests"]:>7} {result["errors"]:>7} {result["throughput_rps"] or 0:>8} '
+            f'{latency["p50"] or 0:>9} {latency["p95"] or 0:>9} {latency["p99"] or 0:>9} {latency["max"] or 0:>9}  {result["statuses"]}'
+        )
+
+if __name__ == '__main__':
+    main()
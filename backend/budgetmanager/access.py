@@ -0,0 +1,133 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .membership import invalidate_role
+from .models import BudgetManager, UserAccess, AccessRequest
+from . import events
+
+# batch decisions of a budget admin: accepting/denying access requests and changing member roles
+# - the affected rows are read and locked (SELECT ... FOR UPDATE, in id order) with one query, every item is checked
+#   against them and the changes are written with bulk_update/bulk_create in the same transaction
+# - a request that is no longer pending when its row is locked was decided by a concurrent request meanwhile and is
+#   reported as a conflict instead of being decided twice
+# - memberships can't be locked before they exist: a user added by a concurrent request (single accept, invite) after
+#   the member check is reported as already_member, their request stays pending (_create_memberships)
+# - bulk writes skip the model signals, so the membership cache and the budget version are updated here (see signals.py)
+# every id gets an outcome, in the order of the ids; items that can't be applied don't stop the others
+
+# outcomes besides the new status/role
+NOT_FOUND = 'not_found'
+CONFLICT = 'conflict'
+ALREADY_MEMBER = 'already_member'
+UNCHANGED = 'unchanged'
+FORBIDDEN = 'forbidden'
+
+def _outcome(item_id, outcome, detail=None):
+    result = {'id': item_id, 'outcome': outcome}
+    if detail:
+        result['detail'] = detail
+    return result
+
+# read only memberships for the users, returns the ids of the users who became members
+def _create_memberships(budget_manager_id, user_ids):
+    members = [UserAccess(user_id=user_id, budget_manager_id=budget_manager_id, role=UserAccess.READ_ONLY) for user_id in user_ids]
+    try:
+        with transaction.atomic():
+            UserAccess.objects.bulk_create(members)
+        return set(user_ids)
+    except IntegrityError:
+        # some of them became members since the check, the rest is inserted, skipping any further latecomers
+        existing = set(
+            UserAccess.objects.filter(budget_manager_id=budget_manager_id, user_id__in=user_ids)
+            .values_list('user_id', flat=True)
+        )
+        UserAccess.objects.bulk_create([member for member in members if member.user_id not in existing], ignore_conflicts=True)
+        return set(user_ids) - existing
+
+def decide_access_requests(budget_manager_id, ids, status):
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        access_requests = {
+            access_request.id: access_request
+            for access_request in AccessRequest.objects.select_for_update()
+            .filter(budget_manager_id=budget_manager_id, id__in=ids).order_by('id')
+        }
+        member_ids = set(
+            UserAccess.objects.filter(
+                budget_manager_id=budget_manager_id,
+                user_id__in={access_request.user_id for access_request in access_requests.values()}
+            ).values_list('user_id', flat=True)
+        )
+
+        results = {}
+        decided = []
+        for access_request_id in ids:
+            access_request = access_requests.get(access_request_id)
+            if access_request is None:
+                results[access_request_id] = _outcome(access_request_id, NOT_FOUND, "Access request does not exist.")
+            elif access_request.status != AccessRequest.PENDING:
+                results[access_request_id] = _outcome(access_request_id, CONFLICT, f"Access request has already been {access_request.status}.")
+            elif status == AccessRequest.ACCEPTED and access_request.user_id in member_ids:
+                results[access_request_id] = _outcome(access_request_id, ALREADY_MEMBER, "User already has access to this budget manager.")
+            else:
+                decided.append(access_request)
+                if status == AccessRequest.ACCEPTED:
+                    # two requests of the same user in one batch give a single membership
+                    member_ids.add(access_request.user_id)
+                results[access_request_id] = _outcome(access_request_id, status)
+
+        new_member_ids = set()
+        if decided and status == AccessRequest.ACCEPTED:
+            new_member_ids = _create_memberships(budget_manager_id, [access_request.user_id for access_request in decided])
+            for access_request in decided:
+                if access_request.user_id not in new_member_ids:
+                    results[access_request.id] = _outcome(access_request.id, ALREADY_MEMBER, "User already has access to this budget manager.")
+            decided = [access_request for access_request in decided if access_request.user_id in new_member_ids]
+
+        if decided:
+            now = timezone.now()
+            for access_request in decided:
+                access_request.status = status
+                access_request.updated_at = now # auto_now isn't applied by bulk_update
+            AccessRequest.objects.bulk_update(decided, ['status', 'updated_at'])
+            for user_id in new_member_ids:
+                invalidate_role(user_id, budget_manager_id)
+            BudgetManager.objects.bump_version(budget_manager_id)
+            for access_request in decided:
+                events.publish(budget_manager_id, 'access_request.updated', id=access_request.id, user=access_request.user_id, status=status)
+
+    return [results[access_request_id] for access_request_id in ids]
+
+def change_roles(budget_manager_id, ids, role, admin_user_id):
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        user_accesses = {
+            user_access.id: user_access
+            for user_access in UserAccess.objects.select_for_update()
+            .filter(budget_manager_id=budget_manager_id, id__in=ids).order_by('id')
+        }
+
+        results = []
+        changed = []
+        for user_access_id in ids:
+            user_access = user_accesses.get(user_access_id)
+            if user_access is None:
+                results.append(_outcome(user_access_id, NOT_FOUND, "User access does not exist."))
+            elif user_access.role == UserAccess.ADMIN or user_access.user_id == admin_user_id:
+                results.append(_outcome(user_access_id, FORBIDDEN, "Admin cannot downgrade their own role."))
+            elif user_access.role == role:
+                results.append(_outcome(user_access_id, UNCHANGED))
+            else:
+                user_access.role = role
+                changed.append(user_access)
+                results.append(_outcome(user_access_id, role))
+
+        if changed:
+            UserAccess.objects.bulk_update(changed, ['role'])
+            for user_access in changed:
+                invalidate_role(user_access.user_id, budget_manager_id)
+            BudgetManager.objects.bump_version(budget_manager_id)
+            for user_access in changed:
+                events.publish(budget_manager_id, 'member.updated', user=user_access.user_id, role=role)
+
+    return results
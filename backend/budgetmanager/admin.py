@@ -1,9 +1,56 @@
 from django.contrib import admin
-from .models import OperationCategory, OperationType, BudgetManager, Operation, UserAccess, AccessRequest
+from django.db import transaction
+from .models import OperationCategory, OperationType, BudgetManager, Operation, UserAccess, AccessRequest, OutboundEmail, BudgetDeletion
+from .deletion import delete_budget_manager
+from . import changes
+
+# operations edited through the admin panel go through the same bookkeeping as the API (rollups, budget version)
+class OperationAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            if change:
+                old_snapshot = changes.snapshot(Operation.objects.get(pk=obj.pk))
+                super().save_model(request, obj, form, change)
+                changes.operation_updated(old_snapshot, obj)
+            else:
+                super().save_model(request, obj, form, change)
+                changes.operations_created([obj])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            changes.operations_deleted([obj])
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            changes.operations_deleted(queryset)
+            super().delete_queryset(request, queryset)
+
+# budget managers deleted through the admin panel are purged in the background like those deleted through the API
+class BudgetManagerAdmin(admin.ModelAdmin):
+    def delete_model(self, request, obj):
+        delete_budget_manager(obj)
+
+    def delete_queryset(self, request, queryset):
+        for budget_manager in queryset:
+            delete_budget_manager(budget_manager)
 
 admin.site.register(OperationCategory)
 admin.site.register(OperationType)
-admin.site.register(BudgetManager)
-admin.site.register(Operation)
+admin.site.register(BudgetManager, BudgetManagerAdmin)
+admin.site.register(Operation, OperationAdmin)
 admin.site.register(UserAccess)
 admin.site.register(AccessRequest)
+
+# queued registration emails, dead letters can be retried by setting them back to pending
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to',)
+
+# purges of deleted budget managers with the rows deleted so far, see deletion.py
+@admin.register(BudgetDeletion)
+class BudgetDeletionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'budget_manager_id', 'status', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status',)
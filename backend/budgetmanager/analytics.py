@@ -0,0 +1,92 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Operation, OperationMonthlyRollup
+
+# dimensions an analytics query can be grouped by, mapped to the columns selected for each of them
+GROUP_BY_FIELDS = {
+    'month': ['month'],
+    'category': ['category_id', 'category__name'],
+    'type': ['type_id', 'type__name'],
+    'by': ['by_id', 'by__username'],
+}
+
+# grouping when the query doesn't name one, every dimension the monthly rollups can answer ('by' needs a scan of the operations)
+DEFAULT_GROUP_BY = ['month', 'category', 'type']
+
+# output keys for the selected columns so the response doesn't leak ORM lookup names
+OUTPUT_KEYS = {
+    'month': 'month',
+    'category_id': 'category',
+    'category__name': 'category_name',
+    'type_id': 'type',
+    'type__name': 'type_name',
+    'by_id': 'by',
+    'by__username': 'by_username',
+}
+
+# aggregates operations of a budget manager with a single GROUP BY query
+# the result size depends only on the number of distinct groups (months x categories x types x members), not on the number of operations
+def aggregate_operations(budget_manager_id, date_from=None, date_to=None, group_by=None):
+    group_by = group_by or list(DEFAULT_GROUP_BY)
+    columns = [column for dimension in group_by for column in GROUP_BY_FIELDS[dimension]]
+
+    # the monthly rollups cover every query that doesn't split by member and spans whole months
+    if 'by' not in group_by and is_month_aligned(date_from, date_to):
+        queryset = OperationMonthlyRollup.objects.filter(budget_manager_id=budget_manager_id, count__gt=0)
+        if date_from:
+            queryset = queryset.filter(month__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(month__lte=date_to)
+        rows = (
+            queryset.values(*columns)
+            .annotate(total=Sum('total'), count=Sum('count'))
+            .order_by(*columns)
+        )
+    else:
+        queryset = Operation.objects.filter(budget_manager_id=budget_manager_id)
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        if 'month' in group_by:
+            queryset = queryset.annotate(month=TruncMonth('date'))
+        rows = (
+            queryset.values(*columns)
+            .annotate(total=Sum('value'), count=Count('id'))
+            .order_by(*columns)
+        )
+
+    series = []
+    totals = {}
+    for row in rows:
+        item = {OUTPUT_KEYS[column]: row[column] for column in columns}
+        if 'month' in item:
+            item['month'] = item['month'].strftime('%Y-%m')
+        item['total'] = format_amount(row['total'])
+        item['count'] = row['count']
+        series.append(item)
+
+        if 'type' in group_by:
+            type_name = row['type__name']
+            totals[type_name] = totals.get(type_name, Decimal('0')) + Decimal(row['total'])
+
+    return {
+        'group_by': group_by,
+        'date_from': date_from,
+        'date_to': date_to,
+        'totals': {type_name: format_amount(total) for type_name, total in totals.items()},
+        'series': series,
+    }
+
+# amounts are rendered the same way as Operation.value (a string with 2 decimal places)
+def format_amount(value):
+    return f'{Decimal(value):.2f}'
+
+
+# whether a date range starts on the first and ends on the last day of a month (open ends count as aligned)
+def is_month_aligned(date_from, date_to):
+    return (date_from is None or date_from.day == 1) and (date_to is None or (date_to + timedelta(days=1)).day == 1)
@@ -0,0 +1,12 @@
+from django.urls import path
+from .async_views import AsyncBudgetManagerListView, AsyncBudgetManagerMembersView, AsyncOperationListView, AsyncOperationAnalyticsView, AsyncBudgetEventsView
+
+# async (ASGI) read endpoints, same paths and responses as in urls.py under the api/async/ prefix,
+# and the live event stream that only exists here
+urlpatterns = [
+    path('budget-managers/', AsyncBudgetManagerListView.as_view(), name='async-budget-manager-list'), # GET for household budget managers
+    path('budget-managers/<int:budget_manager_id>/members/', AsyncBudgetManagerMembersView.as_view(), name='async-budget-manager-members'), # GET for members of a household budget
+    path('budget-managers/<int:budget_manager_id>/operations/', AsyncOperationListView.as_view(), name='async-operation-list'), # GET for operations within a household
+    path('budget-managers/<int:budget_manager_id>/analytics/', AsyncOperationAnalyticsView.as_view(), name='async-operation-analytics'), # GET for grouped operations
+    path('budget-managers/<int:budget_manager_id>/events/', AsyncBudgetEventsView.as_view(), name='async-budget-events'), # GET for a stream of the budget's change events (ASGI only)
+]
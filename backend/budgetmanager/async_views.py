@@ -0,0 +1,235 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+
+from .analytics import aggregate_operations
+from .authentication import StatelessJWTAuthentication
+from .conditional import budget_etag
+from .filters import filter_operations
+from .models import BudgetManager, Operation, UserAccess
+from .pagination import OperationCursorPagination
+from .permissions import AsyncIsAuthenticated, AsyncIsBudgetMember
+from .serializers import BudgetManagerSummarySerializer, OperationListSerializer, OperationCompactSerializer
+from .serializers import UserAccessSerializer, UserAccessCompactSerializer, OperationAnalyticsQuerySerializer, OperationListQuerySerializer
+from .utils import query_flag
+from . import events, membership
+
+# async (ASGI) versions of the hot read endpoints, served under api/async/ with the same responses as their api/ counterparts
+# authentication, permission checks and queries are awaited, so under an ASGI server (uvicorn, daphne) one worker
+# holds many concurrent slow clients instead of a thread per request; under WSGI the views still work but gain nothing
+# (see benchmarks/README.md for a comparison)
+# Django runs async ORM queries on a single database thread per worker, these views pay off for many slow or idle
+# connections, not for CPU or database bound load
+
+# DRF's APIView doesn't support async handlers, this base does the parts of it the read views need:
+# JWT authentication, async permission classes, APIException handling and DRF's JSON rendering
+class AsyncAPIView(View):
+    http_method_names = ['get', 'head', 'options']
+    authentication_class = StatelessJWTAuthentication
+    permission_classes = [AsyncIsAuthenticated]
+    renderer = JSONRenderer()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            await self.authenticate(request)
+            await self.check_permissions(request)
+
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            return await handler(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def authenticate(self, request):
+        authenticator = self.authentication_class()
+        request.authenticator = authenticator
+        try:
+            result = await authenticator.aauthenticate(request)
+        except exceptions.APIException:
+            request.user = AnonymousUser()
+            raise
+        request.user, request.auth = result if result is not None else (AnonymousUser(), None)
+
+    async def check_permissions(self, request):
+        for permission_class in self.permission_classes:
+            if not await permission_class().has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.status_code = status.HTTP_401_UNAUTHORIZED
+
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = self.render(data, status=exc.status_code)
+
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response.headers['WWW-Authenticate'] = self.authentication_class().authenticate_header(self.request)
+        return response
+
+    def render(self, data, status=status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), status=status, content_type=self.renderer.media_type)
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self}
+
+    # conditional GET on the budget manager's change counter, like BudgetVersionETagMixin of the sync views
+    async def get_budget_etag(self, request, budget_manager_id):
+        budget_manager = await membership.aget_budget_manager(request, budget_manager_id)
+        if budget_manager is None or not await membership.ais_member(request, budget_manager.id):
+            return None
+        return quote_etag(budget_etag(request, budget_manager, renderer_format=self.renderer.format))
+
+    def conditional_response(self, request, etag):
+        if etag is None:
+            return None
+        return self.add_validators(get_conditional_response(request, etag=etag), etag)
+
+    def add_validators(self, response, etag):
+        if response is not None and etag is not None and response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+class AsyncBudgetManagerListView(AsyncAPIView):
+    async def get(self, request):
+        queryset = BudgetManager.objects.with_summaries(request.user.id)
+
+        budget_managers = [budget_manager async for budget_manager in queryset]
+        serializer = BudgetManagerSummarySerializer(budget_managers, many=True, context=self.get_serializer_context())
+        return self.render(serializer.data)
+
+class AsyncBudgetManagerMembersView(AsyncAPIView):
+    async def get(self, request, budget_manager_id):
+        if await membership.aget_budget_manager(request, budget_manager_id) is None:
+            return self.render({"detail": "BudgetManager does not exist."}, status=status.HTTP_404_NOT_FOUND)
+
+        if not await membership.ais_member(request, budget_manager_id):
+            return self.render({"detail": "You do not have access to this BudgetManager."}, status=status.HTTP_403_FORBIDDEN)
+
+        etag = await self.get_budget_etag(request, budget_manager_id)
+        response = self.conditional_response(request, etag)
+        if response is not None:
+            return response
+
+        queryset = UserAccess.objects.filter(budget_manager_id=budget_manager_id).select_related('user', 'budget_manager__admin')
+        serializer_class = UserAccessCompactSerializer if query_flag(request, 'compact') else UserAccessSerializer
+        serializer = serializer_class([access async for access in queryset], many=True, context=self.get_serializer_context())
+        return self.add_validators(self.render(serializer.data), etag)
+
+class AsyncOperationListView(AsyncAPIView):
+    permission_classes = [AsyncIsAuthenticated, AsyncIsBudgetMember]
+
+    async def get(self, request, budget_manager_id):
+        etag = await self.get_budget_etag(request, budget_manager_id)
+        response = self.conditional_response(request, etag)
+        if response is not None:
+            return response
+
+        query_serializer = OperationListQuerySerializer(data=request.GET)
+        query_serializer.is_valid(raise_exception=True)
+        queryset = filter_operations(
+            Operation.objects.filter(budget_manager_id=budget_manager_id)
+            .select_related('by', 'category', 'type', 'budget_manager__admin'),
+            query_serializer.validated_data
+        )
+        serializer_class = OperationCompactSerializer if query_flag(request, 'compact') else OperationListSerializer
+
+        paginator = OperationCursorPagination()
+        page = await paginator.apaginate_queryset(queryset, request)
+        if page is None:
+            operations = [operation async for operation in queryset]
+            data = serializer_class(operations, many=True, context=self.get_serializer_context()).data
+        else:
+            serializer = serializer_class(page, many=True, context=self.get_serializer_context())
+            data = paginator.get_paginated_data(serializer.data)
+        return self.add_validators(self.render(data), etag)
+
+class AsyncOperationAnalyticsView(AsyncAPIView):
+    permission_classes = [AsyncIsAuthenticated, AsyncIsBudgetMember]
+
+    async def get(self, request, budget_manager_id):
+        query_serializer = OperationAnalyticsQuerySerializer(data=request.GET)
+        query_serializer.is_valid(raise_exception=True)
+
+        # a handful of aggregate queries, run on the database thread like the async ORM does
+        data = await sync_to_async(aggregate_operations)(budget_manager_id, **query_serializer.validated_data)
+        return self.render(data)
+
+# the events endpoint under a WSGI server
+class StreamingUnavailable(exceptions.APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'Live events are only served by the ASGI server.'
+    default_code = 'streaming_unavailable'
+
+# live change events of a budget manager as a text/event-stream (see events.py), needs an ASGI server: under WSGI
+# the stream would hold a worker thread for as long as it stays open and never receive the events (they are handed to
+# the event loop of the stream, which async_to_sync tears down), so it answers 501 there and clients rely on the delta sync
+# membership is checked when the stream opens, a member removed later gets a `revoked` event and the stream ends,
+# as does every stream of a deleted budget manager after its `budget.deleted` event;
+# the stream also ends when the access token expires (or after BUDGET_EVENTS_MAX_STREAM_SECONDS), the client
+# reconnects with a fresh token and catches up through operations/changes/
+class AsyncBudgetEventsView(AsyncAPIView):
+    permission_classes = [AsyncIsAuthenticated, AsyncIsBudgetMember]
+
+    async def get(self, request, budget_manager_id):
+        if not isinstance(request, ASGIRequest):
+            raise StreamingUnavailable()
+
+        expires_at = time.time() + getattr(settings, 'BUDGET_EVENTS_MAX_STREAM_SECONDS', 3600)
+        if request.auth is not None and 'exp' in request.auth:
+            expires_at = min(expires_at, request.auth['exp'])
+
+        response = StreamingHttpResponse(self.stream(budget_manager_id, request.user.id, expires_at), content_type='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no' # nginx would otherwise buffer the events
+        return response
+
+    # subscribed inside the generator, so a stream that is never started doesn't leave a subscription behind
+    async def stream(self, budget_manager_id, user_id, expires_at):
+        heartbeat = getattr(settings, 'BUDGET_EVENTS_HEARTBEAT_SECONDS', 15)
+        broker = events.get_broker()
+        subscription = broker.subscribe(budget_manager_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    yield self.format_event({'type': 'expired'})
+                    return
+
+                event = await subscription.get(min(heartbeat, remaining))
+                if event is None:
+                    yield ': heartbeat\n\n' # keeps proxies from closing an idle connection
+                    continue
+
+                if event['type'] == 'member.removed' and event.get('user') == user_id:
+                    yield self.format_event({'type': 'revoked'})
+                    return
+                yield self.format_event(event)
+                if event is events.OVERFLOW or event['type'] == 'budget.deleted':
+                    return
+        except asyncio.CancelledError:
+            raise # the client went away
+        finally:
+            broker.unsubscribe(subscription)
+
+    def format_event(self, event):
+        data = {key: value for key, value in event.items() if key != 'type'}
+        return f"event: {event['type']}\ndata: {json.dumps(data)}\n\n"
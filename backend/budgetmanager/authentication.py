@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# user built from verified token claims (id and username, see CustomTokenObtainPairSerializer.get_token)
+# anything the claims don't cover is read from the full User row, loaded lazily and only once
+class ClaimsUser(TokenUser):
+    @cached_property
+    def full_user(self):
+        return User.objects.get(pk=self.id)
+
+    @property
+    def is_staff(self):
+        return self.full_user.is_staff
+
+    @property
+    def is_superuser(self):
+        return self.full_user.is_superuser
+
+    def __eq__(self, other):
+        if isinstance(other, (TokenUser, User)):
+            return self.id == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __getattr__(self, attr):
+        if attr == 'token' or attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.full_user, attr)
+
+# JWT authentication that doesn't fetch the User row on every request
+# deactivated, deleted and (with CHECK_REVOKE_TOKEN) password-changed accounts are still rejected,
+# their status is cached for USER_STATUS_CACHE_TIMEOUT seconds and dropped as soon as the user is saved or deleted
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        return self.user_from_status(validated_token, get_user_status(user_id))
+
+    # async counterpart of get_user for the ASGI views (async_views.py)
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        return self.user_from_status(validated_token, await aget_user_status(user_id))
+
+    # header parsing and token validation don't touch the database, only the user status lookup is awaited
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def user_from_status(self, validated_token, status):
+        if status is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        is_active, password_hash = status
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_hash:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return ClaimsUser(validated_token)
+
+def _cache():
+    return caches[getattr(settings, 'USER_STATUS_CACHE_ALIAS', 'default')]
+
+def _cache_key(user_id):
+    return f'budgetmanager:user-status:{user_id}'
+
+# (is_active, md5 of the password hash or None) of a user, None if the user doesn't exist
+def get_user_status(user_id):
+    cache_key = _cache_key(user_id)
+    status = _cache().get(cache_key)
+    if status is not None:
+        return status or None
+
+    row = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list('is_active', 'password').first()
+    if row is None:
+        status = ()
+    else:
+        is_active, password = row
+        status = (is_active, get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None)
+
+    _cache().set(cache_key, status, getattr(settings, 'USER_STATUS_CACHE_TIMEOUT', 30))
+    return status or None
+
+async def aget_user_status(user_id):
+    cache_key = _cache_key(user_id)
+    status = await _cache().aget(cache_key)
+    if status is not None:
+        return status or None
+
+    row = await User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list('is_active', 'password').afirst()
+    if row is None:
+        status = ()
+    else:
+        is_active, password = row
+        status = (is_active, get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None)
+
+    await _cache().aset(cache_key, status, getattr(settings, 'USER_STATUS_CACHE_TIMEOUT', 30))
+    return status or None
+
+def invalidate_user_status(user_id):
+    _cache().delete(_cache_key(user_id))
+
+# user id of a request's valid access token without touching the database or the cache, None without one
+# (for middleware running before DRF's authentication)
+def token_user_id(request):
+    authenticator = StatelessJWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+
+    try:
+        validated_token = authenticator.get_validated_token(raw_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return validated_token.get(api_settings.USER_ID_CLAIM)
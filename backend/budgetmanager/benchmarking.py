@@ -0,0 +1,464 @@
+import io
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import OperationCategory, OperationType, BudgetManager, Operation, UserAccess, AccessRequest
+from .serializers import CustomTokenObtainPairSerializer
+from . import async_urls, reference, rollups, urls
+
+# reproducible benchmark suite of the API endpoints (manage.py seed_benchmark_data / benchmark_endpoints)
+# - generate_dataset builds households from a seed, the same arguments always give the same data
+# - run_benchmarks sends requests to every URL of urls.py and async_urls.py through the Django test client,
+#   timing them and counting their SQL queries; writes are rolled back so the dataset stays unchanged
+# - compare_reports diffs two JSON reports (e.g. of two commits) and lists latency and query count regressions
+
+USERNAME_PREFIX = 'bench'
+PASSWORD = 'BenchmarkPassw0rd!' # passes the registration password rules
+
+DEFAULT_CATEGORIES = ['Food', 'Housing', 'Transport', 'Utilities', 'Health', 'Entertainment', 'Salary', 'Other']
+DEFAULT_TYPES = ['Income', 'Expense']
+TITLES = ['Groceries', 'Rent', 'Bus ticket', 'Electricity', 'Pharmacy', 'Cinema', 'Salary', 'Restaurant', 'Fuel', 'Internet']
+
+def _username(seed, number):
+    return f'{USERNAME_PREFIX}-{seed}-{number}'
+
+def clear_dataset(seed):
+    # budget managers, operations, memberships and requests of the users go with them (CASCADE)
+    return User.objects.filter(username__startswith=f'{USERNAME_PREFIX}-{seed}-').delete()[0]
+
+# households: budget managers, each owned by its own admin user
+# users: the pool of non-admin users that memberships and access requests are drawn from (UserAccess fan-out)
+# operations are spread over `days` days ending on end_date, inserted chunk_size rows per bulk_create
+def generate_dataset(seed=1, households=10, users=50, members=3, operations=10000, access_requests=5,
+                     days=730, end_date=date(2024, 6, 30), chunk_size=5000, log=None):
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+
+    if User.objects.filter(username__startswith=f'{USERNAME_PREFIX}-{seed}-').exists():
+        raise ValueError(f'A dataset with seed {seed} already exists, clear it first.')
+
+    categories = list(OperationCategory.objects.order_by('id'))
+    if not categories:
+        categories = [OperationCategory.objects.create(name=name) for name in DEFAULT_CATEGORIES]
+    types = list(OperationType.objects.order_by('id'))
+    if not types:
+        types = [OperationType.objects.create(name=name) for name in DEFAULT_TYPES]
+    reference.bump_version()
+
+    # hashing is deliberately slow, every benchmark user shares one hash of PASSWORD
+    password = make_password(PASSWORD)
+    admins = User.objects.bulk_create([
+        User(username=_username(seed, f'admin-{number}'), email=f'admin-{number}@example.com', password=password)
+        for number in range(households)
+    ])
+    pool = User.objects.bulk_create([
+        User(username=_username(seed, f'user-{number}'), email=f'user-{number}@example.com', password=password)
+        for number in range(users)
+    ])
+    log(f'Created {len(admins) + len(pool)} users.')
+
+    budget_managers = BudgetManager.objects.bulk_create([
+        BudgetManager(name=f'Household {number}', admin=admin) for number, admin in enumerate(admins)
+    ])
+
+    accesses = []
+    requests = []
+    for budget_manager, admin in zip(budget_managers, admins):
+        accesses.append(UserAccess(user=admin, budget_manager=budget_manager, role=UserAccess.ADMIN))
+        chosen = rng.sample(pool, min(len(pool), members + access_requests))
+        for user in chosen[:members]:
+            accesses.append(UserAccess(user=user, budget_manager=budget_manager, role=rng.choice([UserAccess.READ_ONLY, UserAccess.EDIT])))
+        for user in chosen[members:]:
+            requests.append(AccessRequest(user=user, budget_manager=budget_manager))
+    UserAccess.objects.bulk_create(accesses, batch_size=chunk_size)
+    AccessRequest.objects.bulk_create(requests, batch_size=chunk_size)
+    log(f'Created {len(budget_managers)} budget managers, {len(accesses)} memberships and {len(requests)} access requests.')
+
+    members_by_budget = {}
+    for access in accesses:
+        members_by_budget.setdefault(access.budget_manager_id, []).append(access.user)
+
+    created = 0
+    for budget_manager in budget_managers:
+        budget_members = members_by_budget[budget_manager.id]
+        remaining = operations
+        while remaining:
+            count = min(chunk_size, remaining)
+            Operation.objects.bulk_create([
+                Operation(
+                    budget_manager=budget_manager,
+                    type=rng.choice(types),
+                    date=end_date - timedelta(days=rng.randrange(days)),
+                    title=rng.choice(TITLES),
+                    category=rng.choice(categories),
+                    value=Decimal(rng.randrange(100, 500000)) / 100,
+                    by=rng.choice(budget_members),
+                )
+                for _ in range(count)
+            ])
+            remaining -= count
+            created += count
+        log(f'Created {created} operations.')
+
+    budget_manager_ids = [budget_manager.id for budget_manager in budget_managers]
+    rollups.rebuild_rollups(budget_manager_ids)
+    BudgetManager.objects.filter(id__in=budget_manager_ids).update(version=F('version') + 1)
+
+    return dataset_summary(seed)
+
+def dataset_summary(seed):
+    budget_managers = BudgetManager.objects.filter(admin__username__startswith=f'{USERNAME_PREFIX}-{seed}-')
+    return {
+        'seed': seed,
+        'users': User.objects.filter(username__startswith=f'{USERNAME_PREFIX}-{seed}-').count(),
+        'budget_managers': budget_managers.count(),
+        'memberships': UserAccess.objects.filter(budget_manager__in=budget_managers).count(),
+        'operations': Operation.objects.filter(budget_manager__in=budget_managers).count(),
+        'access_requests': AccessRequest.objects.filter(budget_manager__in=budget_managers, status=AccessRequest.PENDING).count(),
+    }
+
+# fixtures shared by the request specs, taken from the first household of the dataset
+class BenchmarkContext:
+    def __init__(self, seed):
+        self.seed = seed
+        self.budget_manager = (
+            BudgetManager.objects.filter(admin__username__startswith=f'{USERNAME_PREFIX}-{seed}-')
+            .select_related('admin').order_by('id').first()
+        )
+        if self.budget_manager is None:
+            raise ValueError(f'No dataset with seed {seed}, run seed_benchmark_data first.')
+
+        self.admin = self.budget_manager.admin
+        self.operation = Operation.objects.filter(budget_manager=self.budget_manager).order_by('-date', '-id').first()
+        self.member_access = (
+            UserAccess.objects.filter(budget_manager=self.budget_manager).exclude(role=UserAccess.ADMIN).order_by('id').first()
+        )
+        self.access_request = (
+            AccessRequest.objects.filter(budget_manager=self.budget_manager, status=AccessRequest.PENDING).order_by('id').first()
+        )
+        self.category = OperationCategory.objects.order_by('id').first()
+        self.type = OperationType.objects.order_by('id').first()
+        self.tokens = {}
+        self.counter = 0
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f'{prefix}-{self.counter}'
+
+    def token(self, user):
+        if user.id not in self.tokens:
+            self.tokens[user.id] = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+        return self.tokens[user.id]
+
+    # a user outside the household, created inside the rolled back transaction of a request
+    def outsider(self):
+        return User.objects.create(username=_username(self.seed, self.unique('outsider')), password=make_password(None))
+
+    def operation_payload(self):
+        return {
+            'type': self.type.id,
+            'date': '2024-06-01',
+            'title': 'Benchmark',
+            'category': self.category.id,
+            'value': '12.34',
+        }
+
+# one request sent to a URL: the URL name, the HTTP method and a function building the request from the context
+# build(ctx) runs inside the transaction that is rolled back after the request, its queries aren't counted;
+# it returns a dict with the URL kwargs, the request data, the user (None for anonymous requests) and
+# optionally a query string, a content format and a label telling variants of the same URL apart
+# requires names the context fixture the request can't be built without (skipped when the dataset lacks it)
+class RequestSpec:
+    def __init__(self, name, method, build, label=None, requires=None):
+        self.name = name
+        self.method = method
+        self.build = build
+        self.label = label or name
+        self.requires = requires
+
+def _budget(ctx, **extra):
+    return {'kwargs': {'budget_manager_id': ctx.budget_manager.id}, 'user': ctx.admin, **extra}
+
+def _csv_upload(ctx, rows=200):
+    lines = ['date,title,value,category'] + [f'2024-05-{1 + row % 28:02d},Imported {row},-{row + 1}.50,{ctx.category.name}' for row in range(rows)]
+    upload = io.BytesIO('\n'.join(lines).encode('utf-8'))
+    upload.name = 'operations.csv'
+    return upload
+
+def _confirm_email(ctx):
+    user = User.objects.create_user(username=_username(ctx.seed, ctx.unique('confirm')), password=None, is_active=False)
+    return {
+        'kwargs': {'uidb64': urlsafe_base64_encode(force_bytes(user.pk)), 'token': default_token_generator.make_token(user)},
+        'user': None,
+    }
+
+def _access_request(ctx):
+    outsider = ctx.outsider()
+    return {'data': {'unique_id': str(ctx.budget_manager.unique_id)}, 'user': outsider}
+
+# every pending request / non-admin membership of the budget in one batch
+def _access_request_batch(ctx):
+    ids = list(AccessRequest.objects.filter(budget_manager=ctx.budget_manager, status=AccessRequest.PENDING).values_list('id', flat=True))
+    return {'kwargs': {'budget_manager_id': ctx.budget_manager.id}, 'data': {'ids': ids, 'status': AccessRequest.ACCEPTED}, 'user': ctx.admin}
+
+def _user_access_batch(ctx):
+    ids = list(UserAccess.objects.filter(budget_manager=ctx.budget_manager).exclude(role=UserAccess.ADMIN).values_list('id', flat=True))
+    return {'kwargs': {'budget_manager_id': ctx.budget_manager.id}, 'data': {'ids': ids, 'role': UserAccess.EDIT}, 'user': ctx.admin}
+
+def _token_refresh(ctx):
+    return {'data': {'refresh': str(CustomTokenObtainPairSerializer.get_token(ctx.admin))}, 'user': None}
+
+def _budget_manager_delete(ctx):
+    budget_manager = BudgetManager.objects.create(name=ctx.unique('Disposable'), admin=ctx.admin)
+    UserAccess.objects.create(user=ctx.admin, budget_manager=budget_manager, role=UserAccess.ADMIN)
+    return {'kwargs': {'pk': budget_manager.id}, 'user': ctx.admin}
+
+REQUEST_SPECS = [
+    RequestSpec('register', 'post', lambda ctx: {
+        'data': {'username': _username(ctx.seed, ctx.unique('new')), 'email': 'new@example.com', 'password': PASSWORD}, 'user': None}),
+    RequestSpec('token_obtain_pair', 'post', lambda ctx: {'data': {'username': ctx.admin.username, 'password': PASSWORD}, 'user': None}),
+    RequestSpec('token_refresh', 'post', _token_refresh),
+    RequestSpec('email_confirm', 'post', _confirm_email),
+
+    RequestSpec('operation_category_list', 'get', lambda ctx: {'user': ctx.admin}),
+    RequestSpec('operation_type_list', 'get', lambda ctx: {'user': ctx.admin}),
+
+    RequestSpec('budget_manager_list_create', 'get', lambda ctx: {'user': ctx.admin}),
+    RequestSpec('budget_manager_list_create', 'post', lambda ctx: {'data': {'name': ctx.unique('Household')}, 'user': ctx.admin}),
+    RequestSpec('budget-manager-update', 'put', lambda ctx: {
+        'kwargs': {'pk': ctx.budget_manager.id}, 'data': {'name': ctx.unique('Renamed')}, 'user': ctx.admin}),
+    RequestSpec('budget-manager-delete', 'delete', _budget_manager_delete),
+
+    RequestSpec('budget-manager-bootstrap', 'get', lambda ctx: _budget(ctx)),
+    RequestSpec('budget-manager-bootstrap', 'get', lambda ctx: _budget(ctx, query='compact=true&unpaginated=true'), label='budget-manager-bootstrap?compact&unpaginated'),
+    RequestSpec('budget-manager-members', 'get', lambda ctx: _budget(ctx)),
+    RequestSpec('budget-manager-members', 'get', lambda ctx: _budget(ctx, query='compact=true'), label='budget-manager-members?compact'),
+
+    RequestSpec('operation-list', 'get', lambda ctx: _budget(ctx)),
+    RequestSpec('operation-list', 'get', lambda ctx: _budget(ctx, query='compact=true&page_size=500'), label='operation-list?compact&page_size=500'),
+    RequestSpec('operation-list', 'get', lambda ctx: _budget(ctx, query=f'category={ctx.category.id}&date_from=2024-01-01'),
+                label='operation-list?category&date_from'),
+    RequestSpec('operation-list', 'get', lambda ctx: _budget(ctx, query='ordering=-value&value_min=100'), label='operation-list?ordering=-value&value_min'),
+    RequestSpec('operation-changes', 'get', lambda ctx: _budget(ctx, query=f'since={max(ctx.budget_manager.version - 5, 0)}'), label='operation-changes?since'),
+    RequestSpec('operation-search', 'get', lambda ctx: _budget(ctx, query='q=elec'), label='operation-search?q=elec'),
+    RequestSpec('operation-search', 'get', lambda ctx: _budget(ctx, query='q=groceris'), label='operation-search?q=groceris'),
+    RequestSpec('operation-analytics', 'get', lambda ctx: _budget(ctx)),
+    RequestSpec('operation-analytics', 'get', lambda ctx: _budget(ctx, query='group_by=month,category,by'), label='operation-analytics?group_by=month,category,by'),
+    RequestSpec('operation-create', 'post', lambda ctx: _budget(ctx, data=ctx.operation_payload())),
+    RequestSpec('operation-bulk-create', 'post', lambda ctx: _budget(ctx, data=[ctx.operation_payload() for _ in range(50)], format='json')),
+    RequestSpec('operation-import', 'post', lambda ctx: _budget(ctx, data={'file': _csv_upload(ctx)}, format='multipart')),
+    RequestSpec('operation-export', 'get', lambda ctx: _budget(ctx)),
+    RequestSpec('operation-edit', 'patch', lambda ctx: {
+        'kwargs': {'budget_manager_id': ctx.budget_manager.id, 'pk': ctx.operation.id}, 'data': {'title': 'Edited'}, 'user': ctx.admin}, requires='operation'),
+    RequestSpec('operation-delete', 'delete', lambda ctx: {
+        'kwargs': {'budget_manager_id': ctx.budget_manager.id, 'pk': ctx.operation.id}, 'user': ctx.admin}, requires='operation'),
+
+    RequestSpec('user_access_list', 'get', lambda ctx: _budget(ctx)),
+    # the endpoint rejects a plain user id (its serializer nests the user), the 400 path is what gets measured
+    RequestSpec('user_access_create', 'post', lambda ctx: _budget(ctx, data={'user': ctx.outsider().id})),
+    RequestSpec('user-access-update', 'patch', lambda ctx: {
+        'kwargs': {'budget_manager_id': ctx.budget_manager.id, 'pk': ctx.member_access.id},
+        'data': {'role': UserAccess.EDIT if ctx.member_access.role == UserAccess.READ_ONLY else UserAccess.READ_ONLY}, 'user': ctx.admin}, requires='member_access'),
+    RequestSpec('user-access-delete', 'delete', lambda ctx: {
+        'kwargs': {'budget_manager_id': ctx.budget_manager.id, 'pk': ctx.member_access.id}, 'user': ctx.admin}, requires='member_access'),
+    RequestSpec('user-access-batch', 'post', _user_access_batch, requires='member_access'),
+
+    RequestSpec('access-request-create', 'post', _access_request),
+    RequestSpec('access-request-list', 'get', lambda ctx: _budget(ctx)),
+    RequestSpec('access-request-update', 'put', lambda ctx: {
+        'kwargs': {'budget_manager_id': ctx.budget_manager.id, 'pk': ctx.access_request.id},
+        'data': {'status': AccessRequest.ACCEPTED}, 'user': ctx.admin}, requires='access_request'),
+    RequestSpec('access-request-batch', 'post', _access_request_batch, requires='access_request'),
+
+    RequestSpec('async-budget-manager-list', 'get', lambda ctx: {'user': ctx.admin}),
+    RequestSpec('async-budget-manager-members', 'get', lambda ctx: _budget(ctx)),
+    RequestSpec('async-operation-list', 'get', lambda ctx: _budget(ctx)),
+    RequestSpec('async-operation-analytics', 'get', lambda ctx: _budget(ctx)),
+]
+
+# endpoints that can't be timed as a single request/response
+UNMEASURED = {
+    'async-budget-events': 'endless event stream',
+    'response-cache-stats': 'staff only counters of the benchmark worker',
+}
+
+def url_names():
+    return [pattern.name for pattern in urls.urlpatterns + async_urls.urlpatterns]
+
+def _client():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return Client(SERVER_NAME=hosts[0] if hosts else 'localhost')
+
+def _send(client, ctx, spec, request):
+    path = reverse(spec.name, kwargs=request.get('kwargs'))
+    if request.get('query'):
+        path = f'{path}?{request["query"]}'
+
+    headers = {}
+    if request.get('user') is not None:
+        headers['HTTP_AUTHORIZATION'] = f'Bearer {ctx.token(request["user"])}'
+
+    send = getattr(client, spec.method)
+    data = request.get('data')
+    content_format = request.get('format', 'json' if spec.method != 'get' else None)
+    if content_format == 'json':
+        response = send(path, data=json.dumps(data), content_type='application/json', **headers)
+    else:
+        response = send(path, data=data, **headers)
+
+    # streamed responses are only done once the last chunk has been produced
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+# sends the request once and rolls back whatever it wrote, returns (status code, seconds, query count)
+def _measure(client, ctx, spec):
+    with transaction.atomic():
+        request = spec.build(ctx)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = _send(client, ctx, spec, request)
+            elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+    return response.status_code, elapsed, len(queries)
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+# the first request of every spec runs with empty caches (cold), the timed iterations after it with warm caches
+def _run_specs(ctx, client, iterations, only, log):
+    results = []
+    covered = set()
+    for spec in REQUEST_SPECS:
+        covered.add(spec.name)
+        if only and not any(name in spec.label for name in only):
+            continue
+
+        if spec.requires and getattr(ctx, spec.requires) is None:
+            results.append({'label': spec.label, 'method': spec.method.upper(), 'skipped': f'the dataset has no {spec.requires}'})
+            continue
+
+        for cache in caches.all():
+            cache.clear()
+        cold_status, cold_time, cold_queries = _measure(client, ctx, spec)
+
+        timings = []
+        queries = []
+        statuses = set()
+        for _ in range(iterations):
+            response_status, elapsed, query_count = _measure(client, ctx, spec)
+            timings.append(elapsed * 1000)
+            queries.append(query_count)
+            statuses.add(response_status)
+
+        result = {
+            'label': spec.label,
+            'method': spec.method.upper(),
+            'status': sorted(statuses | {cold_status}),
+            'queries_cold': cold_queries,
+            'queries': max(queries) if queries else cold_queries,
+            'latency_ms': {
+                'cold': round(cold_time * 1000, 3),
+                'min': round(min(timings), 3) if timings else None,
+                'median': round(statistics.median(timings), 3) if timings else None,
+                'p95': round(_percentile(timings, 0.95), 3) if timings else None,
+                'max': round(max(timings), 3) if timings else None,
+            },
+        }
+        results.append(result)
+        log(f"{result['method']:<6} {spec.label:<50} {result['status']} {result['queries']:>3} queries  "
+            f"median {result['latency_ms']['median']} ms")
+
+    # URLs without a spec are listed, so a new endpoint can't silently drop out of the report
+    for name in url_names():
+        if name not in covered:
+            results.append({'label': name, 'method': None, 'skipped': UNMEASURED.get(name, 'no request spec in budgetmanager/benchmarking.py')})
+
+    return results
+
+def run_benchmarks(seed=1, iterations=10, only=None, log=None):
+    log = log or (lambda message: None)
+    ctx = BenchmarkContext(seed)
+    client = _client()
+
+    # expected 4xx responses would otherwise log a warning per request
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        results = _run_specs(ctx, client, iterations, only, log)
+    finally:
+        request_logger.setLevel(level)
+
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'dataset': dataset_summary(seed),
+        },
+        'endpoints': sorted(results, key=lambda result: (result['label'], result['method'] or '')),
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# regressions of `current` against `baseline`: more queries, a different status or a median latency
+# more than latency_threshold (fraction) and min_latency_ms slower
+def compare_reports(baseline, current, latency_threshold=0.25, min_latency_ms=1.0):
+    def key(result):
+        return (result['label'], result['method'])
+
+    baseline_results = {key(result): result for result in baseline['endpoints'] if 'skipped' not in result}
+    regressions = []
+    for result in current['endpoints']:
+        before = baseline_results.get(key(result))
+        if before is None or 'skipped' in result:
+            continue
+
+        name = f"{result['method']} {result['label']}"
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+        if result['queries_cold'] > before['queries_cold']:
+            regressions.append(f"{name}: {before['queries_cold']} -> {result['queries_cold']} queries with cold caches")
+        if result['status'] != before['status']:
+            regressions.append(f"{name}: status {before['status']} -> {result['status']}")
+
+        old_median, new_median = before['latency_ms']['median'], result['latency_ms']['median']
+        if old_median is not None and new_median is not None \
+                and new_median > old_median * (1 + latency_threshold) and new_median - old_median > min_latency_ms:
+            regressions.append(f"{name}: median {old_median} -> {new_median} ms")
+
+    return regressions
@@ -0,0 +1,73 @@
+from .models import BudgetManager, Operation, OperationTombstone
+from . import events, rollups
+
+# bookkeeping that has to happen in the same transaction as every Operation write:
+# - the monthly rollups (rollups.py)
+# - the change counter of the affected budget managers, which invalidates their ETags
+# - the change sequence of the written operations and tombstones of the deleted ones, read by the delta sync
+# - a change event for the live streams of the budget (events.py), sent when the transaction commits
+# Operation writes go through these functions instead of model signals so that bulk writes and cascading deletes stay cheap
+
+MAX_EVENT_IDS = 50 # larger writes publish their events without the ids, clients resync either way
+
+def snapshot(operation):
+    return rollups.snapshot(operation)
+
+def operations_created(operations):
+    rollups.add_operations(operations)
+    versions = bump_versions(operations)
+    mark_changed(operations, versions)
+    publish('operations.created', operations, versions)
+
+def operation_updated(old_snapshot, operation):
+    rollups.update_operation(old_snapshot, operation)
+    versions = bump_versions([operation])
+    mark_changed([operation], versions)
+    publish('operations.updated', [operation], versions)
+
+    # moved to another budget manager (admin panel), for the old one it's a delete
+    (old_budget_manager_id, *_), _ = old_snapshot
+    if old_budget_manager_id != operation.budget_manager_id:
+        old_version = bump_version(old_budget_manager_id)
+        OperationTombstone.objects.create(budget_manager_id=old_budget_manager_id, operation_id=operation.id, change_seq=old_version)
+        events.publish(old_budget_manager_id, 'operations.deleted', ids=[operation.id], version=old_version)
+
+# has to be called before the operations are deleted
+def operations_deleted(operations):
+    operations = list(operations)
+    rollups.remove_operations(operations)
+    versions = bump_versions(operations)
+    OperationTombstone.objects.bulk_create([
+        OperationTombstone(
+            budget_manager_id=operation.budget_manager_id,
+            operation_id=operation.id,
+            change_seq=versions[operation.budget_manager_id]
+        )
+        for operation in operations
+    ])
+    publish('operations.deleted', operations, versions)
+
+# bumps the change counter of every budget manager of the operations, returns {budget_manager_id: new version}
+# the UPDATE locks the budget manager row until commit, so writes to one budget get increasing versions in commit order
+def bump_versions(operations):
+    return {
+        budget_manager_id: bump_version(budget_manager_id)
+        for budget_manager_id in sorted({operation.budget_manager_id for operation in operations})
+    }
+
+def bump_version(budget_manager_id):
+    # all_objects: the admin panel can still reach operations of a deleted budget manager until they're purged
+    BudgetManager.all_objects.bump_version(budget_manager_id)
+    return BudgetManager.all_objects.filter(pk=budget_manager_id).values_list('version', flat=True).get()
+
+def mark_changed(operations, versions):
+    for budget_manager_id, version in versions.items():
+        changed = [operation for operation in operations if operation.budget_manager_id == budget_manager_id]
+        Operation.objects.filter(id__in=[operation.id for operation in changed]).update(change_seq=version)
+        for operation in changed:
+            operation.change_seq = version
+
+def publish(event_type, operations, versions):
+    for budget_manager_id, version in versions.items():
+        ids = [operation.id for operation in operations if operation.budget_manager_id == budget_manager_id]
+        events.publish(budget_manager_id, event_type, ids=ids if len(ids) <= MAX_EVENT_IDS else None, version=version)
@@ -0,0 +1,10 @@
+from django.core.checks import Error, Tags, register
+
+from . import routing
+
+@register(Tags.caches)
+def check_replica_sticky_cache(app_configs, **kwargs):
+    error = routing.sticky_cache_error()
+    if error is None:
+        return []
+    return [Error(error, id='budgetmanager.E001')]
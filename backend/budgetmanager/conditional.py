@@ -0,0 +1,57 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import membership
+
+# conditional GET for read views: ETag/Last-Modified validators and Cache-Control on every response,
+# If-None-Match/If-Modified-Since answered with 304 before the view touches its queryset or serializer
+# the validators are computed after authentication and permission checks, which still run for every request
+class ConditionalGetMixin:
+    cache_control = {'private': True, 'no_cache': True} # clients may keep a copy but have to revalidate it
+
+    # ETag value (without quotes) for the current state of the resource or None
+    def get_etag(self, request):
+        return None
+
+    # Last-Modified as a timestamp (seconds since epoch) or None
+    def get_last_modified(self, request):
+        return None
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        etag = quote_etag(etag) if etag else None
+        last_modified = self.get_last_modified(request)
+        last_modified = int(last_modified) if last_modified is not None else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            if etag:
+                response.headers['ETag'] = etag
+            if last_modified is not None:
+                response.headers['Last-Modified'] = http_date(last_modified)
+            if self.cache_control:
+                patch_cache_control(response, **self.cache_control)
+
+        return response
+
+# strong ETag of a per-budget read endpoint derived from the budget manager's change counter,
+# a matching If-None-Match costs one primary key lookup instead of the list query and serialization
+class BudgetVersionETagMixin(ConditionalGetMixin):
+    def get_etag(self, request):
+        budget_manager = membership.get_budget_manager(request, self.kwargs.get('budget_manager_id'))
+        # no validators for views that reject the request further down (missing budget, not a member)
+        if budget_manager is None or not membership.is_member(request, budget_manager.id):
+            return None
+        return budget_etag(request, budget_manager)
+
+# the same budget version renders differently per endpoint, query parameters (page, compact, ...) and format
+def budget_etag(request, budget_manager, renderer_format=None):
+    renderer_format = renderer_format or request.accepted_renderer.format
+    variant = f'{request.path}?{request.META.get("QUERY_STRING", "")}|{renderer_format}'
+    variant_hash = hashlib.sha1(variant.encode('utf-8')).hexdigest()[:16]
+    return f'{budget_manager.id}-{budget_manager.version}-{variant_hash}'
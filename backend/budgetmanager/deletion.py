@@ -0,0 +1,104 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from .membership import invalidate_role
+from .models import BudgetManager, Operation, UserAccess, AccessRequest, OperationMonthlyRollup, OperationTombstone, BudgetDeletion
+from . import events
+
+logger = logging.getLogger(__name__)
+
+# deleting a budget manager in two steps, so a budget with a long history doesn't hold a request and its locks:
+# - the request only marks it deleted (BudgetManager.deleted_at), which hides it from the API at once, and queues a BudgetDeletion
+# - a worker (manage.py purge_deleted_budgets) deletes its rows in chunks of BUDGET_DELETION_CHUNK_SIZE with plain
+#   DELETE ... WHERE id IN (...) statements, without loading them or running the cascade collector
+# every chunk commits together with the job's progress, a job is leased for BUDGET_DELETION_LEASE_SECONDS like the
+# email outbox (mail.py), so the job of a crashed worker is picked up again and continues from the last chunk
+
+# deleted before the budget manager row itself, which goes last once nothing refers to it
+DEPENDENTS = [Operation, OperationTombstone, OperationMonthlyRollup, AccessRequest, UserAccess]
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def _lease():
+    return timezone.now() + timedelta(seconds=_setting('BUDGET_DELETION_LEASE_SECONDS', 300))
+
+def delete_budget_manager(budget_manager):
+    with transaction.atomic():
+        member_ids = list(UserAccess.objects.filter(budget_manager_id=budget_manager.id).values_list('user_id', flat=True))
+        BudgetManager.objects.filter(pk=budget_manager.pk).update(deleted_at=timezone.now(), version=models.F('version') + 1)
+        deletion = BudgetDeletion.objects.create(budget_manager_id=budget_manager.id)
+
+        # membership checks stop treating them as members right away
+        for user_id in member_ids:
+            invalidate_role(user_id, budget_manager.id)
+        events.publish(budget_manager.id, 'budget.deleted')
+    return deletion
+
+# leases the oldest due job to this worker, skipping a job another worker has locked, None without one
+def claim_deletion():
+    with transaction.atomic():
+        deletion = (
+            BudgetDeletion.objects.select_for_update(skip_locked=True)
+            .filter(status=BudgetDeletion.PENDING, locked_until__lte=timezone.now())
+            .order_by('id').first()
+        )
+        if deletion is not None:
+            deletion.locked_until = _lease()
+            deletion.save(update_fields=['locked_until'])
+    return deletion
+
+# deletes one chunk of the budget manager's rows (or the budget manager once nothing else is left) and saves the progress
+# in the same transaction, returns True once the job is done
+def purge_chunk(deletion, chunk_size):
+    with transaction.atomic():
+        deletion = BudgetDeletion.objects.select_for_update().get(pk=deletion.pk)
+        if deletion.status == BudgetDeletion.DONE:
+            return True
+
+        for model in DEPENDENTS:
+            ids = list(model.objects.filter(budget_manager_id=deletion.budget_manager_id).values_list('id', flat=True)[:chunk_size])
+            if ids:
+                deleted = model.objects.filter(id__in=ids)._raw_delete(model.objects.db)
+                label = model._meta.label
+                deletion.progress[label] = deletion.progress.get(label, 0) + deleted
+                deletion.locked_until = _lease()
+                deletion.save(update_fields=['progress', 'locked_until'])
+                return False
+
+        BudgetManager.all_objects.filter(pk=deletion.budget_manager_id)._raw_delete(BudgetManager.all_objects.db)
+        deletion.status = BudgetDeletion.DONE
+        deletion.finished_at = timezone.now()
+        deletion.save(update_fields=['status', 'finished_at'])
+        return True
+
+def purge(deletion, chunk_size, pause=0.0, stop_event=None):
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        if purge_chunk(deletion, chunk_size):
+            logger.info('Budget manager %s purged.', deletion.budget_manager_id)
+            return True
+        deletion.refresh_from_db(fields=['progress'])
+        logger.info('Purging budget manager %s: %s', deletion.budget_manager_id, deletion.progress)
+        if pause:
+            # leaves room for the requests writing to the same tables
+            stop_event.wait(pause)
+    return False
+
+def run_worker(chunk_size=None, pause=0.0, poll_interval=5.0, once=False, stop_event=None):
+    chunk_size = chunk_size or _setting('BUDGET_DELETION_CHUNK_SIZE', 1000)
+    stop_event = stop_event or threading.Event()
+
+    while not stop_event.is_set():
+        deletion = claim_deletion()
+        if deletion is not None:
+            purge(deletion, chunk_size, pause, stop_event)
+        elif once:
+            break
+        else:
+            stop_event.wait(poll_interval)
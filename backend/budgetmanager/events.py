@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BudgetEvent
+
+logger = logging.getLogger(__name__)
+
+# live change events of budget managers, streamed to their members by the events/ endpoint (async_views.py)
+# - writes publish small events (what changed and the new budget version), sent only once the transaction commits
+# - every worker process has one broker that fans events out to the streams it serves
+# - the broker's backend (BUDGET_EVENTS_BACKEND) decides how events travel between workers:
+#   LocalBackend keeps them in the process, DatabaseBackend shares them through the BudgetEvent table for several workers
+# a stream that falls behind gets an `overflow` event and is closed, the client reconnects and catches up with the
+# delta sync (operations/changes/)
+
+OVERFLOW = {'type': 'overflow'}
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+# events of one stream, filled from any thread and read on the event loop of the stream's request
+class Subscription:
+    def __init__(self, budget_manager_id, queue_size):
+        self.budget_manager_id = budget_manager_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    # runs on self.loop
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # the reader can't keep up, drop what it hasn't read and tell it to resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    # next event or None after timeout seconds without one
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class EventBroker:
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, budget_manager_id):
+        subscription = Subscription(budget_manager_id, _setting('BUDGET_EVENTS_QUEUE_SIZE', 100))
+        with self.lock:
+            self.subscriptions[budget_manager_id].add(subscription)
+        self.backend.start(self)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.budget_manager_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.budget_manager_id]
+
+    def has_subscribers(self):
+        with self.lock:
+            return bool(self.subscriptions)
+
+    def publish(self, budget_manager_id, event_type, **data):
+        self.backend.publish(self, {'type': event_type, 'budget_manager': budget_manager_id, **data})
+
+    # hands the event to the local streams of its budget manager, safe to call from any thread
+    def dispatch(self, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(event['budget_manager'], ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                pass # the loop of a stream that is going away is already closed
+
+# events stay in the process, enough for a single worker
+class LocalBackend:
+    def start(self, broker):
+        pass
+
+    def publish(self, broker, event):
+        transaction.on_commit(lambda: broker.dispatch(event))
+
+# events are rows of BudgetEvent written in the transaction of the change, every worker with open streams polls the table
+# (a local stand-in for a message broker: no extra service, at the cost of one small query per poll interval)
+# expired events are deleted by the publishing workers, a WSGI deployment publishes without ever polling
+class DatabaseBackend:
+    COMMIT_WINDOW = timedelta(seconds=30) # longest expected time between publishing an event and its commit
+    PRUNE_INTERVAL = 60 # seconds between deletes of expired events in one process
+
+    def __init__(self):
+        self.poll_interval = _setting('BUDGET_EVENTS_POLL_INTERVAL', 1.0)
+        self.retention = timedelta(seconds=_setting('BUDGET_EVENTS_RETENTION_SECONDS', 300))
+        self.lock = threading.Lock()
+        self.task = None
+        self.pruned_at = None # time.monotonic() of the last delete
+
+    def publish(self, broker, event):
+        data = {key: value for key, value in event.items() if key not in ('type', 'budget_manager')}
+        BudgetEvent.objects.create(budget_manager_id=event['budget_manager'], type=event['type'], data=data)
+        # after the commit, a failed delete mustn't roll back the change
+        transaction.on_commit(self.prune)
+
+    def prune(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.pruned_at is not None and now - self.pruned_at < self.PRUNE_INTERVAL:
+                return
+            self.pruned_at = now
+        try:
+            BudgetEvent.objects.filter(created_at__lt=timezone.now() - self.retention).delete()
+        except Exception:
+            logger.exception('Deleting expired budget events failed.')
+
+    # one poller per process, on the event loop of the first stream
+    def start(self, broker):
+        with self.lock:
+            if self.task is None or self.task.done():
+                self.task = asyncio.get_running_loop().create_task(self.poll(broker, timezone.now()))
+
+    # ids don't become visible in order (a transaction may commit after a later one), so every poll reads the events
+    # of the last COMMIT_WINDOW and skips the ones it has dispatched already
+    async def poll(self, broker, started_at):
+        dispatched = {} # event id: created_at
+        while broker.has_subscribers():
+            try:
+                # only events published from the first subscription on, a new stream starts from the state the client fetched
+                since = max(started_at, timezone.now() - self.COMMIT_WINDOW)
+                async for event in BudgetEvent.objects.filter(created_at__gte=since).order_by('id'):
+                    if event.id not in dispatched:
+                        dispatched[event.id] = event.created_at
+                        broker.dispatch({'type': event.type, 'budget_manager': event.budget_manager_id, **event.data})
+                dispatched = {event_id: created_at for event_id, created_at in dispatched.items() if created_at >= since}
+            except Exception:
+                logger.exception('Polling budget events failed.')
+            await asyncio.sleep(self.poll_interval)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = import_string(_setting('BUDGET_EVENTS_BACKEND', 'budgetmanager.events.LocalBackend'))()
+                _broker = EventBroker(backend)
+    return _broker
+
+def publish(budget_manager_id, event_type, **data):
+    get_broker().publish(budget_manager_id, event_type, **data)
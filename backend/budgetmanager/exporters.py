@@ -0,0 +1,61 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Operation
+
+EXPORT_FIELDS = ['id', 'date', 'title', 'value', 'type', 'category', 'by']
+
+# columns selected for every exported field, related objects are exported by name
+EXPORT_COLUMNS = ['id', 'date', 'title', 'value', 'type__name', 'category__name', 'by__username']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# operations of a budget manager as tuples of EXPORT_FIELDS, read with a chunked iterator
+# (a server-side cursor on PostgreSQL) so only chunk_size rows are held in memory at a time
+def operation_rows(budget_manager_id, date_from=None, date_to=None, chunk_size=2000):
+    queryset = Operation.objects.filter(budget_manager_id=budget_manager_id)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+
+    return queryset.order_by('date', 'id').values_list(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size)
+
+# file-like object that hands back whatever csv.writer writes, so every row becomes a string to yield
+class _Echo:
+    def write(self, value):
+        return value
+
+def csv_chunks(rows, lines_per_chunk=500):
+    writer = csv.writer(_Echo())
+    # the header goes out right away, before the database has returned the first rows
+    yield writer.writerow(EXPORT_FIELDS)
+
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow(['' if value is None else value for value in row]))
+        if len(lines) >= lines_per_chunk:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+def ndjson_chunks(rows, lines_per_chunk=500):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + '\n')
+        if len(lines) >= lines_per_chunk:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+def export_chunks(output, rows):
+    if output == 'ndjson':
+        return ndjson_chunks(rows)
+    return csv_chunks(rows)
@@ -0,0 +1,37 @@
+# query parameter filters and orderings of the operations list (budget-managers/<id>/operations/)
+# the composite indexes (see Operation.Meta.indexes) answer these with one index range scan in the requested order:
+# - date range and date ordering, alone or with a single category, type or by: (budget_manager[, <field>], date, id)
+# - value range and value ordering: (budget_manager, value, id)
+# the other combinations still read only the budget manager's rows through an index, but either walk all of them in
+# the requested order checking the filters or sort the matching ones:
+# - several categories or types at once (?category=1,2)
+# - a category, type or by filter with value ordering, a value range with date ordering
+# - several equality filters at once (the index of one of them, the others are checked on its rows)
+
+# ?ordering= -> order_by, the id always breaks ties so the order is total and the keyset pagination can follow it
+ORDERINGS = {
+    '-date': ('-date', '-id'),
+    'date': ('date', 'id'),
+    '-value': ('-value', '-id'),
+    'value': ('value', 'id'),
+}
+DEFAULT_ORDERING = '-date'
+
+# filters: validated data of OperationListQuerySerializer
+def filter_operations(queryset, filters):
+    if filters.get('date_from'):
+        queryset = queryset.filter(date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        queryset = queryset.filter(date__lte=filters['date_to'])
+    if filters.get('category'):
+        queryset = queryset.filter(category_id__in=filters['category'])
+    if filters.get('type'):
+        queryset = queryset.filter(type_id__in=filters['type'])
+    if filters.get('by') is not None:
+        queryset = queryset.filter(by_id=filters['by'])
+    if filters.get('value_min') is not None:
+        queryset = queryset.filter(value__gte=filters['value_min'])
+    if filters.get('value_max') is not None:
+        queryset = queryset.filter(value__lte=filters['value_max'])
+
+    return queryset.order_by(*ORDERINGS[filters.get('ordering') or DEFAULT_ORDERING])
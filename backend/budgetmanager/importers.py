@@ -0,0 +1,244 @@
+import csv
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Operation
+from . import changes, reference
+
+# operation field -> CSV header used when no column mapping is given
+DEFAULT_COLUMNS = {
+    'date': 'date',
+    'title': 'title',
+    'value': 'value',
+    'type': 'type',
+    'category': 'category',
+    'by': 'by',
+}
+REQUIRED_COLUMNS = ['date', 'title', 'value']
+
+TITLE_MAX_LENGTH = Operation._meta.get_field('title').max_length
+VALUE_MAX = Decimal('999999.99') # Operation.value is max_digits=8, decimal_places=2
+
+class OperationImportError(Exception):
+    pass
+
+class ImportResult:
+    def __init__(self, max_reported_errors):
+        self.imported = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors = [] # [{'line': n, 'errors': [...]}], at most max_reported_errors of them
+        self.max_reported_errors = max_reported_errors
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'errors_truncated': self.rejected > len(self.errors),
+        }
+
+# streams CSV rows (e.g. a spreadsheet or bank statement export) into the operations of a budget manager
+# rows are parsed one by one and committed in chunks with bulk_create, so memory use doesn't grow with the file size;
+# invalid rows are reported and skipped without aborting the import, every committed chunk stays committed
+# - columns maps operation fields to CSV headers, type/category/by are matched by name (case insensitive)
+# - without a type column (or with an empty type) the sign of the value decides: negative is an expense, positive an income
+# - dedupe skips rows matching an existing operation of the budget (date, title, value, type and category)
+class OperationImporter:
+    def __init__(self, budget_manager, columns=None, chunk_size=1000, dedupe=False, delimiter=',',
+                 date_format='%Y-%m-%d', default_category=None, max_reported_errors=100):
+        self.budget_manager = budget_manager
+        self.columns = {**DEFAULT_COLUMNS, **(columns or {})}
+        self.chunk_size = chunk_size
+        self.dedupe = dedupe
+        self.delimiter = delimiter
+        self.date_format = date_format
+        self.max_reported_errors = max_reported_errors
+
+        data = reference.get_reference_data()
+        self.categories = {category.name.lower(): category for category in data['category_by_id'].values()}
+        self.types = {operation_type.name.lower(): operation_type for operation_type in data['type_by_id'].values()}
+        self.members = {
+            user.username.lower(): user
+            for user in User.objects.filter(memberships__budget_manager=budget_manager)
+        }
+
+        self.default_category = None
+        if default_category:
+            self.default_category = self.categories.get(default_category.lower())
+            if self.default_category is None:
+                raise OperationImportError(f"Unknown default category '{default_category}'.")
+
+    # lines: any iterable of text lines (an open file, a wrapped upload, ...)
+    def run(self, lines):
+        result = ImportResult(self.max_reported_errors)
+        reader = csv.reader(lines, delimiter=self.delimiter)
+
+        header = next(reader, None)
+        if header is None:
+            raise OperationImportError('The file is empty.')
+        positions = self.map_header(header)
+
+        rows = enumerate(reader, start=2) # line numbers as seen in a spreadsheet, the header is line 1
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk, positions, result)
+
+        return result
+
+    def map_header(self, header):
+        header = [name.strip().lower() for name in header]
+        positions = {}
+        for field, column in self.columns.items():
+            if column and column.strip().lower() in header:
+                positions[field] = header.index(column.strip().lower())
+
+        missing = [self.columns[field] for field in REQUIRED_COLUMNS if field not in positions]
+        if missing:
+            raise OperationImportError(f"Missing columns: {', '.join(missing)}.")
+        if 'category' not in positions and self.default_category is None:
+            raise OperationImportError(f"Missing column: {self.columns['category']} (or a default category).")
+
+        return positions
+
+    def import_chunk(self, chunk, positions, result):
+        operations = []
+        for line, row in chunk:
+            operation, errors = self.parse_row(row, positions)
+            if errors:
+                result.reject(line, errors)
+            else:
+                operations.append(operation)
+
+        if self.dedupe:
+            operations = self.drop_duplicates(operations, result)
+
+        if operations:
+            with transaction.atomic():
+                operations = Operation.objects.bulk_create(operations)
+                changes.operations_created(operations)
+            result.imported += len(operations)
+
+    def parse_row(self, row, positions):
+        errors = []
+
+        def cell(field):
+            position = positions.get(field)
+            if position is None or position >= len(row):
+                return ''
+            return row[position].strip()
+
+        operation_date = None
+        try:
+            operation_date = datetime.strptime(cell('date'), self.date_format).date()
+            if operation_date > date.today():
+                errors.append("date: The date cannot be in the future.")
+        except ValueError:
+            errors.append(f"date: '{cell('date')}' doesn't match the format {self.date_format}.")
+
+        title = cell('title')
+        if not title:
+            errors.append("title: This field is required.")
+        elif len(title) > TITLE_MAX_LENGTH:
+            errors.append(f"title: Ensure this field has no more than {TITLE_MAX_LENGTH} characters.")
+
+        value = None
+        raw_value = cell('value').replace(' ', '').replace('\xa0', '')
+        if ',' in raw_value and '.' not in raw_value:
+            raw_value = raw_value.replace(',', '.') # decimal comma
+        try:
+            value = Decimal(raw_value)
+            if not value.is_finite():
+                raise InvalidOperation
+        except InvalidOperation:
+            value = None
+            errors.append(f"value: '{cell('value')}' is not a number.")
+
+        operation_type = None
+        type_name = cell('type')
+        if type_name:
+            operation_type = self.types.get(type_name.lower())
+            if operation_type is None:
+                errors.append(f"type: Unknown operation type '{type_name}'.")
+        elif value is not None:
+            type_name = Operation.EXPENSE if value < 0 else Operation.INCOME
+            operation_type = self.types.get(type_name)
+            if operation_type is None:
+                errors.append(f"type: No '{type_name}' operation type to infer from the sign of the value.")
+
+        if value is not None:
+            value = abs(value)
+            if value == 0:
+                errors.append("value: The value must be different from zero.")
+            elif value > VALUE_MAX or value != value.quantize(Decimal('0.01')):
+                errors.append(f"value: '{cell('value')}' doesn't fit in 8 digits with 2 decimal places.")
+
+        category = self.default_category
+        category_name = cell('category')
+        if category_name:
+            category = self.categories.get(category_name.lower())
+            if category is None:
+                errors.append(f"category: Unknown category '{category_name}'.")
+        elif category is None:
+            errors.append("category: This field is required.")
+
+        by = None
+        username = cell('by')
+        if username:
+            by = self.members.get(username.lower())
+            if by is None:
+                errors.append(f"by: '{username}' is not a member of this budget manager.")
+
+        if errors:
+            return None, errors
+
+        return Operation(
+            budget_manager=self.budget_manager,
+            type=operation_type,
+            date=operation_date,
+            title=title,
+            category=category,
+            value=value,
+            by=by,
+        ), []
+
+    @staticmethod
+    def dedupe_key(operation):
+        return (operation.date, operation.title, Decimal(operation.value), operation.type_id, operation.category_id)
+
+    # one query per chunk, limited to the chunk's date range (served by the (budget_manager, date, id) index)
+    def drop_duplicates(self, operations, result):
+        if not operations:
+            return operations
+
+        dates = [operation.date for operation in operations]
+        existing = {
+            (row[0], row[1], Decimal(row[2]), row[3], row[4])
+            for row in Operation.objects.filter(
+                budget_manager=self.budget_manager,
+                date__gte=min(dates),
+                date__lte=max(dates),
+            ).values_list('date', 'title', 'value', 'type_id', 'category_id').iterator()
+        }
+
+        unique = []
+        for operation in operations:
+            key = self.dedupe_key(operation)
+            if key in existing:
+                result.duplicates += 1
+                continue
+            existing.add(key) # repeated rows within the file count as duplicates as well
+            unique.append(operation)
+        return unique
@@ -0,0 +1,125 @@
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# durable email outbox: requests only insert an OutboundEmail row, a worker (manage.py run_email_outbox) sends them
+# - sends go through a pluggable transport (EMAIL_OUTBOX_TRANSPORT), tests can swap in LocmemTransport
+# - failures are retried with exponential backoff and jitter, after EMAIL_OUTBOX_MAX_ATTEMPTS the email is dead-lettered
+# - a claimed email is leased for EMAIL_OUTBOX_LEASE_SECONDS, so emails of a crashed worker are picked up again
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def enqueue_email(to, subject, body):
+    return OutboundEmail.objects.create(to=to, subject=subject, body=body)
+
+# posts the email to the mail webhook, reusing one HTTP connection pool per worker thread
+class WebhookTransport:
+    def __init__(self):
+        self.url = _setting('EMAIL_WEBHOOK_URL', None)
+        self.timeout = _setting('EMAIL_WEBHOOK_TIMEOUT', (3.05, 10)) # (connect, read) seconds
+        self.local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def send(self, email):
+        if not self.url:
+            raise RuntimeError('EMAIL_WEBHOOK_URL is not configured.')
+
+        response = self.session.post(self.url, json={
+            "to": email.to,
+            "subject": email.subject,
+            "body": email.body
+        }, timeout=self.timeout)
+        response.raise_for_status()
+
+# keeps sent emails in memory instead of sending them (tests, local development)
+class LocmemTransport:
+    outbox = []
+
+    def send(self, email):
+        LocmemTransport.outbox.append({"to": email.to, "subject": email.subject, "body": email.body})
+
+def get_transport():
+    return import_string(_setting('EMAIL_OUTBOX_TRANSPORT', 'budgetmanager.mail.WebhookTransport'))()
+
+def backoff_delay(attempts):
+    base = _setting('EMAIL_OUTBOX_BACKOFF_BASE_SECONDS', 30)
+    cap = _setting('EMAIL_OUTBOX_BACKOFF_MAX_SECONDS', 3600)
+    delay = min(cap, base * 2 ** (attempts - 1))
+    # jitter keeps emails that failed together from being retried together
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+# leases up to batch_size due emails to this worker, skipping rows another worker has locked
+def claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if emails:
+            OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=now + timedelta(seconds=_setting('EMAIL_OUTBOX_LEASE_SECONDS', 300))
+            )
+    return emails
+
+def _deliver(transport, email):
+    try:
+        transport.send(email)
+    except Exception as error:
+        return email, error
+    return email, None
+
+def _record(email, error):
+    email.attempts += 1
+    if error is None:
+        email.status = OutboundEmail.SENT
+        email.sent_at = timezone.now()
+        email.last_error = ''
+    elif email.attempts >= _setting('EMAIL_OUTBOX_MAX_ATTEMPTS', 8):
+        email.status = OutboundEmail.DEAD
+        email.last_error = repr(error)
+        logger.error('Email %s to %s moved to dead letters after %s attempts: %r', email.id, email.to, email.attempts, error)
+    else:
+        email.next_attempt_at = timezone.now() + backoff_delay(email.attempts)
+        email.last_error = repr(error)
+        logger.warning('Email %s to %s failed (attempt %s), retrying at %s: %r', email.id, email.to, email.attempts, email.next_attempt_at, error)
+    email.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+
+# sends one batch of due emails with a pool of threads, returns the number of processed emails
+def process_batch(executor, transport, batch_size):
+    emails = claim_batch(batch_size)
+    for email, error in executor.map(lambda email: _deliver(transport, email), emails):
+        _record(email, error)
+    return len(emails)
+
+def run_worker(threads=4, batch_size=50, poll_interval=2.0, once=False, stop_event=None, transport=None):
+    transport = transport or get_transport()
+    stop_event = stop_event or threading.Event()
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='email-outbox') as executor:
+        while not stop_event.is_set():
+            processed = process_batch(executor, transport, batch_size)
+            if once and not processed:
+                break
+            if not processed:
+                stop_event.wait(poll_interval)
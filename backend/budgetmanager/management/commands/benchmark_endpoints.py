@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from budgetmanager.benchmarking import compare_reports, run_benchmarks
+
+class Command(BaseCommand):
+    help = 'Times every API URL against the benchmark dataset, counts its SQL queries and writes a JSON report.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the dataset created by seed_benchmark_data.')
+        parser.add_argument('--iterations', type=int, default=10, help='Timed requests per URL after the cold one.')
+        parser.add_argument('--only', action='append', help='Only URLs whose label contains this text (can be repeated).')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--compare', help='JSON report of a previous run, regressions against it fail the command.')
+        parser.add_argument('--latency-threshold', type=float, default=0.25,
+                            help='Allowed relative increase of the median latency when comparing.')
+
+    def handle(self, *args, **options):
+        try:
+            report = run_benchmarks(
+                seed=options['seed'],
+                iterations=options['iterations'],
+                only=options['only'],
+                log=self.stdout.write,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        for result in report['endpoints']:
+            if 'skipped' in result:
+                self.stdout.write(self.style.WARNING(f"skipped {result['label']}: {result['skipped']}"))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+                file.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            regressions = compare_reports(baseline, report, latency_threshold=options['latency_threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["compare"]}.')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}.'))
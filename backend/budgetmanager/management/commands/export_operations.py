@@ -0,0 +1,37 @@
+import sys
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from budgetmanager.exporters import CONTENT_TYPES, export_chunks, operation_rows
+from budgetmanager.models import BudgetManager
+
+class Command(BaseCommand):
+    help = 'Streams the operations of a budget manager as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('budget_manager_id', type=int)
+        parser.add_argument('--output', choices=list(CONTENT_TYPES), default='csv')
+        parser.add_argument('--date-from', type=date.fromisoformat, help='YYYY-MM-DD')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='YYYY-MM-DD')
+        parser.add_argument('--file', help='Write to this file instead of standard output.')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'OPERATION_EXPORT_CHUNK_SIZE', 2000))
+
+    def handle(self, *args, **options):
+        budget_manager_id = options['budget_manager_id']
+        if not BudgetManager.objects.filter(id=budget_manager_id).exists():
+            raise CommandError('BudgetManager does not exist.')
+
+        rows = operation_rows(
+            budget_manager_id,
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            chunk_size=options['chunk_size'],
+        )
+
+        if options['file']:
+            with open(options['file'], 'w', encoding='utf-8', newline='') as file:
+                file.writelines(export_chunks(options['output'], rows))
+        else:
+            sys.stdout.writelines(export_chunks(options['output'], rows))
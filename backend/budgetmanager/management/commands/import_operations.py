@@ -0,0 +1,68 @@
+import io
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from budgetmanager.importers import DEFAULT_COLUMNS, OperationImporter, OperationImportError
+from budgetmanager.models import BudgetManager
+
+class Command(BaseCommand):
+    help = 'Imports operations of a budget manager from a CSV file (spreadsheet or bank statement export).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('budget_manager_id', type=int)
+        parser.add_argument('path', help='CSV file to import, - for standard input.')
+        parser.add_argument('--column', action='append', default=[], metavar='FIELD=HEADER',
+                            help=f"Map an operation field ({', '.join(DEFAULT_COLUMNS)}) to a CSV header (can be repeated).")
+        parser.add_argument('--dedupe', action='store_true', help='Skip rows matching an existing operation.')
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--date-format', default='%Y-%m-%d')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--default-category', help='Category of rows without one.')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'OPERATION_IMPORT_CHUNK_SIZE', 1000))
+        parser.add_argument('--max-errors', type=int, default=100, help='Rejected rows listed in the report.')
+
+    def handle(self, *args, **options):
+        try:
+            budget_manager = BudgetManager.objects.get(id=options['budget_manager_id'])
+        except BudgetManager.DoesNotExist:
+            raise CommandError('BudgetManager does not exist.')
+
+        columns = {}
+        for mapping in options['column']:
+            field, _, header = mapping.partition('=')
+            if field not in DEFAULT_COLUMNS or not header:
+                raise CommandError(f"Invalid column mapping '{mapping}', expected FIELD=HEADER with FIELD one of {', '.join(DEFAULT_COLUMNS)}.")
+            columns[field] = header
+
+        try:
+            importer = OperationImporter(
+                budget_manager,
+                columns=columns,
+                chunk_size=options['chunk_size'],
+                dedupe=options['dedupe'],
+                delimiter=options['delimiter'],
+                date_format=options['date_format'],
+                default_category=options['default_category'],
+                max_reported_errors=options['max_errors'],
+            )
+            if options['path'] == '-':
+                result = importer.run(self.stdin_lines(options['encoding']))
+            else:
+                with open(options['path'], encoding=options['encoding'], newline='') as file:
+                    result = importer.run(file)
+        except (OperationImportError, OSError, UnicodeDecodeError) as error:
+            raise CommandError(str(error))
+
+        report = result.as_dict()
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {'; '.join(error['errors'])}")
+        if report['errors_truncated']:
+            self.stderr.write(f"... {report['rejected'] - len(report['errors'])} more rejected rows")
+
+        self.stdout.write(json.dumps({key: report[key] for key in ('imported', 'duplicates', 'rejected')}))
+
+    def stdin_lines(self, encoding):
+        return io.TextIOWrapper(sys.stdin.buffer, encoding=encoding, newline='')
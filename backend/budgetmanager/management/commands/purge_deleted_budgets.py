@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from budgetmanager.deletion import run_worker
+
+class Command(BaseCommand):
+    help = 'Deletes the operations, memberships and access requests of deleted budget managers in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows deleted per transaction (BUDGET_DELETION_CHUNK_SIZE by default).')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to wait between chunks.')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to wait when no budget manager is waiting to be purged.')
+        parser.add_argument('--once', action='store_true', help='Exit once every deleted budget manager is purged instead of polling.')
+
+    def handle(self, *args, **options):
+        try:
+            run_worker(
+                chunk_size=options['chunk_size'],
+                pause=options['pause'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+            )
+        except KeyboardInterrupt:
+            pass
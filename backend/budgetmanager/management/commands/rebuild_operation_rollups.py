@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from budgetmanager import rollups
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly operation rollups from scratch, or verifies them against the operations with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget-manager', type=int, action='append', dest='budget_manager_ids',
+                            help='Limit to the given budget manager id (can be repeated).')
+        parser.add_argument('--verify', action='store_true',
+                            help='Only compare the stored rollups with the operations and report differences.')
+
+    def handle(self, *args, **options):
+        budget_manager_ids = options['budget_manager_ids']
+
+        if not options['verify']:
+            count = rollups.rebuild_rollups(budget_manager_ids)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rollup rows.'))
+            return
+
+        computed = rollups.compute_rollups(budget_manager_ids)
+        stored = rollups.stored_rollups(budget_manager_ids)
+
+        mismatches = 0
+        for key in sorted(computed.keys() | stored.keys(), key=str):
+            expected = computed.get(key, (0, 0))
+            actual = stored.get(key, (0, 0))
+            if expected != actual:
+                mismatches += 1
+                budget_manager_id, month, category_id, type_id = key
+                self.stdout.write(
+                    f'budget manager {budget_manager_id}, {month:%Y-%m}, category {category_id}, type {type_id}: '
+                    f'expected total {expected[0]} / count {expected[1]}, stored total {actual[0]} / count {actual[1]}'
+                )
+
+        if mismatches:
+            raise CommandError(f'{mismatches} rollup rows are out of sync, run the command without --verify to rebuild them.')
+
+        self.stdout.write(self.style.SUCCESS(f'All {len(computed)} rollup rows are in sync.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from budgetmanager.mail import run_worker
+
+class Command(BaseCommand):
+    help = 'Sends the queued outbound emails, retrying failed ones with exponential backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Emails sent concurrently.')
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails claimed per database round trip.')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when no email is due.')
+        parser.add_argument('--once', action='store_true', help='Exit once no email is due instead of polling.')
+
+    def handle(self, *args, **options):
+        try:
+            run_worker(
+                threads=options['threads'],
+                batch_size=options['batch_size'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+            )
+        except KeyboardInterrupt:
+            pass
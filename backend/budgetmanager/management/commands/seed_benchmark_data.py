@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from budgetmanager.benchmarking import clear_dataset, generate_dataset
+
+class Command(BaseCommand):
+    help = 'Generates a reproducible benchmark dataset (households, members, operations, access requests) from a seed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1, help='The same seed and sizes always give the same data.')
+        parser.add_argument('--households', type=int, default=10, help='Budget managers, each with its own admin.')
+        parser.add_argument('--users', type=int, default=50, help='Users that members and access requests are drawn from.')
+        parser.add_argument('--members', type=int, default=3, help='Members per household besides the admin.')
+        parser.add_argument('--operations', type=int, default=10000, help='Operations per household.')
+        parser.add_argument('--access-requests', type=int, default=5, help='Pending access requests per household.')
+        parser.add_argument('--days', type=int, default=730, help='Days of history the operations are spread over.')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=date(2024, 6, 30), help='YYYY-MM-DD')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert.')
+        parser.add_argument('--clear', action='store_true', help='Delete the dataset of this seed first.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = clear_dataset(options['seed'])
+            self.stdout.write(f'Deleted {deleted} rows of the previous dataset.')
+
+        try:
+            summary = generate_dataset(
+                seed=options['seed'],
+                households=options['households'],
+                users=options['users'],
+                members=options['members'],
+                operations=options['operations'],
+                access_requests=options['access_requests'],
+                days=options['days'],
+                end_date=options['end_date'],
+                chunk_size=options['chunk_size'],
+                log=self.stdout.write,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{value} {name.replace("_", " ")}' for name, value in summary.items() if name != 'seed')
+        ))
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import BudgetManager, UserAccess
+
+# resolves a user's role in a budget manager for permission classes and serializers
+# two layers:
+# - request scope: every (user, budget manager) pair is resolved at most once per request
+# - shared cache: bounded (see CACHES), invalidated whenever a UserAccess row is created, updated or deleted
+#   and for every member of a deleted budget manager (deletion.py), which has no members from then on
+
+NO_ACCESS = '' # cached marker for "not a member", so non-members don't hit the database on every request
+
+def _cache():
+    return caches[getattr(settings, 'MEMBERSHIP_CACHE_ALIAS', 'default')]
+
+def _cache_key(user_id, budget_manager_id):
+    return f'budgetmanager:role:{user_id}:{budget_manager_id}'
+
+def _request_memo(request, name):
+    memo = getattr(request, name, None)
+    if memo is None:
+        memo = {}
+        setattr(request, name, memo)
+    return memo
+
+# role of the user (request.user by default) in the budget manager or None if they aren't a member
+def get_role(request, budget_manager_id, user_id=None):
+    if user_id is None:
+        if not request.user or not request.user.is_authenticated:
+            return None
+        user_id = request.user.id
+
+    try:
+        budget_manager_id = int(budget_manager_id)
+    except (TypeError, ValueError):
+        return None
+
+    memo = _request_memo(request, '_budget_roles')
+    key = (user_id, budget_manager_id)
+    if key in memo:
+        return memo[key]
+
+    cache_key = _cache_key(user_id, budget_manager_id)
+    role = _cache().get(cache_key)
+    if role is None:
+        role = UserAccess.objects.filter(
+            user_id=user_id,
+            budget_manager_id=budget_manager_id,
+            budget_manager__deleted_at__isnull=True
+        ).values_list('role', flat=True).first() or NO_ACCESS
+        _cache().set(cache_key, role, getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 60))
+
+    memo[key] = role or None
+    return memo[key]
+
+# async counterpart of get_role for the ASGI views (async_views.py), shares the request memo and the cache entries
+async def aget_role(request, budget_manager_id, user_id=None):
+    if user_id is None:
+        if not request.user or not request.user.is_authenticated:
+            return None
+        user_id = request.user.id
+
+    try:
+        budget_manager_id = int(budget_manager_id)
+    except (TypeError, ValueError):
+        return None
+
+    memo = _request_memo(request, '_budget_roles')
+    key = (user_id, budget_manager_id)
+    if key in memo:
+        return memo[key]
+
+    cache_key = _cache_key(user_id, budget_manager_id)
+    role = await _cache().aget(cache_key)
+    if role is None:
+        role = await UserAccess.objects.filter(
+            user_id=user_id,
+            budget_manager_id=budget_manager_id,
+            budget_manager__deleted_at__isnull=True
+        ).values_list('role', flat=True).afirst() or NO_ACCESS
+        await _cache().aset(cache_key, role, getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 60))
+
+    memo[key] = role or None
+    return memo[key]
+
+def has_role(request, budget_manager_id, roles, user_id=None):
+    return get_role(request, budget_manager_id, user_id) in roles
+
+def is_member(request, budget_manager_id, user_id=None):
+    return get_role(request, budget_manager_id, user_id) is not None
+
+async def ais_member(request, budget_manager_id, user_id=None):
+    return await aget_role(request, budget_manager_id, user_id) is not None
+
+# budget manager fetched once per request and shared by the permission checks and serializers, None if it doesn't exist
+def get_budget_manager(request, budget_manager_id):
+    try:
+        budget_manager_id = int(budget_manager_id)
+    except (TypeError, ValueError):
+        return None
+
+    memo = _request_memo(request, '_budget_managers')
+    if budget_manager_id not in memo:
+        memo[budget_manager_id] = BudgetManager.objects.filter(id=budget_manager_id).first()
+    return memo[budget_manager_id]
+
+async def aget_budget_manager(request, budget_manager_id):
+    try:
+        budget_manager_id = int(budget_manager_id)
+    except (TypeError, ValueError):
+        return None
+
+    memo = _request_memo(request, '_budget_managers')
+    if budget_manager_id not in memo:
+        memo[budget_manager_id] = await BudgetManager.objects.filter(id=budget_manager_id).afirst()
+    return memo[budget_manager_id]
+
+# admin of the budget manager: its owner who also holds the admin role
+def is_budget_admin(request, budget_manager):
+    return (
+        budget_manager is not None
+        and budget_manager.admin_id == request.user.id
+        and get_role(request, budget_manager.id) == UserAccess.ADMIN
+    )
+
+def invalidate_role(user_id, budget_manager_id):
+    cache_key = _cache_key(user_id, budget_manager_id)
+    _cache().delete(cache_key)
+    # a concurrent request could cache the old role before this transaction commits
+    transaction.on_commit(lambda: _cache().delete(cache_key))
@@ -0,0 +1,257 @@
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+from .authentication import token_user_id
+from . import routing
+
+logger = logging.getLogger('budgetmanager.timing')
+
+# per-request instrumentation: query count, database time, view time and response rendering (serialization) time
+# - opt-in with REQUEST_TIMING_ENABLED, when disabled the middleware removes itself from the stack (MiddlewareNotUsed)
+# - REQUEST_TIMING_SAMPLE_RATE instruments only a fraction of the requests, the rest pass straight through
+# - the numbers go out as a Server-Timing header (REQUEST_TIMING_SERVER_TIMING) and a log line per request,
+#   requests slower than REQUEST_TIMING_SLOW_MS also log their SQL statements (without parameters)
+# queries are counted with a database execute wrapper, DEBUG isn't needed and nothing is kept beyond the request
+# serializer fields evaluated inside the view (DRF's serializer.data) count as view time, `serialize` is the
+# rendering of the response (JSONRenderer); a streamed response is timed until its first byte is ready
+
+# timings of one request, the execute wrapper is installed on every database connection of the thread running its queries
+class RequestTiming:
+    def __init__(self, max_logged_queries):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_finished = None
+        self.render_finished = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = [] # (sql, seconds) of the first max_logged_queries queries
+        self.max_logged_queries = max_logged_queries
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            if len(self.statements) < self.max_logged_queries:
+                self.statements.append((sql, duration))
+
+    def install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    def metrics(self):
+        finished = time.perf_counter()
+        metrics = {
+            'total': finished - self.started,
+            'db': self.db_time,
+        }
+        if self.view_started is not None:
+            metrics['view'] = (self.view_finished or finished) - self.view_started
+        if self.view_finished is not None and self.render_finished is not None:
+            metrics['serialize'] = self.render_finished - self.view_finished
+        return metrics
+
+class RequestTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', False):
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+        self.slow_ms = getattr(settings, 'REQUEST_TIMING_SLOW_MS', 500)
+        self.max_logged_queries = getattr(settings, 'REQUEST_TIMING_MAX_LOGGED_QUERIES', 50)
+        self.server_timing = getattr(settings, 'REQUEST_TIMING_SERVER_TIMING', True)
+
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # hooks matching the handler mode, Django would otherwise run sync hooks through a thread for async requests
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        timing = self.start(request)
+        if timing is None:
+            return self.get_response(request)
+
+        timing.install()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.uninstall()
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = self.start(request)
+        if timing is None:
+            return await self.get_response(request)
+
+        # connections are per thread: the ORM calls of an async request (and its sync views) run in the request's
+        # thread sensitive sync_to_async thread, not on the event loop, so the wrapper goes on that thread's connections
+        await sync_to_async(timing.install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(timing.uninstall)()
+        return self.finish(request, response, timing)
+
+    def start(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        request._request_timing = RequestTiming(self.max_logged_queries)
+        return request._request_timing
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = getattr(request, '_request_timing', None)
+        if timing is not None:
+            timing.view_started = time.perf_counter()
+        return None
+
+    # called right before the handler renders the response, so the view is done and serialization starts
+    def process_template_response(self, request, response):
+        timing = getattr(request, '_request_timing', None)
+        if timing is not None:
+            timing.view_finished = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: setattr(timing, 'render_finished', time.perf_counter()))
+        return response
+
+    # in async mode the instance's process_* attributes are these coroutines, so they call the class' sync methods
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return RequestTimingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def aprocess_template_response(self, request, response):
+        return RequestTimingMiddleware.process_template_response(self, request, response)
+
+    def finish(self, request, response, timing):
+        metrics = timing.metrics()
+
+        if self.server_timing:
+            entries = [
+                f'{name};dur={seconds * 1000:.1f}' + (f';desc="{timing.queries} queries"' if name == 'db' else '')
+                for name, seconds in metrics.items()
+            ]
+            response.headers['Server-Timing'] = ', '.join(entries)
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timing.queries,
+            **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds in metrics.items()},
+        }
+        message = ' '.join(f'{name}={value}' for name, value in fields.items())
+
+        if metrics['total'] * 1000 < self.slow_ms:
+            logger.info(message, extra={'request_timing': fields})
+        else:
+            statements = '\n'.join(f'  {seconds * 1000:.1f} ms  {sql}' for sql, seconds in timing.statements)
+            omitted = timing.queries - len(timing.statements)
+            if omitted:
+                statements += f'\n  ... {omitted} more queries'
+            logger.warning('slow request %s\n%s', message, statements, extra={'request_timing': fields})
+
+        return response
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# picks the database a request reads from, see routing.py
+# views that must read from the primary even for GET requests set use_primary = True
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not routing.replica_aliases():
+            raise MiddlewareNotUsed()
+        # servers like gunicorn and uvicorn don't run the system checks, so the middleware refuses to start instead
+        error = routing.sticky_cache_error()
+        if error is not None:
+            raise ImproperlyConfigured(error)
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        user_id = token_user_id(request)
+        replica = None
+        if request.method in SAFE_METHODS and not (user_id and routing.is_sticky(user_id)):
+            replica = routing.choose_replica()
+
+        token = routing.start_request(replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routing.end_request(token)
+
+        user_id = self.wrote(request, response, state, user_id)
+        if user_id:
+            routing.mark_wrote(user_id)
+        return response
+
+    async def __acall__(self, request):
+        user_id = token_user_id(request)
+        replica = None
+        if request.method in SAFE_METHODS and not (user_id and await routing.ais_sticky(user_id)):
+            replica = await routing.achoose_replica()
+
+        token = routing.start_request(replica)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = routing.end_request(token)
+
+        user_id = self.wrote(request, response, state, user_id)
+        if user_id:
+            await routing.amark_wrote(user_id)
+        return response
+
+    # id of the user whose next requests have to read from the primary, None if the request didn't write
+    def wrote(self, request, response, state, user_id):
+        if response.status_code >= 400 or not (state.wrote or request.method not in SAFE_METHODS):
+            return None
+        user = getattr(request, 'user', None) # set by DRF's authentication
+        if user is not None and user.is_authenticated:
+            return user.id
+        return user_id
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        if getattr(view_class, 'use_primary', False):
+            routing.use_primary()
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return ReplicaRoutingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    # a failing replica is skipped by the next requests until its next health check
+    def process_exception(self, request, exception):
+        state = routing._state.get()
+        if isinstance(exception, DatabaseError) and state is not None and state.replica is not None:
+            routing.health.mark_unhealthy(state.replica)
+        return None
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_rollups(apps, schema_editor):
+    Operation = apps.get_model('budgetmanager', 'Operation')
+    OperationMonthlyRollup = apps.get_model('budgetmanager', 'OperationMonthlyRollup')
+
+    rows = (
+        Operation.objects.annotate(month=TruncMonth('date'))
+        .values('budget_manager_id', 'month', 'category_id', 'type_id')
+        .annotate(total=Sum('value'), count=Count('id'))
+        .order_by()
+    )
+    OperationMonthlyRollup.objects.bulk_create([OperationMonthlyRollup(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgetmanager', '0005_alter_operation_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperationMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('budget_manager', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='budgetmanager.budgetmanager')),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='budgetmanager.operationcategory')),
+                ('type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='budgetmanager.operationtype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='operationmonthlyrollup',
+            constraint=models.UniqueConstraint(fields=('budget_manager', 'month', 'category', 'type'), name='unique_operation_monthly_rollup'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgetmanager', '0006_operationmonthlyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['budget_manager', 'date', 'id'], name='operation_bm_date_id_idx'),
+        ),
+    ]
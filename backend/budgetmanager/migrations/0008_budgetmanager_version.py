@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgetmanager', '0007_operation_bm_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budgetmanager',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
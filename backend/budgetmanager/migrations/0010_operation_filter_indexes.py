@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgetmanager', '0009_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['budget_manager', 'category', 'date', 'id'], name='operation_bm_cat_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['budget_manager', 'type', 'date', 'id'], name='operation_bm_type_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['budget_manager', 'by', 'date', 'id'], name='operation_bm_by_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['budget_manager', 'value', 'id'], name='operation_bm_value_id_idx'),
+        ),
+    ]
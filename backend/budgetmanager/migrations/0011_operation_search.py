@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# full-text search index over Operation.title (see budgetmanager/search.py), created per database vendor:
+# - SQLite: an FTS5 table with the operation table as external content, kept in sync by triggers,
+#   and an fts5vocab table listing its terms for typo tolerant matching; the budget manager id is indexed as a
+#   token as well, so FTS5 intersects the budget's rows with the matches instead of filtering every match
+# - PostgreSQL: GIN expression indexes on to_tsvector(title) and on title trigrams (pg_trgm), both led by the
+#   budget manager (btree_gin), the database keeps them in sync on its own
+# other vendors get no index and search falls back to a plain icontains filter
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE budgetmanager_operation_fts USING fts5(
+        title,
+        budget_manager_id,
+        content='budgetmanager_operation',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    "CREATE VIRTUAL TABLE budgetmanager_operation_fts_vocab USING fts5vocab(budgetmanager_operation_fts, 'col')",
+    """
+    CREATE TRIGGER budgetmanager_operation_fts_insert AFTER INSERT ON budgetmanager_operation BEGIN
+        INSERT INTO budgetmanager_operation_fts(rowid, title, budget_manager_id) VALUES (new.id, new.title, new.budget_manager_id);
+    END
+    """,
+    """
+    CREATE TRIGGER budgetmanager_operation_fts_delete AFTER DELETE ON budgetmanager_operation BEGIN
+        INSERT INTO budgetmanager_operation_fts(budgetmanager_operation_fts, rowid, title, budget_manager_id) VALUES ('delete', old.id, old.title, old.budget_manager_id);
+    END
+    """,
+    """
+    CREATE TRIGGER budgetmanager_operation_fts_update AFTER UPDATE OF title, budget_manager_id ON budgetmanager_operation BEGIN
+        INSERT INTO budgetmanager_operation_fts(budgetmanager_operation_fts, rowid, title, budget_manager_id) VALUES ('delete', old.id, old.title, old.budget_manager_id);
+        INSERT INTO budgetmanager_operation_fts(rowid, title, budget_manager_id) VALUES (new.id, new.title, new.budget_manager_id);
+    END
+    """,
+    # index the operations that already exist
+    "INSERT INTO budgetmanager_operation_fts(budgetmanager_operation_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS budgetmanager_operation_fts_update",
+    "DROP TRIGGER IF EXISTS budgetmanager_operation_fts_delete",
+    "DROP TRIGGER IF EXISTS budgetmanager_operation_fts_insert",
+    "DROP TABLE IF EXISTS budgetmanager_operation_fts_vocab",
+    "DROP TABLE IF EXISTS budgetmanager_operation_fts",
+]
+
+# the extensions have to be allowed on managed servers (e.g. the azure.extensions parameter on Azure)
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    """
+    CREATE INDEX IF NOT EXISTS operation_title_tsv_idx ON budgetmanager_operation
+    USING GIN (budget_manager_id, to_tsvector('simple', title))
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS operation_title_trgm_idx ON budgetmanager_operation
+    USING GIN (budget_manager_id, title gin_trgm_ops)
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS operation_title_trgm_idx",
+    "DROP INDEX IF EXISTS operation_title_tsv_idx",
+]
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        vendor_statements = statements.get(schema_editor.connection.vendor, [])
+        for statement in vendor_statements:
+            schema_editor.execute(statement)
+    return run
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgetmanager', '0010_operation_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run_statements({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
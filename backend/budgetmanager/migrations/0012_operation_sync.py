@@ -0,0 +1,77 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# adding columns makes Django rebuild the operation table on SQLite, which drops the search index triggers of 0011
+# (the FTS index itself stays valid, the rebuilt table keeps the same ids and titles)
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS budgetmanager_operation_fts_insert AFTER INSERT ON budgetmanager_operation BEGIN
+        INSERT INTO budgetmanager_operation_fts(rowid, title, budget_manager_id) VALUES (new.id, new.title, new.budget_manager_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS budgetmanager_operation_fts_delete AFTER DELETE ON budgetmanager_operation BEGIN
+        INSERT INTO budgetmanager_operation_fts(budgetmanager_operation_fts, rowid, title, budget_manager_id) VALUES ('delete', old.id, old.title, old.budget_manager_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS budgetmanager_operation_fts_update AFTER UPDATE OF title, budget_manager_id ON budgetmanager_operation BEGIN
+        INSERT INTO budgetmanager_operation_fts(budgetmanager_operation_fts, rowid, title, budget_manager_id) VALUES ('delete', old.id, old.title, old.budget_manager_id);
+        INSERT INTO budgetmanager_operation_fts(rowid, title, budget_manager_id) VALUES (new.id, new.title, new.budget_manager_id);
+    END
+    """,
+]
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgetmanager', '0011_operation_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # runs last when migrating backwards, removing the columns rebuilds the table again
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.CreateModel(
+            name='OperationTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation_id', models.BigIntegerField()),
+                ('change_seq', models.PositiveBigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='operation',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='operation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['budget_manager', 'change_seq'], name='operation_bm_change_seq_idx'),
+        ),
+        migrations.AddField(
+            model_name='operationtombstone',
+            name='budget_manager',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operation_tombstones', to='budgetmanager.budgetmanager'),
+        ),
+        migrations.AddIndex(
+            model_name='operationtombstone',
+            index=models.Index(fields=['budget_manager', 'change_seq'], name='tombstone_bm_change_seq_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgetmanager', '0012_operation_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('budget_manager_id', models.BigIntegerField()),
+                ('type', models.CharField(max_length=32)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='budgetevent_created_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-17 23:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgetmanager', '0013_budgetevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budgetmanager',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='BudgetDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('budget_manager_id', models.BigIntegerField(unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done')], default='pending', max_length=7)),
+                ('progress', models.JSONField(default=dict)),
+                ('locked_until', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'locked_until'], name='budgetdeletion_due_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
 
 # operation category, e.g. groceries, cosmetics, car expenses, rent etc. as well as 'no category' to handle cases where a user can't find a suitable category
@@ -16,11 +18,77 @@ class OperationType(models.Model):
     def __str__(self):
         return self.name
 
+class BudgetManagerQuerySet(models.QuerySet):
+    # atomically increments the change counter of a budget manager, safe across processes sharing the database
+    def bump_version(self, budget_manager_id):
+        return self.filter(pk=budget_manager_id).update(version=models.F('version') + 1)
+
+    # budget managers the user is a member of, annotated with the user's role and a summary of each budget
+    # one query driven from the user's UserAccess rows (unique on user, budget manager, so no DISTINCT), every summary
+    # value is a correlated subquery on an index of the budget manager:
+    # - balance (income - expense) and operation_count from the monthly rollups
+    # - last_activity, the date of the latest operation
+    # - pending_access_requests, only for the admin role (None for other members)
+    def with_summaries(self, user_id):
+        rollups = OperationMonthlyRollup.objects.filter(budget_manager_id=models.OuterRef('pk')).order_by().values('budget_manager_id')
+        signed_total = models.Case(
+            models.When(type__name__iexact=Operation.INCOME, then=models.F('total')),
+            models.When(type__name__iexact=Operation.EXPENSE, then=-models.F('total')),
+            default=0,
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+        pending_requests = (
+            AccessRequest.objects.filter(budget_manager_id=models.OuterRef('pk'), status=AccessRequest.PENDING)
+            .order_by().values('budget_manager_id').annotate(count=models.Count('id')).values('count')
+        )
+
+        return self.filter(memberships__user_id=user_id).annotate(
+            role=models.F('memberships__role'),
+            balance=Coalesce(
+                models.Subquery(rollups.annotate(balance=models.Sum(signed_total)).values('balance')),
+                models.Value(0),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            operation_count=Coalesce(
+                models.Subquery(rollups.annotate(count=models.Sum('count')).values('count')),
+                models.Value(0),
+            ),
+            last_activity=models.Subquery(
+                Operation.objects.filter(budget_manager_id=models.OuterRef('pk')).order_by('-date').values('date')[:1]
+            ),
+            pending_access_requests=models.Case(
+                models.When(memberships__role=UserAccess.ADMIN, then=Coalesce(models.Subquery(pending_requests), models.Value(0))),
+                default=None,
+                output_field=models.IntegerField(),
+            ),
+        ).select_related('admin').order_by('id')
+
+# budget managers that haven't been deleted, deleted ones only wait for their rows to be purged (see deletion.py)
+class BudgetManagerManager(models.Manager.from_queryset(BudgetManagerQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 # budget manager for a household, includes unique id required to request access, name, admin (owner/creator)
+# version is a change counter bumped by every write to the budget's operations, memberships and access requests
+# deleted_at hides a deleted budget manager from `objects` until the purge removes it, `all_objects` still sees it
 class BudgetManager(models.Model):
     unique_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     name = models.CharField(max_length=64)
     admin = models.ForeignKey(User, on_delete=models.CASCADE, related_name='admin_budgetmanagers')
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = BudgetManagerManager()
+    all_objects = BudgetManagerQuerySet.as_manager()
+
+    # version and deleted_at are only moved by queryset updates, saving a loaded instance mustn't write back stale values
+    # (the post_save receiver in signals.py bumps the version instead)
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields if not field.primary_key and field.name not in ('version', 'deleted_at')
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -28,6 +96,7 @@ class BudgetManager(models.Model):
 # operation, either an expense or income
 # includes FK to the household it's tied to, type (expense/income), date, title (brief description for the operation), category, value
 # optional "by" field if you want to add an user who's responsible for the existence of the operation
+# change_seq is the budget manager version of the operation's last write (see changes.py), the delta sync reads by it
 class Operation(models.Model):
     INCOME = 'income'
     EXPENSE = 'expense'
@@ -44,6 +113,22 @@ class Operation(models.Model):
     category = models.ForeignKey(OperationCategory, on_delete=models.SET_NULL, null=True)
     value = models.DecimalField(max_digits=8, decimal_places=2)
     by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='operations')
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # operations list order (date desc, id desc) and its keyset pagination
+            models.Index(fields=['budget_manager', 'date', 'id'], name='operation_bm_date_id_idx'),
+            # single value filters of the operations list (see filters.py), each with the date range and date ordering
+            models.Index(fields=['budget_manager', 'category', 'date', 'id'], name='operation_bm_cat_date_id_idx'),
+            models.Index(fields=['budget_manager', 'type', 'date', 'id'], name='operation_bm_type_date_id_idx'),
+            models.Index(fields=['budget_manager', 'by', 'date', 'id'], name='operation_bm_by_date_id_idx'),
+            # value range filter with ordering by value, and ordering by value alone
+            models.Index(fields=['budget_manager', 'value', 'id'], name='operation_bm_value_id_idx'),
+            # changes since a sync token
+            models.Index(fields=['budget_manager', 'change_seq'], name='operation_bm_change_seq_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.type}) - {self.value}"
@@ -88,4 +173,111 @@ class AccessRequest(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.user.username} request to {self.budget_manager.name} ({self.status})"
\ No newline at end of file
+        return f"{self.user.username} request to {self.budget_manager.name} ({self.status})"
+
+# monthly totals of a budget manager's operations per category and type, maintained together with every Operation write
+# lets the dashboard read a few hundred rows instead of scanning the whole operation history
+class OperationMonthlyRollup(models.Model):
+    budget_manager = models.ForeignKey(BudgetManager, on_delete=models.CASCADE, related_name='rollups')
+    month = models.DateField() # first day of the month
+    category = models.ForeignKey(OperationCategory, on_delete=models.SET_NULL, null=True)
+    type = models.ForeignKey(OperationType, on_delete=models.SET_NULL, null=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['budget_manager', 'month', 'category', 'type'], name='unique_operation_monthly_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.budget_manager_id} {self.month:%Y-%m} ({self.category_id}, {self.type_id}) - {self.total}"
+
+
+# deleted operation, kept so that the delta sync can tell clients which of their rows are gone
+class OperationTombstone(models.Model):
+    budget_manager = models.ForeignKey(BudgetManager, on_delete=models.CASCADE, related_name='operation_tombstones')
+    operation_id = models.BigIntegerField()
+    change_seq = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['budget_manager', 'change_seq'], name='tombstone_bm_change_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.budget_manager_id} operation {self.operation_id} deleted at {self.change_seq}"
+
+# outgoing email waiting to be sent by the outbox worker (manage.py run_email_outbox, see mail.py)
+# failed sends are retried with exponential backoff until they're moved to the dead state
+class OutboundEmail(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead')
+    ]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now) # also pushed forward while a worker holds the email
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outboundemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to} ({self.status})"
+
+# purge of a deleted budget manager by manage.py purge_deleted_budgets (see deletion.py)
+# its rows are deleted in chunks, every chunk commits together with the progress, so a crashed purge resumes where it stopped
+class BudgetDeletion(models.Model):
+    PENDING = 'pending'
+    DONE = 'done'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DONE, 'Done')
+    ]
+
+    budget_manager_id = models.BigIntegerField(unique=True) # no foreign key, the job outlives the budget manager
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    progress = models.JSONField(default=dict) # rows deleted so far per model
+    locked_until = models.DateTimeField(default=timezone.now) # pushed forward while a worker purges the budget
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'locked_until'], name='budgetdeletion_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deletion of budget manager {self.budget_manager_id} ({self.status})"
+
+# change event of a budget manager shared between workers by events.DatabaseBackend, deleted after
+# BUDGET_EVENTS_RETENTION_SECONDS (subscribers that miss events catch up through the delta sync)
+class BudgetEvent(models.Model):
+    budget_manager_id = models.BigIntegerField() # no foreign key, the event may outlive the budget manager
+    type = models.CharField(max_length=32)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='budgetevent_created_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} in {self.budget_manager_id}"
@@ -0,0 +1,133 @@
+import base64
+import binascii
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .utils import query_flag, query_params
+
+# keyset (cursor) pagination of operations ordered by (field, id), (date desc, id desc) by default
+# the ordering is taken from the queryset when it ends with the id (see filters.ORDERINGS)
+# the cursor holds the (field, id) of the last row of a page and the next page starts right after it, so:
+# - page N is one index range scan on (budget_manager, [filter,] field, id), as cheap as page 1
+# - operations inserted while paging can't shift rows between pages, nothing is duplicated or skipped
+# ?unpaginated=true returns the whole list like before pagination was introduced
+class OperationCursorPagination(BasePagination):
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    unpaginated_query_param = 'unpaginated'
+    ordering = ('-date', '-id')
+
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if query_flag(request, self.unpaginated_query_param):
+            return None
+
+        results = list(self.page_queryset(queryset, request))
+        return self.set_page(results)
+
+    # async counterpart of paginate_queryset for the ASGI views (async_views.py)
+    async def apaginate_queryset(self, queryset, request):
+        if query_flag(request, self.unpaginated_query_param):
+            return None
+
+        results = [row async for row in self.page_queryset(queryset, request)]
+        return self.set_page(results)
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        ordering = tuple(queryset.query.order_by)
+        if len(ordering) != 2 or ordering[1].lstrip('-') != 'id':
+            ordering = self.ordering
+        queryset = queryset.order_by(*ordering)
+        self.field_name = ordering[0].lstrip('-')
+        descending = ordering[0].startswith('-')
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            position_value, position_id = position
+            # field <= X (>= X ascending) is the index range bound, the OR only breaks ties within the boundary value
+            bound, strict, after_id = ('lte', 'lt', 'lt') if descending else ('gte', 'gt', 'gt')
+            queryset = queryset.filter(
+                Q(**{f'{self.field_name}__{bound}': position_value})
+                & (Q(**{f'{self.field_name}__{strict}': position_value}) | Q(**{f'id__{after_id}': position_id}))
+            )
+
+        # one extra row tells whether there is a next page without a COUNT query
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        next_cursor = self.get_next_cursor()
+        return {
+            'next': self.get_next_link(next_cursor),
+            'next_cursor': next_cursor,
+            'results': data,
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                query_params(request)[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(getattr(last, self.field_name), last.id)
+
+    def get_next_link(self, next_cursor):
+        if next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, next_cursor)
+
+    def encode_cursor(self, position_value, position_id):
+        position_value = position_value.isoformat() if hasattr(position_value, 'isoformat') else str(position_value)
+        raw = f'{position_value}:{position_id}'
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        encoded = query_params(request).get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            position_value, position_id = raw.rsplit(':', 1)
+            # a cursor of another ordering doesn't parse as this field's type
+            return model._meta.get_field(self.field_name).to_python(position_value), int(position_id)
+        except (TypeError, ValueError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
@@ -1,6 +1,7 @@
 from rest_framework import permissions
 
 from .models import UserAccess, AccessRequest
+from . import membership
 
 # Permission class to allow only unauthenticated users to access the view
 # created specifically for login and register views
@@ -21,29 +22,20 @@ class IsSuperuserOrReadOnly(permissions.BasePermission):
     
 class IsBudgetMember(permissions.BasePermission):
     def has_permission(self, request, view):
-        user = request.user      
         budget_manager_id = view.kwargs.get('budget_manager_id')
 
         if not budget_manager_id:
             return False
 
         # Check if the user has an entry in UserAccess for the BudgetManager
-        return UserAccess.objects.filter(
-            user=user,
-            budget_manager_id=budget_manager_id
-        ).exists()
+        return membership.is_member(request, budget_manager_id)
 
 class IsBudgetEditorOrAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
-        user = request.user
         budget_manager_id = view.kwargs.get('budget_manager_id') or request.data.get('budget_manager')
         
         if budget_manager_id:
-            return UserAccess.objects.filter(
-                user=user,
-                budget_manager_id=budget_manager_id,
-                role__in=['edit', 'admin']
-            ).exists()
+            return membership.has_role(request, budget_manager_id, [UserAccess.EDIT, UserAccess.ADMIN])
         
         return False
 
@@ -52,19 +44,8 @@ class IsAdminOfBudgetManager(permissions.BasePermission):
         return request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
-        user = request.user
-
-        # Check if the user is the admin of the BudgetManager object
-        is_admin_of_budget_manager = obj.admin == user
-
-        # Check if the user has an entry in UserAccess with role 'admin' for the BudgetManager
-        has_admin_role_in_user_access = UserAccess.objects.filter(
-            user=user,
-            budget_manager=obj,
-            role=UserAccess.ADMIN
-        ).exists()
-
-        return is_admin_of_budget_manager and has_admin_role_in_user_access
+        # Check if the user is the admin of the BudgetManager object and has an entry in UserAccess with role 'admin' for it
+        return membership.is_budget_admin(request, obj)
 
 # unsure what is this permission class for
 class IsAdminOfRelatedBudgetManager(permissions.BasePermission):
@@ -73,7 +54,21 @@ class IsAdminOfRelatedBudgetManager(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, AccessRequest):
-            return obj.budget_manager.admin == request.user
+            return obj.budget_manager.admin_id == request.user.id
         if isinstance(obj, UserAccess):
-            return obj.budget_manager.admin == request.user
-        return False
\ No newline at end of file
+            return obj.budget_manager.admin_id == request.user.id
+        return False
+
+# async permission checks used by the ASGI read views (async_views.py), same rules as their sync counterparts above
+class AsyncIsAuthenticated:
+    async def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated)
+
+class AsyncIsBudgetMember:
+    async def has_permission(self, request, view):
+        budget_manager_id = view.kwargs.get('budget_manager_id')
+
+        if not budget_manager_id:
+            return False
+
+        return await membership.ais_member(request, budget_manager_id)
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import OperationCategory, OperationType
+
+# in-process cache of the operation categories and types (reference data that only changes through the admin panel)
+# the loaded data is keyed by a version token kept in the shared cache:
+# - saving or deleting a category/type bumps the token (see signals.py) and every worker reloads on its next read
+# - the token expires after REFERENCE_DATA_CACHE_TIMEOUT, which bounds staleness when workers don't share a cache
+
+VERSION_CACHE_KEY = 'budgetmanager:reference-version'
+
+_lock = threading.Lock()
+_loaded = None # (version, data)
+
+def _cache():
+    return caches[getattr(settings, 'REFERENCE_DATA_CACHE_ALIAS', 'default')]
+
+def _new_version():
+    return str(time.time())
+
+def get_version():
+    version = _cache().get(VERSION_CACHE_KEY)
+    if version is None:
+        # add() keeps the token of a worker that got there first
+        _cache().add(VERSION_CACHE_KEY, _new_version(), getattr(settings, 'REFERENCE_DATA_CACHE_TIMEOUT', 300))
+        version = _cache().get(VERSION_CACHE_KEY) or _new_version()
+    return version
+
+def bump_version():
+    _cache().set(VERSION_CACHE_KEY, _new_version(), getattr(settings, 'REFERENCE_DATA_CACHE_TIMEOUT', 300))
+
+def _load(version):
+    categories = list(OperationCategory.objects.order_by('id'))
+    types = list(OperationType.objects.order_by('id'))
+
+    category_list = [{'id': category.id, 'name': category.name} for category in categories]
+    type_list = [{'id': operation_type.id, 'name': operation_type.name} for operation_type in types]
+
+    return {
+        'version': version,
+        # when this content was loaded, the best Last-Modified available without a timestamp column
+        'last_modified': float(version),
+        'categories': category_list,
+        'types': type_list,
+        # content based validators stay the same across workers and token expiry as long as the data doesn't change
+        'categories_etag': _content_hash(category_list),
+        'types_etag': _content_hash(type_list),
+        'category_by_id': {category.id: category for category in categories},
+        'type_by_id': {operation_type.id: operation_type for operation_type in types},
+    }
+
+def _content_hash(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+def get_reference_data():
+    global _loaded
+    version = get_version()
+    loaded = _loaded
+    if loaded is not None and loaded[0] == version:
+        return loaded[1]
+
+    with _lock:
+        if _loaded is None or _loaded[0] != version:
+            _loaded = (version, _load(version))
+        return _loaded[1]
+
+# category/type instances resolved from the cache, None for unknown ids
+# the instances are shared between requests and must not be modified
+def get_category(category_id):
+    return get_reference_data()['category_by_id'].get(category_id)
+
+def get_type(type_id):
+    return get_reference_data()['type_by_id'].get(type_id)
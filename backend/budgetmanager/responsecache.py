@@ -0,0 +1,233 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.http import HttpResponse
+
+from . import membership, reference
+
+# server-side cache of rendered responses of per-budget read endpoints (ResponseCacheMixin)
+# - the key covers the endpoint, budget manager, caller's role, query parameters, response format and the budget version,
+#   so any write to the budget (which bumps its version, see changes.py and signals.py) makes its entries unreachable
+#   at once, there is nothing to invalidate and the cache is safe to keep per worker
+# - entries live in the cache alias RESPONSE_CACHE_ALIAS: LRUMemoryCache below (per worker, bounded by bytes), Django's
+#   file based cache or a shared one (Redis, Memcached)
+# - hits, misses and stores are counted per worker, together with the backend's own numbers they are returned by
+#   response-cache/stats/ (staff only) for tuning the memory bound
+
+CACHE_KEY_PREFIX = 'budgetmanager:response'
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def _cache():
+    return caches[_setting('RESPONSE_CACHE_ALIAS', 'responses')]
+
+class ResponseCacheStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.stores = 0
+            self.too_large = 0 # responses above RESPONSE_CACHE_MAX_ENTRY_BYTES, never stored
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'stores': self.stores,
+                'too_large': self.too_large,
+            }
+
+stats = ResponseCacheStats()
+
+def get_stats():
+    backend = _cache()
+    return {
+        **stats.as_dict(),
+        'backend': f'{type(backend).__module__}.{type(backend).__name__}',
+        **(backend.stats() if hasattr(backend, 'stats') else {}),
+    }
+
+# rendered response of a cacheable request, HttpResponse instead of the DRF Response since nothing is left to render
+class CachedResponse:
+    def __init__(self, content, content_type):
+        self.content = content
+        self.content_type = content_type
+
+    def to_response(self):
+        response = HttpResponse(self.content, content_type=self.content_type)
+        response.headers['X-Response-Cache'] = 'hit'
+        return response
+
+# caches the GET responses of a per-budget view (budget_manager_id url kwarg) for callers who are members of the budget,
+# meant to sit right after BudgetVersionETagMixin so a matching If-None-Match is still answered without the cache
+class ResponseCacheMixin:
+    def get(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        if key is None:
+            return super().get(request, *args, **kwargs)
+
+        cached = _cache().get(key)
+        if cached is not None:
+            stats.count('hits')
+            return cached.to_response()
+
+        stats.count('misses')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            response.headers['X-Response-Cache'] = 'miss'
+            response.add_post_render_callback(lambda rendered: store(key, rendered))
+        return response
+
+    # None for requests that aren't cached: cache disabled, missing budget, not a member
+    def get_response_cache_key(self, request):
+        if not _setting('RESPONSE_CACHE_ENABLED', True):
+            return None
+
+        budget_manager = membership.get_budget_manager(request, self.kwargs.get('budget_manager_id'))
+        if budget_manager is None:
+            return None
+        role = membership.get_role(request, budget_manager.id)
+        if role is None:
+            return None
+
+        query = sorted(request.query_params.lists())
+        # unique_id tells apart budget managers that got the id of a deleted one (rolled back tests, restored databases),
+        # the reference data version covers categories and types embedded by the serializers
+        variant = repr((
+            type(self).__name__, str(budget_manager.unique_id), role, request.path, query, request.accepted_media_type,
+            reference.get_version(),
+        ))
+        variant_hash = hashlib.sha1(variant.encode('utf-8')).hexdigest()
+        return f'{CACHE_KEY_PREFIX}:{budget_manager.id}:{budget_manager.version}:{variant_hash}'
+
+def store(key, response):
+    if len(response.content) > _setting('RESPONSE_CACHE_MAX_ENTRY_BYTES', 1024 * 1024):
+        stats.count('too_large')
+        return
+    _cache().set(key, CachedResponse(response.content, response['Content-Type']), _setting('RESPONSE_CACHE_TIMEOUT', 300))
+    stats.count('stores')
+
+# entries of one LRUMemoryCache location, shared by the cache instances of every thread (like Django's LocMemCache)
+class _LRUStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # key: (pickled value, expires at or None), least recently used first
+        self.size = 0
+        self.evictions = 0
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+# in-memory cache evicting the least recently used entries once the pickled values exceed OPTIONS['MAX_BYTES']
+# (Django's LocMemCache only bounds the number of entries, however large they are)
+class LRUMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        self.max_bytes = int(params.get('OPTIONS', {}).get('MAX_BYTES', 64 * 1024 * 1024))
+        with _stores_lock:
+            self.store = _stores.setdefault(name, _LRUStore())
+
+    def _fetch(self, key):
+        entry = self.store.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key):
+        pickled, expires_at = self.store.entries.pop(key)
+        self.store.size -= len(pickled)
+
+    def _put(self, key, value, timeout):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if len(pickled) > self.max_bytes:
+            return False
+        if key in self.store.entries:
+            self._remove(key)
+        self.store.entries[key] = (pickled, self.get_backend_timeout(timeout))
+        self.store.size += len(pickled)
+        while self.store.size > self.max_bytes:
+            oldest = next(iter(self.store.entries))
+            self._remove(oldest)
+            self.store.evictions += 1
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self.store.lock:
+            if self._fetch(key) is not None:
+                return False
+            return self._put(key, value, timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self.store.lock:
+            entry = self._fetch(key)
+            if entry is None:
+                return default
+            self.store.entries.move_to_end(key)
+            pickled = entry[0]
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self.store.lock:
+            self._put(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self.store.lock:
+            entry = self._fetch(key)
+            if entry is None:
+                return False
+            self.store.entries[key] = (entry[0], self.get_backend_timeout(timeout))
+            return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self.store.lock:
+            if self._fetch(key) is None:
+                return False
+            self._remove(key)
+            return True
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self.store.lock:
+            return self._fetch(key) is not None
+
+    def clear(self):
+        with self.store.lock:
+            self.store.entries.clear()
+            self.store.size = 0
+
+    def stats(self):
+        with self.store.lock:
+            return {
+                'entries': len(self.store.entries),
+                'bytes': self.store.size,
+                'max_bytes': self.max_bytes,
+                'evictions': self.store.evictions,
+            }
@@ -0,0 +1,139 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Operation, OperationMonthlyRollup
+
+# rollup row key of an operation: (budget_manager_id, first day of month, category_id, type_id)
+def rollup_key(operation):
+    return (operation.budget_manager_id, operation.date.replace(day=1), operation.category_id, operation.type_id)
+
+# snapshot of the fields a rollup depends on, taken before an operation is edited or deleted
+def snapshot(operation):
+    return (rollup_key(operation), operation.value)
+
+def add_operations(operations):
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for operation in operations:
+        delta = deltas[rollup_key(operation)]
+        delta[0] += Decimal(operation.value)
+        delta[1] += 1
+    apply_deltas(deltas)
+
+def remove_operations(operations):
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for operation in operations:
+        delta = deltas[rollup_key(operation)]
+        delta[0] -= Decimal(operation.value)
+        delta[1] -= 1
+    apply_deltas(deltas)
+
+# moves an edited operation from the rollup row it was counted in (old snapshot) to its current one
+# handles edits that change the month, category, type or value of an operation
+def update_operation(old_snapshot, operation):
+    old_key, old_value = old_snapshot
+    new_key = rollup_key(operation)
+
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    deltas[old_key][0] -= Decimal(old_value)
+    deltas[old_key][1] -= 1
+    deltas[new_key][0] += Decimal(operation.value)
+    deltas[new_key][1] += 1
+    apply_deltas(deltas)
+
+# applies {key: [total, count]} deltas with atomic UPDATE ... SET total = total + delta statements
+# must be called inside the transaction of the Operation write it accounts for
+def apply_deltas(deltas):
+    with transaction.atomic():
+        for (budget_manager_id, month, category_id, type_id), (total, count) in deltas.items():
+            if not total and not count:
+                continue
+
+            lookup = {
+                'budget_manager_id': budget_manager_id,
+                'month': month,
+                'category_id': category_id,
+                'type_id': type_id,
+            }
+            if _increment(lookup, total, count):
+                continue
+
+            try:
+                # savepoint, so a concurrent insert of the same row doesn't break the outer transaction
+                with transaction.atomic():
+                    OperationMonthlyRollup.objects.create(total=total, count=count, **lookup)
+            except IntegrityError:
+                _increment(lookup, total, count)
+
+def _increment(lookup, total, count):
+    queryset = OperationMonthlyRollup.objects.filter(**lookup)
+
+    if lookup['category_id'] is None or lookup['type_id'] is None:
+        # null category/type rows aren't protected by the unique constraint, so only the first of them is updated;
+        # reads always SUM over the rollup key which keeps possible duplicates harmless
+        rollup_id = queryset.values_list('id', flat=True).first()
+        if rollup_id is None:
+            return False
+        queryset = OperationMonthlyRollup.objects.filter(id=rollup_id)
+
+    return queryset.update(total=F('total') + total, count=F('count') + count) > 0
+
+# recomputes the rollup rows of the given budget managers (or all of them) directly from Operation
+def compute_rollups(budget_manager_ids=None):
+    queryset = Operation.objects.all()
+    if budget_manager_ids is not None:
+        queryset = queryset.filter(budget_manager_id__in=budget_manager_ids)
+
+    rows = (
+        queryset.annotate(month=TruncMonth('date'))
+        .values('budget_manager_id', 'month', 'category_id', 'type_id')
+        .annotate(total=Sum('value'), count=Count('id'))
+        .order_by()
+    )
+    return {
+        (row['budget_manager_id'], row['month'], row['category_id'], row['type_id']): (Decimal(row['total']), row['count'])
+        for row in rows
+    }
+
+# current rollup table contents, duplicates (possible for null keys) summed up the same way reads do
+def stored_rollups(budget_manager_ids=None):
+    queryset = OperationMonthlyRollup.objects.all()
+    if budget_manager_ids is not None:
+        queryset = queryset.filter(budget_manager_id__in=budget_manager_ids)
+
+    rows = (
+        queryset.values('budget_manager_id', 'month', 'category_id', 'type_id')
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by()
+    )
+    return {
+        (row['budget_manager_id'], row['month'], row['category_id'], row['type_id']): (Decimal(row['total']), row['count'])
+        for row in rows
+        if row['count']
+    }
+
+def rebuild_rollups(budget_manager_ids=None):
+    with transaction.atomic():
+        computed = compute_rollups(budget_manager_ids)
+
+        queryset = OperationMonthlyRollup.objects.all()
+        if budget_manager_ids is not None:
+            queryset = queryset.filter(budget_manager_id__in=budget_manager_ids)
+        queryset.delete()
+
+        OperationMonthlyRollup.objects.bulk_create([
+            OperationMonthlyRollup(
+                budget_manager_id=budget_manager_id,
+                month=month,
+                category_id=category_id,
+                type_id=type_id,
+                total=total,
+                count=count,
+            )
+            for (budget_manager_id, month, category_id, type_id), (total, count) in computed.items()
+        ], batch_size=1000)
+
+    return len(computed)
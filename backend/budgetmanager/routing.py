@@ -0,0 +1,197 @@
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# read replica routing (ReplicaRouter in DATABASE_ROUTERS, ReplicaRoutingMiddleware in MIDDLEWARE)
+# - reads of GET/HEAD/OPTIONS requests go to one of the DATABASE_REPLICAS aliases, everything else to the primary
+# - once a request writes (or opens a transaction) the rest of it reads from the primary too
+# - a user who wrote stays on the primary for DATABASE_REPLICA_STICKY_SECONDS, so they always see their own change
+# - replicas are health checked at most every DATABASE_REPLICA_HEALTH_INTERVAL seconds per worker, unreachable
+#   replicas and replicas lagging more than DATABASE_REPLICA_MAX_LAG_SECONDS are skipped until the next check
+# without replicas configured the router sends everything to the primary and the middleware removes itself
+# (locally: add a second alias for the same database with 'TEST': {'MIRROR': 'default'} and list it in DATABASE_REPLICAS)
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def replica_aliases():
+    return list(_setting('DATABASE_REPLICAS', []))
+
+# routing decision of the current request, shared with the threads sync_to_async runs its queries on
+@dataclass
+class RoutingState:
+    replica: str = None # alias the request reads from, None for the primary
+    wrote: bool = False
+
+_state = ContextVar('budgetmanager_routing_state', default=None)
+
+def start_request(replica):
+    return _state.set(RoutingState(replica=replica))
+
+def end_request(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+def use_primary():
+    state = _state.get()
+    if state is not None:
+        state.replica = None
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # DatabaseCache entries (the sticky cache) must never be read from a lagging replica
+        if model._meta.app_label == 'django_cache':
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        # reads inside a transaction belong to it (select_for_update, read-modify-write)
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    # replicas hold the same data as the primary
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    # replicas get their schema through replication
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+# health of the replicas as seen by this worker
+class ReplicaHealth:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.healthy = {}
+        self.checked_at = 0.0
+
+    def check_due(self):
+        return time.monotonic() - self.checked_at >= _setting('DATABASE_REPLICA_HEALTH_INTERVAL', 10)
+
+    def refresh(self):
+        # one request per worker runs the check, the others use the previous results meanwhile
+        if self.lock.acquire(blocking=False):
+            try:
+                self.healthy = {alias: self.check(alias) for alias in replica_aliases()}
+                self.checked_at = time.monotonic()
+            finally:
+                self.lock.release()
+
+    def healthy_replicas(self):
+        return [alias for alias in replica_aliases() if self.healthy.get(alias, True)]
+
+    def check(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                lag = self.replication_lag(cursor)
+        except Exception:
+            logger.warning('Database replica %s is unreachable, reading from the primary.', alias, exc_info=True)
+            return False
+
+        max_lag = _setting('DATABASE_REPLICA_MAX_LAG_SECONDS', 30)
+        if lag is not None and lag > max_lag:
+            logger.warning('Database replica %s is %.1f seconds behind, reading from the primary.', alias, lag)
+            return False
+        return True
+
+    # seconds the replica is behind the primary, 0 while it has replayed everything it received
+    def replication_lag(self, cursor):
+        if cursor.db.vendor != 'postgresql':
+            cursor.execute('SELECT 1')
+            return None
+        cursor.execute("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+            END
+        """)
+        lag = cursor.fetchone()[0]
+        return float(lag) if lag is not None else None
+
+    # a query on the replica failed mid-request, skip it until the next check
+    def mark_unhealthy(self, alias):
+        self.healthy[alias] = False
+        self.checked_at = time.monotonic()
+
+health = ReplicaHealth()
+
+def choose_replica():
+    if health.check_due():
+        health.refresh()
+    replicas = health.healthy_replicas()
+    return random.choice(replicas) if replicas else None
+
+async def achoose_replica():
+    if health.check_due():
+        await sync_to_async(health.refresh)()
+    replicas = health.healthy_replicas()
+    return random.choice(replicas) if replicas else None
+
+# users who wrote recently read from the primary, shared between workers through the cache
+# a process-local cache would only keep a user on the primary for the worker that served the write, the next read could
+# go to another worker and a lagging replica, so sticky_cache_error() rejects those backends (see checks.py and
+# ReplicaRoutingMiddleware)
+
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+    'budgetmanager.responsecache.LRUMemoryCache',
+)
+
+def sticky_cache_error():
+    if not replica_aliases() or not _setting('DATABASE_REPLICA_STICKY_SECONDS', 5):
+        return None
+    alias = _setting('DATABASE_REPLICA_STICKY_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend is None:
+        return f"DATABASE_REPLICA_STICKY_CACHE_ALIAS '{alias}' is not a cache alias."
+    if backend in PROCESS_LOCAL_CACHE_BACKENDS:
+        return (
+            f"DATABASE_REPLICA_STICKY_CACHE_ALIAS '{alias}' uses {backend}, which isn't shared between workers; "
+            "point it to a shared cache (database, Redis, Memcached) or set DATABASE_REPLICA_STICKY_SECONDS to 0."
+        )
+    return None
+
+def _cache():
+    return caches[_setting('DATABASE_REPLICA_STICKY_CACHE_ALIAS', 'default')]
+
+def _sticky_key(user_id):
+    return f'budgetmanager:sticky-primary:{user_id}'
+
+def mark_wrote(user_id):
+    sticky_seconds = _setting('DATABASE_REPLICA_STICKY_SECONDS', 5)
+    if sticky_seconds:
+        _cache().set(_sticky_key(user_id), True, sticky_seconds)
+
+def is_sticky(user_id):
+    return _cache().get(_sticky_key(user_id)) is not None
+
+async def amark_wrote(user_id):
+    sticky_seconds = _setting('DATABASE_REPLICA_STICKY_SECONDS', 5)
+    if sticky_seconds:
+        await _cache().aset(_sticky_key(user_id), True, sticky_seconds)
+
+async def ais_sticky(user_id):
+    return await _cache().aget(_sticky_key(user_id)) is not None
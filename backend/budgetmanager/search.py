@@ -0,0 +1,124 @@
+import re
+
+from django.db import connections, router
+
+from .models import Operation
+
+# ranked full-text search over the titles of a budget manager's operations, backed by the index of migration 0011
+# every word of the query has to match a word of the title, either as a prefix ("electr" finds "Electricity")
+# or, from MIN_FUZZY_LENGTH characters on, as a close misspelling ("electicity")
+# - SQLite: FTS5 MATCH ranked by bm25, misspellings are expanded to indexed terms within MAX_EDIT_DISTANCE edits
+# - PostgreSQL: tsquery prefix match or trigram word similarity (<%, pg_trgm.word_similarity_threshold),
+#   ranked by ts_rank + similarity
+# - other databases: unranked icontains filter (no index)
+
+MAX_QUERY_WORDS = 8
+MIN_FUZZY_LENGTH = 4
+MAX_EDIT_DISTANCE = 2 # 1 for words shorter than 7 characters
+MAX_FUZZY_TERMS = 10 # indexed terms a misspelled word is expanded to
+
+def query_words(query):
+    return re.findall(r'\w+', query.lower())[:MAX_QUERY_WORDS]
+
+# ids of at most limit matching operations, best match first
+def search_operation_ids(budget_manager_id, query, limit, offset=0):
+    words = query_words(query)
+    if not words:
+        return []
+
+    connection = connections[router.db_for_read(Operation)]
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(connection, budget_manager_id, words, limit, offset)
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(connection, budget_manager_id, words, limit, offset)
+    return _search_fallback(budget_manager_id, words, limit, offset)
+
+# operations of the ids, in the order of the ids
+def operations_in_order(ids, queryset):
+    operations = queryset.in_bulk(ids)
+    return [operations[operation_id] for operation_id in ids if operation_id in operations]
+
+def _search_sqlite(connection, budget_manager_id, words, limit, offset):
+    match = f'budget_manager_id:"{int(budget_manager_id)}" AND title:(' + ' AND '.join(_sqlite_word_expression(connection, word) for word in words) + ')'
+    with connection.cursor() as cursor:
+        # bm25 is lower for better matches, only the title column is weighted
+        cursor.execute(
+            """
+            SELECT rowid
+            FROM budgetmanager_operation_fts
+            WHERE budgetmanager_operation_fts MATCH %s
+            ORDER BY bm25(budgetmanager_operation_fts, 1.0, 0.0), rowid DESC
+            LIMIT %s OFFSET %s
+            """,
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+# "electicity" -> ("electicity"* OR "electricity"), words only contain \w characters so quoting them is enough
+def _sqlite_word_expression(connection, word):
+    alternatives = [f'"{word}"*'] + [f'"{term}"' for term in _fuzzy_terms(connection, word)]
+    return '(' + ' OR '.join(alternatives) + ')'
+
+def _fuzzy_terms(connection, word):
+    if len(word) < MIN_FUZZY_LENGTH:
+        return []
+
+    terms = _indexed_terms(connection, word[0])
+    max_distance = 1 if len(word) < 7 else MAX_EDIT_DISTANCE
+    candidates = []
+    for term in terms:
+        if term.startswith(word) or abs(len(term) - len(word)) > max_distance:
+            continue
+        distance = _edit_distance(word, term, max_distance)
+        if distance <= max_distance:
+            candidates.append((distance, term))
+    return [term for distance, term in sorted(candidates)[:MAX_FUZZY_TERMS]]
+
+# distinct indexed terms starting with the letter, a range over the sorted terms of the fts5vocab table
+# (titles share a small vocabulary, so this stays short even with millions of operations)
+def _indexed_terms(connection, letter):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT term FROM budgetmanager_operation_fts_vocab WHERE col = 'title' AND term >= %s AND term < %s",
+            [letter, letter + '\U0010ffff'],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+# Levenshtein distance, stops early once every path exceeds max_distance
+def _edit_distance(source, target, max_distance):
+    previous = list(range(len(target) + 1))
+    for i, source_char in enumerate(source, start=1):
+        current = [i]
+        for j, target_char in enumerate(target, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (source_char != target_char),
+            ))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+def _search_postgresql(connection, budget_manager_id, words, limit, offset):
+    tsquery = ' & '.join(f'{word}:*' for word in words)
+    text = ' '.join(words)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT id
+            FROM budgetmanager_operation, to_tsquery('simple', %s) AS query
+            WHERE budget_manager_id = %s
+              AND (to_tsvector('simple', title) @@ query OR %s <%% title)
+            ORDER BY ts_rank(to_tsvector('simple', title), query) + word_similarity(%s, title) DESC, id DESC
+            LIMIT %s OFFSET %s
+            """,
+            [tsquery, budget_manager_id, text, text, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def _search_fallback(budget_manager_id, words, limit, offset):
+    queryset = Operation.objects.filter(budget_manager_id=budget_manager_id)
+    for word in words:
+        queryset = queryset.filter(title__icontains=word)
+    return list(queryset.order_by('-date', '-id').values_list('id', flat=True)[offset:offset + limit])
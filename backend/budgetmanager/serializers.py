@@ -1,14 +1,41 @@
 from datetime import date
+import codecs
 import os
 import re
-import requests
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import OperationCategory, OperationType, BudgetManager, Operation, UserAccess, AccessRequest
+from .analytics import GROUP_BY_FIELDS
+from .importers import DEFAULT_COLUMNS
+from .exporters import CONTENT_TYPES
+from .filters import ORDERINGS, DEFAULT_ORDERING
+from .search import query_words
+from . import mail, membership, reference
+
+# primary key field resolved from the cached reference data (categories/types) instead of a query per value
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    def __init__(self, resolve, **kwargs):
+        self.resolve = resolve
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        instance = self.resolve(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -45,13 +72,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
-            is_active=False
-        )
-        self.send_confirmation_email(user)
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username=validated_data['username'],
+                email=validated_data['email'],
+                password=validated_data['password'],
+                is_active=False
+            )
+            self.send_confirmation_email(user)
         
         return user
     
@@ -65,13 +93,8 @@ class RegisterSerializer(serializers.ModelSerializer):
         subject = 'Confirm your registration'
         body = f'Click the following link to confirm your registration: {full_link}'
 
-        payload = {
-            "to": user.email,
-            "subject": subject,
-            "body": body
-        }
-
-        requests.post('https://prod2-01.germanywestcentral.logic.azure.com:443/workflows/2ea9f7197eb545cd8bca2e4845cedc0d/triggers/When_a_HTTP_request_is_received/paths/invoke?api-version=2016-10-01&sp=%2Ftriggers%2FWhen_a_HTTP_request_is_received%2Frun&sv=1.0&sig=HKgkkRmRKlDPNilqpFhWTtr1BeHEA6PGANXifu3K5ao', json=payload)
+        # sent by the email outbox worker (manage.py run_email_outbox), registration doesn't wait for the webhook
+        mail.enqueue_email(user.email, subject, body)
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
@@ -95,7 +118,8 @@ class BudgetManagerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BudgetManager
-        fields = '__all__'
+        # version and deleted_at are internal (ETags/delta sync and the background deletion)
+        fields = ['id', 'unique_id', 'name', 'admin']
         read_only_fields = ['id', 'unique_id', 'admin']
 
     def validate_name(self, value):
@@ -105,16 +129,31 @@ class BudgetManagerSerializer(serializers.ModelSerializer):
         if self.instance and self.instance.name == value:
             raise serializers.ValidationError("The new name cannot be the same as the current name.")
         
-        if BudgetManager.objects.filter(admin=user, name=value).exists():
+        if BudgetManager.objects.filter(admin_id=user.id, name=value).exists():
             raise serializers.ValidationError("You already have a budget with this name.")
         return value
 
     def create(self, validated_data):
         request = self.context['request']
         # Automatically assign the current user as the admin
-        validated_data['admin'] = request.user
+        validated_data['admin_id'] = request.user.id
         return super().create(validated_data)
 
+# budget list entry, the summary fields come from BudgetManager.objects.with_summaries
+class BudgetManagerSummarySerializer(BudgetManagerSerializer):
+    role = serializers.CharField(read_only=True)
+    balance = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    operation_count = serializers.IntegerField(read_only=True)
+    last_activity = serializers.DateField(read_only=True)
+    pending_access_requests = serializers.IntegerField(read_only=True, allow_null=True)
+
+    class Meta(BudgetManagerSerializer.Meta):
+        fields = BudgetManagerSerializer.Meta.fields + ['role', 'balance', 'operation_count', 'last_activity', 'pending_access_requests']
+
+# operation fields of every read and write, the sync bookkeeping (change_seq, updated_at) only goes out in operations/changes/
+OPERATION_FIELDS = ['id', 'budget_manager', 'type', 'date', 'title', 'category', 'value', 'by']
+OPERATION_SYNC_FIELDS = ['change_seq', 'updated_at']
+
 class OperationListSerializer(serializers.ModelSerializer):
     by = UserSerializer()
     category = OperationCategorySerializer()
@@ -123,17 +162,37 @@ class OperationListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Operation
-        fields = '__all__'
+        fields = OPERATION_FIELDS
+
+# flattened operation for ?compact=true lists, related objects are reduced to their id and name
+# and the budget manager (the same one for every row) is left out
+class OperationCompactSerializer(serializers.ModelSerializer):
+    type_name = serializers.CharField(source='type.name', read_only=True, default=None)
+    category_name = serializers.CharField(source='category.name', read_only=True, default=None)
+    by_username = serializers.CharField(source='by.username', read_only=True, default=None)
+
+    class Meta:
+        model = Operation
+        fields = ['id', 'date', 'title', 'value', 'type', 'type_name', 'category', 'category_name', 'by', 'by_username']
+
+# operations of the delta sync (operations/changes/), with the budget version of their last write
+class OperationSyncSerializer(OperationListSerializer):
+    class Meta(OperationListSerializer.Meta):
+        fields = OPERATION_FIELDS + OPERATION_SYNC_FIELDS
+
+class OperationCompactSyncSerializer(OperationCompactSerializer):
+    class Meta(OperationCompactSerializer.Meta):
+        fields = OperationCompactSerializer.Meta.fields + OPERATION_SYNC_FIELDS
 
 class OperationSerializer(serializers.ModelSerializer):
     by = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False, allow_null=True)
-    category = serializers.PrimaryKeyRelatedField(queryset=OperationCategory.objects.all())
-    type = serializers.PrimaryKeyRelatedField(queryset=OperationType.objects.all())
+    category = ReferencePrimaryKeyRelatedField(reference.get_category, queryset=OperationCategory.objects.all())
+    type = ReferencePrimaryKeyRelatedField(reference.get_type, queryset=OperationType.objects.all())
     budget_manager = BudgetManagerSerializer(read_only=True, required=False)
 
     class Meta:
         model = Operation
-        fields = '__all__'
+        fields = OPERATION_FIELDS
         read_only_fields = ['budget_manager']
         
     def validate_by(self, value):
@@ -144,12 +203,10 @@ class OperationSerializer(serializers.ModelSerializer):
         budget_manager_id = self.context['view'].kwargs.get('budget_manager_id')
         
         # Check if the user specified in 'by' is a member of the BudgetManager
-        try:
-            budget_manager = BudgetManager.objects.get(id=budget_manager_id)
-        except BudgetManager.DoesNotExist:
+        if membership.get_budget_manager(request, budget_manager_id) is None:
             raise serializers.ValidationError("Invalid budget_manager_id.")
         
-        if not UserAccess.objects.filter(user=value, budget_manager=budget_manager).exists():
+        if not membership.is_member(request, budget_manager_id, user_id=value.id):
             raise serializers.ValidationError("The specified user is not a member of this budget manager.")
         
         return value
@@ -181,9 +238,8 @@ class OperationSerializer(serializers.ModelSerializer):
         budget_manager_id = self.context['view'].kwargs.get('budget_manager_id')
 
         # Retrieve the BudgetManager object based on budget_manager_id
-        try:
-            budget_manager = BudgetManager.objects.get(id=budget_manager_id)
-        except BudgetManager.DoesNotExist:
+        budget_manager = membership.get_budget_manager(self.context['request'], budget_manager_id)
+        if budget_manager is None:
             raise serializers.ValidationError("Invalid budget_manager_id.")
 
         # Assign the budget_manager to the validated data
@@ -202,6 +258,20 @@ class OperationSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
     
+# item of a bulk create, only validated here: OperationBulkCreateView inserts the whole batch with bulk_create
+# 'by' is checked against the budget's members loaded once for the whole batch (context['members'])
+class OperationBulkItemSerializer(OperationSerializer):
+    by = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate_by(self, value):
+        if value is None:
+            return value  # Allow null value
+
+        member = self.context['members'].get(value)
+        if member is None:
+            raise serializers.ValidationError("The specified user is not a member of this budget manager.")
+        return member
+    
 class UserAccessSerializer(serializers.ModelSerializer):
     user = UserSerializer()
     budget_manager = BudgetManagerSerializer()
@@ -214,15 +284,13 @@ class UserAccessSerializer(serializers.ModelSerializer):
     def validate(self, data):
         request = self.context['request']
         budget_manager_id = self.context['view'].kwargs['budget_manager_id']
-        user = request.user
 
-        try:
-            budget_manager = BudgetManager.objects.get(id=budget_manager_id)
-        except BudgetManager.DoesNotExist:
+        budget_manager = membership.get_budget_manager(request, budget_manager_id)
+        if budget_manager is None:
             raise serializers.ValidationError("BudgetManager does not exist.")
 
         # Check if the requesting user is the admin of the BudgetManager
-        if budget_manager.admin != user or not UserAccess.objects.filter(user=user, budget_manager=budget_manager, role=UserAccess.ADMIN).exists():
+        if not membership.is_budget_admin(request, budget_manager):
             raise serializers.ValidationError("Only the admin can add user access.")
         
         # Check if 'role' is not provided or is set to 'admin' or 'edit'
@@ -234,11 +302,18 @@ class UserAccessSerializer(serializers.ModelSerializer):
 
         # Check if a UserAccess object already exists for the given user and budget_manager
         user_id = data['user'].id
-        if UserAccess.objects.filter(budget_manager_id=budget_manager_id, user_id=user_id).exists():
+        if membership.is_member(request, budget_manager_id, user_id=user_id):
             raise serializers.ValidationError("User already has access to this budget manager.")
 
         return data
     
+class UserAccessCompactSerializer(serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+
+    class Meta:
+        model = UserAccess
+        fields = ['id', 'user', 'role']
+    
 class UserAccessUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserAccess
@@ -255,17 +330,16 @@ class UserAccessUpdateSerializer(serializers.ModelSerializer):
         user = request.user
         
         # Ensure the user making the request is the admin of the BudgetManager
-        try:
-            budget_manager = BudgetManager.objects.get(id=budget_manager_id)
-        except BudgetManager.DoesNotExist:
+        budget_manager = membership.get_budget_manager(request, budget_manager_id)
+        if budget_manager is None:
             raise serializers.ValidationError("BudgetManager does not exist.")
         
-        if budget_manager.admin != user:
+        if budget_manager.admin_id != user.id:
             raise serializers.ValidationError("Only the admin can change user roles.")
 
         # Prevent admin from downgrading their own role
         user_access_instance = self.instance
-        if user_access_instance.user == user and user_access_instance.role == UserAccess.ADMIN:
+        if user_access_instance.user_id == user.id and user_access_instance.role == UserAccess.ADMIN:
             raise serializers.ValidationError("Admin cannot downgrade their own role.")
         
         return data
@@ -279,6 +353,13 @@ class AccessRequestSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'budget_manager', 'status', 'created_at', 'updated_at']
         read_only_fields = ['budget_manager', 'status', 'created_at', 'updated_at']
 
+class AccessRequestCompactSerializer(serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+
+    class Meta:
+        model = AccessRequest
+        fields = ['id', 'user', 'status', 'created_at', 'updated_at']
+
 class AccessRequestCreateSerializer(serializers.ModelSerializer):
     unique_id = serializers.UUIDField(write_only=True)
 
@@ -297,11 +378,11 @@ class AccessRequestCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("BudgetManager does not exist with the provided unique_id.")
 
         # Check for existing pending access request
-        if AccessRequest.objects.filter(user=user, budget_manager=budget_manager, status=AccessRequest.PENDING).exists():
+        if AccessRequest.objects.filter(user_id=user.id, budget_manager=budget_manager, status=AccessRequest.PENDING).exists():
             raise serializers.ValidationError("There is already a pending access request for this user.")
 
         # Check for existing user access
-        if UserAccess.objects.filter(user=user, budget_manager=budget_manager).exists():
+        if membership.is_member(request, budget_manager.id):
             raise serializers.ValidationError("User already has access to this budget manager.")
 
         data['budget_manager'] = budget_manager
@@ -311,7 +392,7 @@ class AccessRequestCreateSerializer(serializers.ModelSerializer):
         request = self.context['request']
         user = request.user
         budget_manager = validated_data['budget_manager']
-        return AccessRequest.objects.create(user=user, budget_manager=budget_manager)
+        return AccessRequest.objects.create(user_id=user.id, budget_manager=budget_manager)
 
 class AccessRequestUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -328,12 +409,11 @@ class AccessRequestUpdateSerializer(serializers.ModelSerializer):
         user = request.user
         budget_manager_id = self.context['view'].kwargs['budget_manager_id']
 
-        try:
-            budget_manager = BudgetManager.objects.get(id=budget_manager_id)
-        except BudgetManager.DoesNotExist:
+        budget_manager = membership.get_budget_manager(request, budget_manager_id)
+        if budget_manager is None:
             raise serializers.ValidationError("BudgetManager does not exist.")
 
-        if budget_manager.admin != user:
+        if budget_manager.admin_id != user.id:
             raise serializers.ValidationError("Only the admin can update access requests.")
 
         instance.status = validated_data.get('status', instance.status)
@@ -347,4 +427,137 @@ class AccessRequestUpdateSerializer(serializers.ModelSerializer):
                 role=UserAccess.READ_ONLY
             )
 
-        return instance
\ No newline at end of file
+        return instance
+
+# body of the batch endpoints: ids of the access requests/memberships and the decision applied to all of them (see access.py)
+class BatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        max_batch_size = getattr(settings, 'ACCESS_BATCH_MAX_SIZE', 200)
+        if len(value) > max_batch_size:
+            raise serializers.ValidationError(f"A batch can contain at most {max_batch_size} items.")
+        return value
+
+class AccessRequestBatchSerializer(BatchSerializer):
+    status = serializers.ChoiceField(choices=[AccessRequest.ACCEPTED, AccessRequest.DENIED])
+
+class UserAccessBatchSerializer(BatchSerializer):
+    role = serializers.ChoiceField(choices=[UserAccess.READ_ONLY, UserAccess.EDIT])
+
+class DateRangeQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        date_from = data.get('date_from')
+        date_to = data.get('date_to')
+
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError("date_from cannot be later than date_to.")
+
+        return data
+
+class OperationAnalyticsQuerySerializer(DateRangeQuerySerializer):
+    group_by = serializers.CharField(required=False)
+
+    def validate_group_by(self, value):
+        # comma separated list of dimensions, e.g. "month,type"
+        dimensions = [dimension.strip() for dimension in value.split(',') if dimension.strip()]
+        invalid = [dimension for dimension in dimensions if dimension not in GROUP_BY_FIELDS]
+
+        if not dimensions or invalid:
+            raise serializers.ValidationError(f"group_by must be a comma separated list of: {', '.join(GROUP_BY_FIELDS)}.")
+
+        # keep the canonical order so equal queries produce equal responses
+        return [dimension for dimension in GROUP_BY_FIELDS if dimension in dimensions]
+
+# filters and ordering of the operations list, see filters.filter_operations
+# category and type take comma separated ids (types also by name, e.g. ?type=expense)
+class OperationListQuerySerializer(DateRangeQuerySerializer):
+    category = serializers.CharField(required=False)
+    type = serializers.CharField(required=False)
+    by = serializers.IntegerField(required=False)
+    value_min = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    value_max = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    ordering = serializers.ChoiceField(choices=list(ORDERINGS), default=DEFAULT_ORDERING)
+
+    def validate_category(self, value):
+        category_ids = []
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if not item.isdigit() or reference.get_category(int(item)) is None:
+                raise serializers.ValidationError(f"Unknown category '{item}'.")
+            category_ids.append(int(item))
+        return category_ids
+
+    def validate_type(self, value):
+        types_by_name = {operation_type.name.lower(): operation_type.id for operation_type in reference.get_reference_data()['type_by_id'].values()}
+        type_ids = []
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if item.isdigit() and reference.get_type(int(item)) is not None:
+                type_ids.append(int(item))
+            elif item.lower() in types_by_name:
+                type_ids.append(types_by_name[item.lower()])
+            else:
+                raise serializers.ValidationError(f"Unknown operation type '{item}'.")
+        return type_ids
+
+    def validate(self, data):
+        data = super().validate(data)
+        value_min = data.get('value_min')
+        value_max = data.get('value_max')
+
+        if value_min is not None and value_max is not None and value_min > value_max:
+            raise serializers.ValidationError("value_min cannot be greater than value_max.")
+
+        return data
+
+# ?q (words matched by prefix, or as a close misspelling, see search.py) and page-number paging of the ranked results
+class OperationSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    page = serializers.IntegerField(min_value=1, default=1)
+    page_size = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate_q(self, value):
+        if not query_words(value):
+            raise serializers.ValidationError("q must contain at least one word.")
+        return value
+
+# ?since takes the token of the previous sync, without it the whole list is returned
+class OperationChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, required=False)
+
+class OperationExportQuerySerializer(DateRangeQuerySerializer):
+    output = serializers.ChoiceField(choices=list(CONTENT_TYPES), default='csv')
+
+# options of a CSV upload to budget-managers/<id>/operations/import/ (see importers.OperationImporter)
+class OperationImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    dedupe = serializers.BooleanField(default=False)
+    delimiter = serializers.CharField(default=',', max_length=1, trim_whitespace=False)
+    date_format = serializers.CharField(default='%Y-%m-%d')
+    encoding = serializers.CharField(default='utf-8-sig')
+    default_category = serializers.CharField(required=False)
+    columns = serializers.JSONField(required=False) # {"date": "Booking date", "value": "Amount", ...}
+
+    def validate_encoding(self, value):
+        try:
+            codecs.lookup(value)
+        except LookupError:
+            raise serializers.ValidationError(f"Unknown encoding '{value}'.")
+        return value
+
+    def validate_columns(self, value):
+        if not isinstance(value, dict) or not all(isinstance(column, str) for column in value.values()):
+            raise serializers.ValidationError("columns must be an object mapping operation fields to CSV headers.")
+
+        unknown = [field for field in value if field not in DEFAULT_COLUMNS]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown operation fields: {', '.join(unknown)}.")
+        return value
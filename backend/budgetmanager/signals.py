@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_status
+from .membership import invalidate_role
+from .models import OperationCategory, OperationType, BudgetManager, Operation, UserAccess, AccessRequest
+from . import reference
+
+# keep the shared membership cache in sync with UserAccess writes
+@receiver(post_save, sender=UserAccess)
+@receiver(post_delete, sender=UserAccess)
+def user_access_changed(sender, instance, **kwargs):
+    invalidate_role(instance.user_id, instance.budget_manager_id)
+
+# deactivated or deleted users have to be rejected by StatelessJWTAuthentication right away
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user_status(instance.pk)
+
+# categories and types are cached by every worker until the reference data version changes
+@receiver(post_save, sender=OperationCategory)
+@receiver(post_delete, sender=OperationCategory)
+@receiver(post_save, sender=OperationType)
+@receiver(post_delete, sender=OperationType)
+def reference_data_changed(sender, instance, **kwargs):
+    reference.bump_version()
+
+# operations embed their category and type, so renaming or deleting one (which sets the rows' column to NULL) changes
+# what every budget using it renders (the response cache key covers the reference data version, the ETags don't)
+@receiver(post_save, sender=OperationCategory)
+@receiver(pre_delete, sender=OperationCategory)
+@receiver(post_save, sender=OperationType)
+@receiver(pre_delete, sender=OperationType)
+def reference_rows_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    field = 'category' if sender is OperationCategory else 'type'
+    budget_manager_ids = Operation.objects.filter(**{field: instance}).values('budget_manager_id')
+    BudgetManager.all_objects.filter(id__in=budget_manager_ids).update(version=F('version') + 1)
+
+# renaming a budget manager (or handing it to another admin) changes its payloads as well
+@receiver(post_save, sender=BudgetManager)
+def budget_manager_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and set(update_fields) <= {'version', 'deleted_at'}):
+        return
+    BudgetManager.all_objects.bump_version(instance.pk)
+    instance.refresh_from_db(fields=['version'])
+
+# membership and access request writes move the budget's change counter, which invalidates the ETags derived from it
+# (Operation writes bump it through changes.py, bulk writes bump it themselves)
+@receiver(post_save, sender=UserAccess)
+@receiver(post_delete, sender=UserAccess)
+@receiver(post_save, sender=AccessRequest)
+@receiver(post_delete, sender=AccessRequest)
+def budget_data_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, BudgetManager):
+        return # the whole budget manager is being deleted
+    BudgetManager.objects.bump_version(instance.budget_manager_id)
@@ -1,3 +1,1893 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from . import access, analytics, benchmarking, deletion, events, mail, membership, reference, responsecache, routing, search
+from .checks import check_replica_sticky_cache
+from .filters import filter_operations
+from .middleware import ReplicaRoutingMiddleware
+from .admin import OperationAdmin
+from .authentication import ClaimsUser, StatelessJWTAuthentication
+from .async_views import AsyncBudgetEventsView
+from .exporters import csv_chunks, operation_rows
+from .importers import OperationImporter, OperationImportError
+from .pagination import OperationCursorPagination
+from .views import OperationDeleteView
+from .models import OperationCategory, OperationType, BudgetManager, Operation, UserAccess, AccessRequest, BudgetDeletion, BudgetEvent
+from .models import OutboundEmail
+from .serializers import CustomTokenObtainPairSerializer
+
+# the async views authenticate with the JWT itself (StatelessJWTAuthentication), force_authenticate doesn't reach them
+def bearer(user):
+    return {'Authorization': f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}'}
+
+# the household most tests start from: its admin (authenticated), the income/expense types and a category
+class BudgetFixtureMixin:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.admin = self.create_user('admin')
+        self.budget_manager = self.create_budget('Household', self.admin)
+        self.income = OperationType.objects.create(name='Income')
+        self.expense = OperationType.objects.create(name='Expense')
+        self.type = self.expense
+        self.category = OperationCategory.objects.create(name='Groceries')
+        self.client.force_authenticate(self.admin)
+
+    def create_user(self, username):
+        return User.objects.create_user(username=username, password='Password1!')
+
+    def create_budget(self, name, admin):
+        budget_manager = BudgetManager.objects.create(name=name, admin=admin)
+        UserAccess.objects.create(user=admin, budget_manager=budget_manager, role=UserAccess.ADMIN)
+        return budget_manager
+
+    def add_member(self, username, role=UserAccess.READ_ONLY, budget_manager=None):
+        user = self.create_user(username)
+        UserAccess.objects.create(user=user, budget_manager=budget_manager or self.budget_manager, role=role)
+        return user
+
+    def operations_url(self, budget_manager=None):
+        return f'/api/budget-managers/{(budget_manager or self.budget_manager).id}/operations/'
+
+    # added through the API, so the rollups, the budget version and the change sequence follow
+    def post_operation(self, title='Operation', value='10.00', day='2024-01-15', budget_manager=None, **fields):
+        response = self.client.post(f'{self.operations_url(budget_manager)}add/', {
+            'type': self.type.id, 'category': self.category.id, 'date': day, 'title': title, 'value': value, **fields,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+class BudgetTestCase(BudgetFixtureMixin, APITestCase):
+    pass
+
+# list endpoints have to render in a fixed number of queries no matter how many rows they return
+class ListQueryCountTests(BudgetTestCase):
+    def add_rows(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = self.add_member(f'user{i}')
+            AccessRequest.objects.create(user=user, budget_manager=self.budget_manager)
+            Operation.objects.create(
+                budget_manager=self.budget_manager,
+                type=self.type,
+                category=self.category,
+                by=user,
+                date=date(2024, 1, 1 + i % 28),
+                title=f'Operation {i}',
+                value='10.00',
+            )
+
+    def count_queries(self, url):
+        # start every measurement with a cold membership cache
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.add_rows(2)
+        few = self.count_queries(url)
+        self.add_rows(10)
+        many = self.count_queries(url)
+        self.assertEqual(few, many)
+
+    def test_operation_list(self):
+        self.assertConstantQueries(f'/api/budget-managers/{self.budget_manager.id}/operations/')
+
+    def test_operation_list_unpaginated(self):
+        self.assertConstantQueries(f'/api/budget-managers/{self.budget_manager.id}/operations/?unpaginated=true')
+
+    def test_operation_list_compact(self):
+        self.assertConstantQueries(f'/api/budget-managers/{self.budget_manager.id}/operations/?compact=true')
+
+    def test_members(self):
+        self.assertConstantQueries(f'/api/budget-managers/{self.budget_manager.id}/members/')
+
+    def test_user_access_list(self):
+        self.assertConstantQueries(f'/api/budget-managers/{self.budget_manager.id}/user-access/')
+
+    def test_access_request_list(self):
+        self.assertConstantQueries(f'/api/budget-managers/{self.budget_manager.id}/access-requests/')
+
+    def test_bootstrap(self):
+        self.assertConstantQueries(f'/api/budget-managers/{self.budget_manager.id}/bootstrap/')
+
+    def test_bootstrap_unpaginated(self):
+        self.assertConstantQueries(f'/api/budget-managers/{self.budget_manager.id}/bootstrap/?unpaginated=true')
+
+    def test_budget_manager_list(self):
+        def add_budgets(count):
+            for i in range(count):
+                budget_manager = self.create_budget(f'Budget {BudgetManager.objects.count()}', self.admin)
+                AccessRequest.objects.create(user=self.create_user(f'applicant{budget_manager.id}'), budget_manager=budget_manager)
+                Operation.objects.create(
+                    budget_manager=budget_manager, type=self.type, category=self.category, date=date(2024, 1, 1),
+                    title='Operation', value='10.00',
+                )
+
+        add_budgets(2)
+        few = self.count_queries('/api/budget-managers/')
+        add_budgets(10)
+        many = self.count_queries('/api/budget-managers/')
+        self.assertEqual(few, many)
+
+        # the values the summary subqueries return, the household itself has no operations or requests
+        # (the operations above skipped the rollup upkeep of the views)
+        call_command('rebuild_operation_rollups', stdout=StringIO())
+        budgets = self.client.get('/api/budget-managers/').data
+        self.assertEqual(len(budgets), 13)
+        summary_fields = ['balance', 'operation_count', 'last_activity', 'pending_access_requests']
+        self.assertEqual([budgets[0][field] for field in summary_fields], ['0.00', 0, None, 0])
+        for budget in budgets[1:]:
+            self.assertEqual([budget[field] for field in summary_fields], ['-10.00', 1, '2024-01-01', 1])
+
+    def test_compact_operation_has_no_budget_manager(self):
+        self.add_rows(1)
+        response = self.client.get(f'/api/budget-managers/{self.budget_manager.id}/operations/?compact=true')
+        operation = response.data['results'][0]
+
+        self.assertNotIn('budget_manager', operation)
+        self.assertEqual(operation['category_name'], 'Groceries')
+        self.assertEqual(operation['type_name'], 'Expense')
+
+@override_settings(REQUEST_TIMING_ENABLED=True, REQUEST_TIMING_SAMPLE_RATE=1.0)
+class RequestTimingTests(BudgetTestCase):
+    def db_queries(self, response):
+        entries = dict(entry.split(';', 1) for entry in response.headers['Server-Timing'].split(', '))
+        return int(entries['db'].split('desc="')[1].split(' ')[0])
+
+    def test_sync_request_counts_queries(self):
+        self.client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as context, self.assertLogs('budgetmanager.timing'):
+            response = self.client.get('/api/budget-managers/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.db_queries(response), len(context.captured_queries))
+
+    async def test_async_request_counts_queries(self):
+        client = AsyncClient()
+        url = f'/api/async/budget-managers/{self.budget_manager.id}/operations/'
+        with self.assertLogs('budgetmanager.timing'):
+            response = await client.get(url, headers=bearer(self.admin))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('view', response.headers['Server-Timing'])
+        # the membership check and the operations page at least
+        self.assertGreaterEqual(self.db_queries(response), 2)
+
+
+STICKY_CACHES = {
+    **settings.CACHES,
+    'sticky': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_sticky_cache'},
+}
+
+# the 'replica' alias mirrors the default test database, TestCase's transaction would keep every read on the primary
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_CACHE_ALIAS='sticky', CACHES=STICKY_CACHES)
+class ReplicaRoutingTests(BudgetFixtureMixin, APITransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        call_command('createcachetable', database='default', verbosity=0)
+        # a fresh health check result, so the replica isn't checked in the middle of a request
+        routing.health = routing.ReplicaHealth()
+        routing.health.refresh()
+        super().setUp()
+        # the middleware reads the user from the token
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.admin)['Authorization'])
+
+    def tearDown(self):
+        routing.health = routing.ReplicaHealth()
+
+    # (response, queries on the primary, queries on the replica)
+    def request(self, method, url, data=None):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(url, data, format='json')
+        # the sticky cache is always read from the primary, only the queries of the view count
+        primary_queries = [query for query in primary.captured_queries if 'test_sticky_cache' not in query['sql']]
+        return response, len(primary_queries), len(replica.captured_queries)
+
+    def operations_url(self):
+        return f'/api/budget-managers/{self.budget_manager.id}/operations/'
+
+    def test_get_reads_from_replica(self):
+        response, primary, replica = self.request('get', self.operations_url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_read_after_write_uses_primary(self):
+        router = routing.ReplicaRouter()
+        token = routing.start_request('replica')
+        try:
+            self.assertEqual(router.db_for_read(Operation), 'replica')
+            self.assertEqual(router.db_for_write(Operation), 'default')
+            self.assertEqual(router.db_for_read(Operation), 'default')
+        finally:
+            routing.end_request(token)
+
+    def test_sticky_after_write(self):
+        response, _, _ = self.request('post', f'{self.operations_url()}add/', {
+            'type': self.type.id, 'category': self.category.id, 'date': '2024-01-01', 'title': 'Bread', 'value': '3.00',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(routing.is_sticky(self.admin.id))
+
+        response, primary, replica = self.request('get', self.operations_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+        # other users still read from the replica
+        other = self.add_member('other')
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(other)['Authorization'])
+        response, primary, replica = self.request('get', self.operations_url())
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    @override_settings(DATABASE_REPLICA_STICKY_SECONDS=0)
+    def test_sticky_disabled(self):
+        routing.mark_wrote(self.admin.id)
+        self.assertFalse(routing.is_sticky(self.admin.id))
+
+    def test_use_primary_view(self):
+        response, primary, replica = self.request('get', f'{self.operations_url()}changes/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+    def test_process_exception_marks_replica_unhealthy(self):
+        middleware = ReplicaRoutingMiddleware(lambda request: None)
+        request = RequestFactory().get(self.operations_url())
+        token = routing.start_request('replica')
+        try:
+            middleware.process_exception(request, OperationalError('replica is gone'))
+        finally:
+            routing.end_request(token)
+
+        self.assertEqual(routing.health.healthy_replicas(), [])
+        self.assertIsNone(routing.choose_replica())
+        response, primary, replica = self.request('get', self.operations_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+
+class ReplicaStickyCacheCheckTests(APITestCase):
+    @override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_CACHE_ALIAS='default')
+    def test_process_local_cache_is_rejected(self):
+        errors = check_replica_sticky_cache(None)
+        self.assertEqual([error.id for error in errors], ['budgetmanager.E001'])
+        with self.assertRaises(ImproperlyConfigured):
+            ReplicaRoutingMiddleware(lambda request: None)
+
+    @override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_CACHE_ALIAS='sticky', CACHES=STICKY_CACHES)
+    def test_shared_cache_is_accepted(self):
+        self.assertEqual(check_replica_sticky_cache(None), [])
+
+    def test_no_replicas(self):
+        self.assertEqual(check_replica_sticky_cache(None), [])
+
+# the monthly rollups follow every edit and delete of an operation
+class OperationRollupTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.salary = OperationCategory.objects.create(name='Salary')
+        self.url = self.operations_url()
+        self.operation_id = self.post_operation('Bread', '3.00')
+
+    def assertRollupsInSync(self):
+        out = StringIO()
+        call_command('rebuild_operation_rollups', '--verify', stdout=out)
+        self.assertIn('in sync', out.getvalue())
+
+    def test_update(self):
+        response = self.client.patch(f'{self.url}{self.operation_id}/edit/', {
+            'type': self.income.id, 'category': self.salary.id, 'date': '2024-02-01', 'value': '100.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertRollupsInSync()
+
+        response = self.client.patch(f'{self.url}{self.operation_id}/edit/', {'title': 'Salary'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Operation.objects.get(id=self.operation_id).value, 100)
+        self.assertRollupsInSync()
+
+    def test_delete(self):
+        response = self.client.delete(f'{self.url}{self.operation_id}/delete/')
+        self.assertEqual(response.status_code, 204)
+        self.assertRollupsInSync()
+
+    def test_delete_of_concurrently_deleted_operation(self):
+        stale = Operation.objects.get(id=self.operation_id)
+        self.client.delete(f'{self.url}{self.operation_id}/delete/')
+
+        # the second request found the row before the first one deleted it
+        with mock.patch.object(OperationDeleteView, 'get_object', return_value=stale):
+            response = self.client.delete(f'{self.url}{self.operation_id}/delete/')
+        self.assertEqual(response.status_code, 403)
+        self.assertRollupsInSync()
+
+# JWT requests are authenticated from the token claims and a cached user status (authentication.py)
+class StatelessJWTAuthenticationTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.headers = bearer(self.admin)
+
+    def get(self):
+        return self.client.get('/api/budget-managers/', headers=self.headers)
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get()
+        # the budget list joins the admins, only lookups of the user table itself count
+        return response, [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT "auth_user"')]
+
+    def test_no_user_query_per_request(self):
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1) # the user status, cached from then on
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_claims_user(self):
+        request = RequestFactory().get('/', headers=self.headers)
+        with self.assertNumQueries(1):
+            user, token = StatelessJWTAuthentication().authenticate(request)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual(user, self.admin)
+        with self.assertNumQueries(0):
+            self.assertEqual((user.id, user.username), (self.admin.id, 'admin'))
+            self.assertTrue(user.is_authenticated)
+
+        # anything else loads the User row, once
+        with self.assertNumQueries(1):
+            self.assertFalse(user.is_staff)
+            self.assertEqual(user.email, self.admin.email)
+            self.assertFalse(user.is_superuser)
+
+    def test_deactivated_on_save(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.admin.is_active = False
+        self.admin.save()
+        response = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_inactive')
+
+    def test_deleted(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.admin.delete()
+        response = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_not_found')
+
+    # a write the receivers don't see (another worker's cache, a queryset update) is picked up once the status expires
+    @override_settings(USER_STATUS_CACHE_TIMEOUT=30)
+    def test_deactivated_once_status_expires(self):
+        self.assertEqual(self.get().status_code, 200)
+        User.objects.filter(id=self.admin.id).update(is_active=False)
+        self.assertEqual(self.get().status_code, 200)
+
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 31):
+            response = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_inactive')
+
+# ?compact=true renders the flattened serializers, without the nested budget manager on every row
+class CompactSerializerTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = self.add_member('member')
+        AccessRequest.objects.create(user=self.create_user('applicant'), budget_manager=self.budget_manager)
+        self.bread = self.post_operation('Bread', '3.00', by=self.member.id)
+        self.salary = self.post_operation('Salary', '100.00', '2024-01-31', type=self.income.id)
+
+    def test_operations(self):
+        compact = self.client.get(self.operations_url(), {'compact': 'true'}).data['results']
+        full = self.client.get(self.operations_url(), {'compact': 'false'}).data['results']
+
+        self.assertEqual(compact, [
+            {
+                'id': self.salary, 'date': '2024-01-31', 'title': 'Salary', 'value': '100.00', 'type': self.income.id,
+                'type_name': 'Income', 'category': self.category.id, 'category_name': 'Groceries', 'by': None, 'by_username': None,
+            },
+            {
+                'id': self.bread, 'date': '2024-01-15', 'title': 'Bread', 'value': '3.00', 'type': self.expense.id,
+                'type_name': 'Expense', 'category': self.category.id, 'category_name': 'Groceries', 'by': self.member.id,
+                'by_username': 'member',
+            },
+        ])
+        self.assertEqual(full[1]['budget_manager']['name'], 'Household')
+        self.assertEqual(full[1]['by'], {'id': self.member.id, 'username': 'member'})
+        for compact_row, full_row in zip(compact, full):
+            self.assertEqual(compact_row['id'], full_row['id'])
+            self.assertEqual(compact_row['category_name'], full_row['category']['name'])
+
+    def test_missing_relations(self):
+        self.category.delete()
+        operation, = [row for row in self.client.get(self.operations_url(), {'compact': '1'}).data['results'] if row['id'] == self.bread]
+        self.assertEqual((operation['category'], operation['category_name']), (None, None))
+
+    def test_members_and_access_requests(self):
+        url = f'/api/budget-managers/{self.budget_manager.id}'
+        members = self.client.get(f'{url}/members/', {'compact': 'yes'}).data
+        self.assertEqual(members, [
+            {'id': membership_row['id'], 'user': membership_row['user'], 'role': membership_row['role']}
+            for membership_row in self.client.get(f'{url}/members/').data
+        ])
+        self.assertEqual([(row['user']['username'], row['role']) for row in members], [('admin', UserAccess.ADMIN), ('member', UserAccess.READ_ONLY)])
+
+        access_request, = self.client.get(f'{url}/access-requests/', {'compact': 'true'}).data
+        self.assertEqual(set(access_request), {'id', 'user', 'status', 'created_at', 'updated_at'})
+        self.assertEqual(access_request['user']['username'], 'applicant')
+
+# categories and types are served and resolved from the in-process reference data (reference.py)
+class ReferenceDataTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = '/api/operation-categories/'
+
+    def test_list(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, [{'id': self.category.id, 'name': 'Groceries'}])
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=86400')
+        self.assertIn('Last-Modified', response.headers)
+        response = self.client.get('/api/operation-types/')
+        self.assertEqual([operation_type['name'] for operation_type in response.data], ['Income', 'Expense'])
+
+        # loaded once per version
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+            self.client.get('/api/operation-types/')
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url).headers['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+        # a change of the types leaves the categories' ETag alone
+        OperationType.objects.create(name='Transfer')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        OperationCategory.objects.create(name='Bills')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([category['name'] for category in response.data], ['Groceries', 'Bills'])
+
+    def test_reload_on_change(self):
+        self.assertEqual(reference.get_category(self.category.id).name, 'Groceries')
+        self.category.name = 'Food'
+        self.category.save()
+        self.assertEqual(reference.get_category(self.category.id).name, 'Food')
+        self.category.delete()
+        self.assertIsNone(reference.get_category(self.category.id))
+
+    def test_write_resolves_from_cache(self):
+        reference.get_reference_data()
+        with CaptureQueriesContext(connection) as queries:
+            self.post_operation('Bread')
+        reference_queries = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('SELECT "budgetmanager_operationcategory"', 'SELECT "budgetmanager_operationtype"'))
+        ]
+        self.assertEqual(reference_queries, [])
+        operation = Operation.objects.get(title='Bread')
+        self.assertEqual((operation.category, operation.type), (self.category, self.expense))
+
+    def test_invalid_reference(self):
+        url = f'{self.operations_url()}add/'
+        for value, code in ((1000, 'does_not_exist'), ('groceries', 'incorrect_type'), (True, 'incorrect_type'), (None, 'null')):
+            response = self.client.post(url, {
+                'type': self.type.id, 'category': value, 'date': '2024-01-15', 'title': 'Bread', 'value': '3.00',
+            }, format='json')
+            self.assertEqual(response.status_code, 400, value)
+            self.assertEqual(response.data['category'][0].code, code, value)
+
+# keyset pagination of the operations list (pagination.py)
+class OperationPaginationTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = self.operations_url()
+        # four operations on every date (ties broken by the id) and two values
+        for i in range(12):
+            self.post_operation(f'Operation {i}', '5.00' if i % 2 else '7.00', f'2024-01-{1 + i // 4:02d}')
+
+    # ids of every page, passing the next_cursor of each page back
+    def walk(self, **query):
+        ids = []
+        response = self.client.get(self.url, {'page_size': 5, **query})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [operation['id'] for operation in response.data['results']]
+            if response.data['next'] is None:
+                self.assertIsNone(response.data['next_cursor'])
+                return ids
+            response = self.client.get(self.url, {'page_size': 5, **query, 'cursor': response.data['next_cursor']})
+
+    def test_pages_follow_the_ordering(self):
+        for ordering in ('-date', 'date', '-value', 'value'):
+            expected = [operation['id'] for operation in self.client.get(self.url, {'unpaginated': 'true', 'ordering': ordering}).data]
+            self.assertEqual(len(expected), 12)
+            self.assertEqual(self.walk(ordering=ordering), expected, ordering)
+
+        # newest first, the id breaks the ties on the date
+        expected = list(Operation.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(), expected)
+
+    def test_cursor_round_trip(self):
+        pagination = OperationCursorPagination()
+        pagination.field_name = 'date'
+        cursor = pagination.encode_cursor(date(2024, 1, 3), 42)
+        request = RequestFactory().get(self.url, {'cursor': cursor})
+        self.assertEqual(pagination.decode_cursor(request, Operation), (date(2024, 1, 3), 42))
+
+        pagination.field_name = 'value'
+        cursor = pagination.encode_cursor(Decimal('5.00'), 7)
+        request = RequestFactory().get(self.url, {'cursor': cursor})
+        self.assertEqual(pagination.decode_cursor(request, Operation), (Decimal('5.00'), 7))
+
+    def test_insert_while_paging(self):
+        response = self.client.get(self.url, {'page_size': 5})
+        first_page = [operation['id'] for operation in response.data['results']]
+        # on the date of the last row of the page, so it sorts before the cursor
+        self.post_operation('Late', day='2024-01-03')
+
+        response = self.client.get(response.data['next'])
+        rest = [operation['id'] for operation in response.data['results']]
+        expected = list(Operation.objects.exclude(title='Late').order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(first_page + rest, expected[:10])
+
+    def test_invalid_cursor(self):
+        date_cursor = self.client.get(self.url, {'page_size': 5}).data['next_cursor']
+        for query in ({'cursor': 'not a cursor'}, {'cursor': 'bm90IGEgY3Vyc29y'}, {'cursor': date_cursor, 'ordering': 'value'}):
+            response = self.client.get(self.url, query)
+            self.assertEqual(response.status_code, 404, query)
+            self.assertEqual(response.data['detail'], 'Invalid cursor.')
+
+    def test_page_size(self):
+        self.assertEqual(len(self.client.get(self.url).data['results']), 12)
+        self.assertEqual(len(self.client.get(self.url, {'page_size': 'x'}).data['results']), 12)
+        with mock.patch.object(OperationCursorPagination, 'max_page_size', 4):
+            response = self.client.get(self.url, {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 4)
+
+# the analytics endpoint answers from the monthly rollups unless the grouping or the date range needs the operations
+class OperationAnalyticsTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.salary = OperationCategory.objects.create(name='Salary')
+        self.member = self.add_member('member')
+        self.url = f'/api/budget-managers/{self.budget_manager.id}/analytics/'
+        for i in range(12):
+            self.post_operation(
+                f'Operation {i}', f'{i + 1}.25', f'2024-{1 + i % 3:02d}-{1 + i:02d}',
+                type=(self.income if i % 4 == 0 else self.expense).id,
+                category=(self.salary if i % 4 == 0 else self.category).id,
+                by=(self.member if i % 2 else self.admin).id,
+            )
+
+    def get(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'{self.url}{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        scanned = any('"budgetmanager_operation"' in query['sql'] for query in queries.captured_queries)
+        return response.data, scanned
+
+    # the same aggregation from the operations table
+    def scan(self, **options):
+        with mock.patch.object(analytics, 'is_month_aligned', return_value=False):
+            return analytics.aggregate_operations(self.budget_manager.id, **options)
+
+    def test_default_grouping_uses_rollups(self):
+        data, scanned = self.get()
+        self.assertFalse(scanned)
+        self.assertEqual(data['group_by'], ['month', 'category', 'type'])
+        self.assertEqual(data['series'], self.scan(group_by=['month', 'category', 'type'])['series'])
+        self.assertEqual(data['totals'], {'Income': '15.75', 'Expense': '65.25'})
+        self.assertEqual(sum(item['count'] for item in data['series']), 12)
+
+    def test_rollups_match_scan(self):
+        for query, group_by in (
+            ('?group_by=type', ['type']),
+            ('?group_by=month,type', ['month', 'type']),
+            ('?group_by=category&date_from=2024-02-01&date_to=2024-03-31', ['category']),
+        ):
+            data, scanned = self.get(query)
+            self.assertFalse(scanned)
+            options = {key: data[key] for key in ('date_from', 'date_to')}
+            self.assertEqual(data, {**self.scan(group_by=group_by, **options), **options})
+
+    def test_member_and_partial_months_scan(self):
+        data, scanned = self.get('?group_by=by')
+        self.assertTrue(scanned)
+        self.assertEqual({item['by_username']: item['count'] for item in data['series']}, {'admin': 6, 'member': 6})
+
+        data, scanned = self.get('?group_by=type&date_from=2024-01-05')
+        self.assertTrue(scanned)
+        self.assertEqual(sum(item['count'] for item in data['series']), 10)
+
+    def test_constant_queries(self):
+        self.get()
+        # only the rollups, the role comes from the membership cache
+        with self.assertNumQueries(1):
+            self.get()
+        for i in range(5):
+            self.post_operation(f'Later {i}', day=f'2024-{4 + i:02d}-01')
+        with self.assertNumQueries(1):
+            self.get()
+
+# the operations list filters and orderings filters.py documents as index-backed, checked on SQLite's query plans
+class OperationFilterIndexTests(BudgetTestCase):
+    def plan(self, **filters):
+        return filter_operations(Operation.objects.filter(budget_manager_id=self.budget_manager.id), filters).explain()
+
+    def test_index_backed(self):
+        for filters, index in (
+            ({}, 'operation_bm_date_id_idx'),
+            ({'date_from': date(2024, 1, 1), 'ordering': 'date'}, 'operation_bm_date_id_idx'),
+            ({'category': [self.category.id], 'date_from': date(2024, 1, 1)}, 'operation_bm_cat_date_id_idx'),
+            ({'type': [self.type.id], 'date_to': date(2024, 1, 31)}, 'operation_bm_type_date_id_idx'),
+            ({'by': self.admin.id, 'ordering': 'date'}, 'operation_bm_by_date_id_idx'),
+            ({'value_min': Decimal('10'), 'ordering': '-value'}, 'operation_bm_value_id_idx'),
+        ):
+            plan = self.plan(**filters)
+            self.assertIn(f'USING INDEX {index} (budget_manager_id=?', plan, filters)
+            self.assertNotIn('TEMP B-TREE', plan, filters)
+
+    def test_not_fully_index_backed(self):
+        # the budget manager's rows in the requested order, the filter is checked on each of them
+        self.assertIn('USING INDEX operation_bm_date_id_idx (budget_manager_id=?)', self.plan(category=[self.category.id, 1000]))
+        self.assertIn('USING INDEX operation_bm_value_id_idx (budget_manager_id=?)', self.plan(type=[self.type.id], ordering='value'))
+        # a value range sorted by date
+        self.assertIn('TEMP B-TREE FOR ORDER BY', self.plan(value_min=Decimal('10')))
+
+    def test_filtered_list(self):
+        other = OperationCategory.objects.create(name='Other')
+        for i in range(6):
+            self.post_operation(f'Operation {i}', f'{i + 1}.00', f'2024-01-{1 + i:02d}', category=(self.category if i % 2 else other).id)
+        url = self.operations_url()
+
+        response = self.client.get(url, {'category': self.category.id, 'date_from': '2024-01-02', 'ordering': 'date'})
+        self.assertEqual([operation['title'] for operation in response.data['results']], ['Operation 1', 'Operation 3', 'Operation 5'])
+        response = self.client.get(url, {'value_min': '3.00', 'value_max': '5.00', 'ordering': '-value'})
+        self.assertEqual([operation['value'] for operation in response.data['results']], ['5.00', '4.00', '3.00'])
+
+        # the list renders in the same number of queries however many rows match
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url, {'category': self.category.id})
+        for i in range(5):
+            self.post_operation(f'Later {i}', day='2024-02-01')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, {'category': self.category.id})
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertEqual(len(many), len(few))
+
+# a bulk add inserts every operation of the list or none of them
+class OperationBulkCreateTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outsider = self.create_user('outsider')
+        self.url = f'/api/budget-managers/{self.budget_manager.id}/operations/bulk-add/'
+
+    def item(self, **fields):
+        return {
+            'type': self.type.id, 'category': self.category.id, 'date': '2024-01-15', 'title': 'Bread', 'value': '3.00',
+            **fields,
+        }
+
+    def test_creates_all(self):
+        response = self.client.post(self.url, [self.item(), self.item(title='Milk', by=self.admin.id)], format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([operation['title'] for operation in response.data], ['Bread', 'Milk'])
+        self.assertEqual(Operation.objects.filter(budget_manager=self.budget_manager).count(), 2)
+        self.assertEqual(Operation.objects.get(title='Milk').by, self.admin)
+
+    def test_invalid_item_rejects_batch(self):
+        response = self.client.post(self.url, [
+            self.item(),
+            self.item(value='-1.00'),
+            self.item(by=self.outsider.id),
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        # one entry per item, in the order of the request
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('value', errors[1])
+        self.assertIn('by', errors[2])
+        self.assertFalse(Operation.objects.exists())
+
+    def test_not_a_list(self):
+        response = self.client.post(self.url, self.item(), format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_list(self):
+        response = self.client.post(self.url, [], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(OPERATION_BULK_MAX_BATCH_SIZE=2)
+    def test_max_batch_size(self):
+        response = self.client.post(self.url, [self.item(), self.item(), self.item()], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most 2', response.data['detail'])
+        self.assertFalse(Operation.objects.exists())
+
+        response = self.client.post(self.url, [self.item(), self.item()], format='json')
+        self.assertEqual(response.status_code, 201)
+
+class AccessBatchTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.applicants = [self.create_user(f'applicant{i}') for i in range(3)]
+        self.access_requests = [
+            AccessRequest.objects.create(user=user, budget_manager=self.budget_manager) for user in self.applicants
+        ]
+        self.url = f'/api/budget-managers/{self.budget_manager.id}/access-requests/batch/'
+
+    def decide(self, ids, status=AccessRequest.ACCEPTED):
+        response = self.client.post(self.url, {'ids': ids, 'status': status}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [result['outcome'] for result in response.data['results']]
+
+    def version(self):
+        return BudgetManager.objects.get(id=self.budget_manager.id).version
+
+    def test_accept(self):
+        applicant = self.applicants[0]
+        members_url = f'/api/budget-managers/{self.budget_manager.id}/members/'
+        self.client.force_authenticate(applicant)
+        self.assertEqual(self.client.get(members_url).status_code, 403) # caches "not a member"
+        self.client.force_authenticate(self.admin)
+        version = self.version()
+
+        ids = [access_request.id for access_request in self.access_requests]
+        self.assertEqual(self.decide(ids), ['accepted'] * 3)
+
+        self.assertEqual(UserAccess.objects.filter(budget_manager=self.budget_manager, role=UserAccess.READ_ONLY).count(), 3)
+        self.assertFalse(AccessRequest.objects.filter(status=AccessRequest.PENDING).exists())
+        self.assertGreater(self.version(), version)
+        self.client.force_authenticate(applicant)
+        self.assertEqual(self.client.get(members_url).status_code, 200)
+
+    def test_deny(self):
+        self.assertEqual(self.decide([self.access_requests[0].id], AccessRequest.DENIED), ['denied'])
+        self.assertFalse(UserAccess.objects.filter(user=self.applicants[0]).exists())
+
+    def test_outcomes(self):
+        other_budget = BudgetManager.objects.create(name='Other', admin=self.admin)
+        foreign_request = AccessRequest.objects.create(user=self.applicants[0], budget_manager=other_budget)
+        self.decide([self.access_requests[0].id], AccessRequest.DENIED)
+        UserAccess.objects.create(user=self.applicants[1], budget_manager=self.budget_manager, role=UserAccess.READ_ONLY)
+        version = self.version()
+
+        ids = [self.access_requests[0].id, self.access_requests[1].id, foreign_request.id, 999999]
+        self.assertEqual(self.decide(ids), ['conflict', 'already_member', 'not_found', 'not_found'])
+        self.assertEqual(self.version(), version)
+        self.assertEqual(AccessRequest.objects.get(id=self.access_requests[1].id).status, AccessRequest.PENDING)
+
+    def test_member_added_concurrently(self):
+        latecomer = self.applicants[0]
+        create_memberships = access._create_memberships
+
+        # a single accept adds the user after the batch checked the memberships
+        def concurrent_accept(budget_manager_id, user_ids):
+            UserAccess.objects.create(user=latecomer, budget_manager=self.budget_manager, role=UserAccess.READ_ONLY)
+            return create_memberships(budget_manager_id, user_ids)
+
+        with mock.patch.object(access, '_create_memberships', concurrent_accept):
+            outcomes = self.decide([self.access_requests[0].id, self.access_requests[1].id])
+
+        self.assertEqual(outcomes, ['already_member', 'accepted'])
+        self.assertEqual(AccessRequest.objects.get(id=self.access_requests[0].id).status, AccessRequest.PENDING)
+        self.assertTrue(UserAccess.objects.filter(user=self.applicants[1], budget_manager=self.budget_manager).exists())
+
+    def test_change_roles(self):
+        members = [
+            UserAccess.objects.create(user=user, budget_manager=self.budget_manager, role=UserAccess.READ_ONLY)
+            for user in self.applicants[:2]
+        ]
+        admin_access = UserAccess.objects.get(user=self.admin)
+        members_url = f'/api/budget-managers/{self.budget_manager.id}/members/'
+        self.client.force_authenticate(self.applicants[0])
+        self.assertEqual(self.client.get(members_url).status_code, 200) # caches the read only role
+        self.client.force_authenticate(self.admin)
+        version = self.version()
+
+        response = self.client.post(f'/api/budget-managers/{self.budget_manager.id}/user-access/batch/', {
+            'ids': [members[0].id, admin_access.id, 999999], 'role': UserAccess.EDIT,
+        }, format='json')
+
+        self.assertEqual([result['outcome'] for result in response.data['results']], ['edit', 'forbidden', 'not_found'])
+        self.assertGreater(self.version(), version)
+        request = RequestFactory().get(members_url)
+        request.user = self.applicants[0]
+        self.assertEqual(membership.get_role(request, self.budget_manager.id), UserAccess.EDIT)
+
+    def test_not_admin(self):
+        UserAccess.objects.create(user=self.applicants[0], budget_manager=self.budget_manager, role=UserAccess.EDIT)
+        self.client.force_authenticate(self.applicants[0])
+        response = self.client.post(self.url, {'ids': [self.access_requests[1].id], 'status': 'accepted'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+# a deleted budget disappears from the API at once, its rows are purged in chunks afterwards
+class BudgetDeletionTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = self.add_member('member')
+        AccessRequest.objects.create(user=self.create_user('applicant'), budget_manager=self.budget_manager)
+        Operation.objects.bulk_create([
+            Operation(budget_manager=self.budget_manager, type=self.type, category=self.category, date=date(2024, 1, 1), title=f'Operation {i}', value='1.00')
+            for i in range(5)
+        ])
+
+    def delete(self):
+        response = self.client.delete(f'/api/budget-managers/{self.budget_manager.id}/delete/')
+        self.assertEqual(response.status_code, 202)
+        return BudgetDeletion.objects.get(budget_manager_id=self.budget_manager.id)
+
+    def test_list_hides_internal_fields(self):
+        budget = self.client.get('/api/budget-managers/').data[0]
+        self.assertNotIn('deleted_at', budget)
+        self.assertNotIn('version', budget)
+
+    def test_deleted_budget_is_hidden(self):
+        self.delete()
+
+        self.assertEqual(self.client.get('/api/budget-managers/').data, [])
+        url = f'/api/budget-managers/{self.budget_manager.id}'
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get('/api/budget-managers/').data, [])
+        self.assertIn(self.client.get(f'{url}/members/').status_code, (403, 404))
+        self.assertIn(self.client.get(f'{url}/operations/').status_code, (403, 404))
+
+        applicant = self.create_user('late applicant')
+        self.client.force_authenticate(applicant)
+        response = self.client.post('/api/access-requests/send/', {'unique_id': str(self.budget_manager.unique_id)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        # the rows stay until the worker purges them
+        self.assertTrue(BudgetManager.all_objects.filter(id=self.budget_manager.id).exists())
+        self.assertEqual(Operation.objects.filter(budget_manager_id=self.budget_manager.id).count(), 5)
+
+    def test_purge_resumes_from_progress(self):
+        self.delete()
+        job = deletion.claim_deletion()
+
+        self.assertFalse(deletion.purge_chunk(job, chunk_size=2))
+        self.assertFalse(deletion.purge_chunk(job, chunk_size=2))
+        job.refresh_from_db()
+        self.assertEqual(job.progress, {'budgetmanager.Operation': 4})
+
+        # another worker takes over the job once the lease of the first one ran out
+        BudgetDeletion.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        deletion.run_worker(chunk_size=2, once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, BudgetDeletion.DONE)
+        self.assertEqual(job.progress, {
+            'budgetmanager.Operation': 5,
+            'budgetmanager.AccessRequest': 1,
+            'budgetmanager.UserAccess': 2,
+        })
+        self.assertFalse(BudgetManager.all_objects.filter(id=self.budget_manager.id).exists())
+        self.assertFalse(Operation.objects.filter(budget_manager_id=self.budget_manager.id).exists())
+
+    def test_lease(self):
+        job = self.delete()
+
+        self.assertEqual(deletion.claim_deletion(), job)
+        # leased to the first worker
+        self.assertIsNone(deletion.claim_deletion())
+
+        BudgetDeletion.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(deletion.claim_deletion(), job)
+
+# delta sync: operations written and deleted since a token (the budget version the client last saw)
+class OperationChangesTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = self.operations_url()
+        self.first = self.post_operation('Bread')
+        self.second = self.post_operation('Milk')
+
+    def changes(self, since=None, budget_manager=None):
+        budget_manager = budget_manager or self.budget_manager
+        url = f'/api/budget-managers/{budget_manager.id}/operations/changes/?compact=true'
+        response = self.client.get(url if since is None else f'{url}&since={since}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_reset_without_token(self):
+        data = self.changes()
+
+        self.assertTrue(data['reset'])
+        self.assertEqual([operation['id'] for operation in data['operations']], [self.first, self.second])
+        self.assertEqual(data['deleted'], [])
+
+    def test_reset_with_token_from_the_future(self):
+        token = int(self.changes()['token'])
+        self.assertTrue(self.changes(token + 100)['reset'])
+
+    def test_changes_since_token(self):
+        token = self.changes()['token']
+        self.assertEqual(self.changes(token)['operations'], [])
+
+        third = self.post_operation('Butter')
+        self.client.patch(f'{self.url}{self.first}/edit/', {'title': 'Rye bread'}, format='json')
+        self.client.delete(f'{self.url}{self.second}/delete/')
+        data = self.changes(token)
+
+        self.assertFalse(data['reset'])
+        self.assertEqual([operation['id'] for operation in data['operations']], [third, self.first])
+        self.assertEqual(data['operations'][1]['title'], 'Rye bread')
+        self.assertEqual(data['deleted'], [self.second])
+        self.assertEqual(self.changes(data['token'])['operations'], [])
+
+    def test_move_between_budgets_in_admin_panel(self):
+        other = self.create_budget('Holiday', self.admin)
+        token = self.changes()['token']
+        other_token = self.changes(budget_manager=other)['token']
+
+        operation = Operation.objects.get(id=self.first)
+        operation.budget_manager = other
+        request = RequestFactory().post('/admin/')
+        request.user = self.admin
+        OperationAdmin(Operation, admin.site).save_model(request, operation, None, True)
+
+        data = self.changes(token)
+        self.assertEqual(data['operations'], [])
+        self.assertEqual(data['deleted'], [self.first])
+        data = self.changes(other_token, budget_manager=other)
+        self.assertEqual([operation['id'] for operation in data['operations']], [self.first])
+
+    def test_not_modified(self):
+        token = self.changes()['token']
+        url = f'{self.url}changes/?since={token}'
+        response = self.client.get(url)
+        etag = response.headers['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.post_operation('Butter')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sync_fields_only_in_changes(self):
+        sync_fields = {'change_seq', 'updated_at'}
+        version = BudgetManager.objects.get(id=self.budget_manager.id).version
+        for compact in ('true', 'false'):
+            operation = self.client.get(f'{self.url}changes/', {'compact': compact}).data['operations'][-1]
+            self.assertLessEqual(sync_fields, set(operation))
+            self.assertEqual((operation['id'], operation['change_seq']), (self.second, version))
+
+            operation = self.client.get(self.url, {'compact': compact}).data['results'][0]
+            self.assertFalse(sync_fields & set(operation))
+
+        operation = self.client.get(f'/api/budget-managers/{self.budget_manager.id}/bootstrap/').data['operations']['results'][0]
+        self.assertFalse(sync_fields & set(operation))
+
+        # not accepted in writes either
+        response = self.client.patch(f'{self.url}{self.first}/edit/', {'title': 'Rye bread', 'change_seq': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'id', 'budget_manager', 'type', 'date', 'title', 'category', 'value', 'by'})
+        self.assertEqual(Operation.objects.get(id=self.first).change_seq, version + 1)
+
+# roles are resolved once per request and cached until the UserAccess row changes (membership.py)
+class MembershipCacheTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = self.add_member('member')
+        self.access = UserAccess.objects.get(user=self.member)
+        cache.clear()
+
+    def request(self, user=None):
+        request = RequestFactory().get('/')
+        request.user = user or self.member
+        return request
+
+    def test_request_memo_and_cache(self):
+        request = self.request()
+        with self.assertNumQueries(1):
+            self.assertEqual(membership.get_role(request, self.budget_manager.id), UserAccess.READ_ONLY)
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertTrue(membership.is_member(request, self.budget_manager.id))
+            self.assertTrue(membership.has_role(request, str(self.budget_manager.id), [UserAccess.READ_ONLY]))
+
+        # next request, from the cache
+        self.assertEqual(membership.get_role(self.request(), self.budget_manager.id), UserAccess.READ_ONLY)
+        with self.assertNumQueries(0):
+            self.assertEqual(membership.get_role(self.request(), self.budget_manager.id), UserAccess.READ_ONLY)
+
+    def test_no_access_marker(self):
+        outsider = self.create_user('outsider')
+        self.assertIsNone(membership.get_role(self.request(outsider), self.budget_manager.id))
+        self.assertEqual(cache.get(membership._cache_key(outsider.id, self.budget_manager.id)), membership.NO_ACCESS)
+        with self.assertNumQueries(0):
+            self.assertIsNone(membership.get_role(self.request(outsider), self.budget_manager.id))
+            self.assertFalse(membership.is_member(self.request(outsider), self.budget_manager.id))
+            self.assertIsNone(membership.get_role(self.request(outsider), 'not an id'))
+
+        # joining drops the marker
+        UserAccess.objects.create(user=outsider, budget_manager=self.budget_manager, role=UserAccess.EDIT)
+        self.assertEqual(membership.get_role(self.request(outsider), self.budget_manager.id), UserAccess.EDIT)
+
+    def test_invalidated_on_save(self):
+        self.assertEqual(membership.get_role(self.request(), self.budget_manager.id), UserAccess.READ_ONLY)
+        self.access.role = UserAccess.EDIT
+        self.access.save()
+        self.assertEqual(membership.get_role(self.request(), self.budget_manager.id), UserAccess.EDIT)
+
+    def test_invalidated_on_delete(self):
+        self.assertTrue(membership.is_member(self.request(), self.budget_manager.id))
+        self.access.delete()
+        self.assertFalse(membership.is_member(self.request(), self.budget_manager.id))
+
+    def test_invalidated_through_the_api(self):
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get(self.operations_url()).status_code, 200)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.delete(f'/api/budget-managers/{self.budget_manager.id}/user-access/{self.access.id}/delete/')
+        self.assertEqual(response.status_code, 204)
+
+        self.client.force_authenticate(self.member)
+        self.assertIn(self.client.get(self.operations_url()).status_code, (403, 404))
+
+    @override_settings(MEMBERSHIP_CACHE_ALIAS='responses')
+    def test_cache_alias(self):
+        membership.get_role(self.request(), self.budget_manager.id)
+        self.assertIsNone(cache.get(membership._cache_key(self.member.id, self.budget_manager.id)))
+        self.assertEqual(caches['responses'].get(membership._cache_key(self.member.id, self.budget_manager.id)), UserAccess.READ_ONLY)
+
+        self.access.delete()
+        self.assertIsNone(caches['responses'].get(membership._cache_key(self.member.id, self.budget_manager.id)))
+
+# ETags of the per-budget read endpoints follow the budget version (conditional.py)
+class ConditionalGetTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post_operation('Bread')
+        self.urls = [self.operations_url(), f'/api/budget-managers/{self.budget_manager.id}/bootstrap/']
+
+    def test_not_modified(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            etag = response.headers['ETag']
+            self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+
+            # answered from the budget version, without the list query
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers['ETag'], etag)
+            self.assertEqual(self.client.get(f'{url}?compact=true', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_write_changes_etag(self):
+        etags = [self.client.get(url).headers['ETag'] for url in self.urls]
+        self.post_operation('Milk')
+        for url, etag in zip(self.urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_rename_changes_etag(self):
+        etags = [self.client.get(url).headers['ETag'] for url in self.urls]
+        response = self.client.patch(f'/api/budget-managers/{self.budget_manager.id}/edit/', {'name': 'Home'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['budget_manager']['name'], 'Home')
+        response = self.client.get(self.urls[1], HTTP_IF_NONE_MATCH=etags[1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['budget_manager']['name'], 'Home')
+
+    def test_no_etag_for_outsiders(self):
+        self.client.force_authenticate(self.create_user('outsider'))
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertIn(response.status_code, (403, 404))
+            self.assertNotIn('ETag', response.headers)
+
+class ResponseCacheTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['responses'].clear()
+        responsecache.stats.reset()
+        self.member = self.add_member('member')
+        self.url = self.operations_url()
+
+    def cache_status(self, url=None, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        response = self.client.get(url or self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.headers['X-Response-Cache']
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.cache_status(), 'miss')
+        # only the budget manager (its version is part of the key), the role comes from the membership cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache_status(), 'hit')
+
+    def test_key_varies_by_role_and_query(self):
+        self.assertEqual(self.cache_status(), 'miss')
+        self.assertEqual(self.cache_status(f'{self.url}?compact=true'), 'miss')
+        self.assertEqual(self.cache_status(user=self.member), 'miss')
+        self.assertEqual(self.cache_status(user=self.member), 'hit')
+        self.assertEqual(self.cache_status(user=self.admin), 'hit')
+
+    def test_write_invalidates(self):
+        self.assertEqual(self.cache_status(), 'miss')
+        self.client.post(f'{self.url}add/', {
+            'type': self.type.id, 'category': self.category.id, 'date': '2024-01-15', 'title': 'Bread', 'value': '3.00',
+        }, format='json')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.headers['X-Response-Cache'], 'miss')
+        self.assertEqual([operation['title'] for operation in response.data['results']], ['Bread'])
+
+    def test_rename_invalidates(self):
+        self.post_operation('Bread')
+        self.assertEqual(self.cache_status(user=self.member), 'miss')
+        self.assertEqual(self.cache_status(), 'hit')
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.patch(f'/api/budget-managers/{self.budget_manager.id}/edit/', {'name': 'Home'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_authenticate(self.member)
+        response = self.client.get(self.url)
+        self.assertEqual(response.headers['X-Response-Cache'], 'miss')
+        self.assertEqual(response.data['results'][0]['budget_manager']['name'], 'Home')
+
+    def test_reference_delete_invalidates(self):
+        self.post_operation('Bread')
+        version = BudgetManager.objects.get(id=self.budget_manager.id).version
+        self.assertEqual(self.cache_status(), 'miss')
+
+        self.category.delete()
+        self.assertEqual(BudgetManager.objects.get(id=self.budget_manager.id).version, version + 1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.headers['X-Response-Cache'], 'miss')
+        self.assertIsNone(response.data['results'][0]['category'])
+
+    def test_eviction(self):
+        self.cache_status()
+        entry_bytes = caches['responses'].stats()['bytes']
+        small = {
+            **settings.CACHES,
+            'small': {
+                'BACKEND': 'budgetmanager.responsecache.LRUMemoryCache',
+                'LOCATION': 'response-cache-eviction-test',
+                'OPTIONS': {'MAX_BYTES': entry_bytes * 3 // 2},
+            },
+        }
+        # the member's entry has the same size as the admin's, both don't fit
+        with override_settings(CACHES=small, RESPONSE_CACHE_ALIAS='small'):
+            self.assertEqual(self.cache_status(), 'miss')
+            self.assertEqual(self.cache_status(user=self.member), 'miss')
+            self.assertEqual(self.cache_status(user=self.admin), 'miss')
+            self.assertEqual(caches['small'].stats()['evictions'], 2)
+            caches['small'].clear()
+
+    def test_stats(self):
+        self.cache_status()
+        self.cache_status()
+        self.cache_status()
+
+        self.assertEqual(self.client.get('/api/response-cache/stats/').status_code, 403)
+        self.admin.is_staff = True
+        self.admin.save()
+        stats = self.client.get('/api/response-cache/stats/').data
+
+        self.assertEqual((stats['hits'], stats['misses'], stats['stores']), (2, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.6667)
+        self.assertEqual(stats['backend'], 'budgetmanager.responsecache.LRUMemoryCache')
+        self.assertEqual(stats['entries'], 1)
+
+class LRUMemoryCacheTests(APITestCase):
+    def setUp(self):
+        self.cache = responsecache.LRUMemoryCache('lru-memory-cache-test', {'OPTIONS': {'MAX_BYTES': 1000}})
+        self.cache.clear()
+
+    def value(self, size):
+        return b'x' * size
+
+    def test_put_counts_pickled_bytes(self):
+        self.assertTrue(self.cache._put('a', self.value(100), None))
+        self.assertGreaterEqual(self.cache.stats()['bytes'], 100)
+        # replacing an entry doesn't count it twice
+        self.cache._put('a', self.value(100), None)
+        self.assertLess(self.cache.stats()['bytes'], 200)
+        # larger than the whole cache
+        self.assertFalse(self.cache._put('b', self.value(2000), None))
+        self.assertFalse(self.cache.has_key('b'))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', self.value(300))
+        self.cache.set('b', self.value(300))
+        self.cache.set('c', self.value(300))
+        self.cache.get('a') # 'b' is the least recently used now
+        self.cache.set('d', self.value(300))
+
+        self.assertEqual([self.cache.has_key(key) for key in 'abcd'], [True, False, True, True])
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertLessEqual(self.cache.stats()['bytes'], 1000)
+
+    def test_expiry(self):
+        with mock.patch('budgetmanager.responsecache.time.time', return_value=1000.0):
+            self.cache.set('a', 1, timeout=10)
+            self.cache.set('b', 2, timeout=None)
+        with mock.patch('budgetmanager.responsecache.time.time', return_value=1011.0):
+            self.assertIsNone(self.cache.get('a'))
+            self.assertEqual(self.cache.get('b'), 2)
+            self.assertEqual(self.cache.stats()['entries'], 1)
+
+# stands in for EventBroker in DatabaseBackend.poll, keeps its subscribers for a number of polls
+class RecordingBroker:
+    def __init__(self, polls):
+        self.polls = polls
+        self.events = []
+
+    def has_subscribers(self):
+        self.polls -= 1
+        return self.polls >= 0
+
+    def dispatch(self, event):
+        self.events.append(event)
+
+class BudgetEventsTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = events.EventBroker(events.LocalBackend())
+
+    async def next_event(self, subscription):
+        return await subscription.get(0.1)
+
+    async def test_fan_out(self):
+        first = self.broker.subscribe(1)
+        second = self.broker.subscribe(1)
+        other = self.broker.subscribe(2)
+
+        self.broker.dispatch({'type': 'operations.created', 'budget_manager': 1, 'ids': [5]})
+
+        self.assertEqual((await self.next_event(first))['ids'], [5])
+        self.assertEqual((await self.next_event(second))['ids'], [5])
+        self.assertIsNone(await self.next_event(other))
+
+        self.broker.unsubscribe(first)
+        self.broker.unsubscribe(second)
+        self.broker.unsubscribe(other)
+        self.assertFalse(self.broker.has_subscribers())
+
+    @override_settings(BUDGET_EVENTS_QUEUE_SIZE=2)
+    async def test_overflow(self):
+        subscription = self.broker.subscribe(1)
+        for i in range(3):
+            self.broker.dispatch({'type': 'operations.created', 'budget_manager': 1, 'ids': [i]})
+        await asyncio.sleep(0)
+
+        self.assertIs(await self.next_event(subscription), events.OVERFLOW)
+        self.assertIsNone(await self.next_event(subscription))
+
+    # (event types the stream sent, whether it ended) after the given events
+    async def stream(self, *dispatched):
+        stream = AsyncBudgetEventsView().stream(1, user_id=7, expires_at=time.time() + 60)
+        with mock.patch.object(events, 'get_broker', return_value=self.broker):
+            self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+            for event in dispatched:
+                self.broker.dispatch({'budget_manager': 1, **event})
+            sent = []
+            try:
+                for _ in range(len(dispatched)):
+                    sent.append((await anext(stream)).split('\n')[0].removeprefix('event: '))
+                await asyncio.wait_for(anext(stream), 0.1)
+            except StopAsyncIteration:
+                return sent, True
+            except asyncio.TimeoutError:
+                await stream.aclose()
+            return sent, False
+
+    async def test_stream_endings(self):
+        self.assertEqual(await self.stream({'type': 'member.removed', 'user': 8}), (['member.removed'], False))
+        self.assertEqual(await self.stream({'type': 'member.removed', 'user': 7}), (['revoked'], True))
+        self.assertEqual(await self.stream({'type': 'budget.deleted'}), (['budget.deleted'], True))
+        self.assertFalse(self.broker.has_subscribers())
+
+    @override_settings(BUDGET_EVENTS_QUEUE_SIZE=1)
+    async def test_stream_overflow(self):
+        sent, ended = await self.stream({'type': 'operations.created'}, {'type': 'operations.updated'})
+        self.assertEqual(sent[0], 'overflow')
+        self.assertTrue(ended)
+
+    def test_wsgi_not_implemented(self):
+        response = self.client.get(f'/api/async/budget-managers/{self.budget_manager.id}/events/', headers=bearer(self.admin))
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(BUDGET_EVENTS_POLL_INTERVAL=0)
+    async def test_database_backend_dispatches_once(self):
+        backend = events.DatabaseBackend()
+        started_at = timezone.now() - timedelta(seconds=1)
+        await sync_to_async(backend.publish)(None, {'type': 'operations.created', 'budget_manager': 1, 'ids': [5]})
+        await sync_to_async(backend.publish)(None, {'type': 'budget.deleted', 'budget_manager': 2})
+        self.assertEqual(await BudgetEvent.objects.acount(), 2)
+
+        # the second poll reads the same rows again
+        broker = RecordingBroker(polls=2)
+        await backend.poll(broker, started_at)
+
+        self.assertEqual(broker.events, [
+            {'type': 'operations.created', 'budget_manager': 1, 'ids': [5]},
+            {'type': 'budget.deleted', 'budget_manager': 2},
+        ])
+
+    @override_settings(BUDGET_EVENTS_RETENTION_SECONDS=60)
+    def test_database_backend_prunes_on_publish(self):
+        backend = events.DatabaseBackend()
+        expired = BudgetEvent.objects.create(budget_manager_id=1, type='operations.created')
+        BudgetEvent.objects.filter(id=expired.id).update(created_at=timezone.now() - timedelta(seconds=61))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            backend.publish(None, {'type': 'operations.created', 'budget_manager': 1, 'ids': [5]})
+        self.assertEqual(list(BudgetEvent.objects.values_list('type', flat=True)), ['operations.created'])
+        self.assertFalse(BudgetEvent.objects.filter(id=expired.id).exists())
+
+        # at most once per PRUNE_INTERVAL
+        BudgetEvent.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(1):
+            backend.publish(None, {'type': 'budget.deleted', 'budget_manager': 2})
+        self.assertEqual(BudgetEvent.objects.count(), 2)
+
+# the summary fields of the budget list, computed from the rollups in the list query
+class BudgetManagerSummaryTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = self.add_member('member')
+        AccessRequest.objects.create(user=self.create_user('applicant'), budget_manager=self.budget_manager)
+        AccessRequest.objects.create(user=self.create_user('denied'), budget_manager=self.budget_manager, status=AccessRequest.DENIED)
+        BudgetManager.objects.create(name='Not shared', admin=self.member)
+
+        self.post_operation(value='100.00', day='2024-01-10', type=self.income.id)
+        self.post_operation(value='30.50', day='2024-02-03')
+
+    def test_admin(self):
+        budget, = self.client.get('/api/budget-managers/').data
+
+        self.assertEqual(budget['role'], UserAccess.ADMIN)
+        self.assertEqual(budget['balance'], '69.50')
+        self.assertEqual(budget['operation_count'], 2)
+        self.assertEqual(str(budget['last_activity']), '2024-02-03')
+        self.assertEqual(budget['pending_access_requests'], 1)
+
+    def test_member(self):
+        self.client.force_authenticate(self.member)
+        budget, = self.client.get('/api/budget-managers/').data
+
+        self.assertEqual(budget['role'], UserAccess.READ_ONLY)
+        self.assertEqual(budget['balance'], '69.50')
+        self.assertEqual(budget['operation_count'], 2)
+        self.assertIsNone(budget['pending_access_requests'])
+
+    def test_empty_budget(self):
+        response = self.client.post('/api/budget-managers/', {'name': 'Holiday'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['role'], UserAccess.ADMIN)
+        self.assertEqual(response.data['balance'], '0.00')
+        self.assertEqual(response.data['operation_count'], 0)
+        self.assertIsNone(response.data['last_activity'])
+        self.assertEqual(response.data['pending_access_requests'], 0)
+
+        holiday, = [budget for budget in self.client.get('/api/budget-managers/').data if budget['name'] == 'Holiday']
+        self.assertEqual(
+            [holiday[field] for field in ('balance', 'operation_count', 'last_activity', 'pending_access_requests')],
+            ['0.00', 0, None, 0],
+        )
+
+    def test_deleted_operations(self):
+        url = self.operations_url()
+        latest, first = [operation['id'] for operation in self.client.get(url).data['results']]
+
+        self.assertEqual(self.client.delete(f'{url}{latest}/delete/').status_code, 204)
+        budget, = self.client.get('/api/budget-managers/').data
+        self.assertEqual(budget['balance'], '100.00')
+        self.assertEqual(budget['operation_count'], 1)
+        self.assertEqual(str(budget['last_activity']), '2024-01-10')
+
+        # the emptied rollup rows stay behind with zero totals
+        self.assertEqual(self.client.delete(f'{url}{first}/delete/').status_code, 204)
+        budget, = self.client.get('/api/budget-managers/').data
+        self.assertEqual(budget['balance'], '0.00')
+        self.assertEqual(budget['operation_count'], 0)
+        self.assertIsNone(budget['last_activity'])
+
+    def test_pending_requests_follow_decisions(self):
+        access_request = AccessRequest.objects.get(status=AccessRequest.PENDING)
+        response = self.client.put(
+            f'/api/budget-managers/{self.budget_manager.id}/access-requests/{access_request.id}/edit/',
+            {'status': AccessRequest.ACCEPTED}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        budget, = self.client.get('/api/budget-managers/').data
+        self.assertEqual(budget['pending_access_requests'], 0)
+
+SEARCH_TRIGGERS = ['budgetmanager_operation_fts_delete', 'budgetmanager_operation_fts_insert', 'budgetmanager_operation_fts_update']
+
+def search_triggers():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'budgetmanager_operation_fts_%%' ORDER BY name")
+        return [row[0] for row in cursor.fetchall()]
+
+# the SQLite FTS5 index follows the operation table through triggers (migrations 0011 and 0012)
+class OperationSearchTests(BudgetTestCase):
+    def add(self, title, budget_manager=None):
+        return Operation.objects.create(
+            budget_manager=budget_manager or self.budget_manager, type=self.type, category=self.category,
+            date=date(2024, 1, 1), title=title, value='10.00',
+        )
+
+    def search(self, query, budget_manager=None):
+        return search.search_operation_ids((budget_manager or self.budget_manager).id, query, 20)
+
+    def test_triggers_exist(self):
+        self.assertEqual(search_triggers(), SEARCH_TRIGGERS)
+
+    def test_index_follows_writes(self):
+        operation = self.add('Electricity bill')
+        self.assertEqual(self.search('electricity'), [operation.id])
+
+        operation.title = 'Water bill'
+        operation.save()
+        self.assertEqual(self.search('electricity'), [])
+        self.assertEqual(self.search('water'), [operation.id])
+
+        other = BudgetManager.objects.create(name='Holiday', admin=self.admin)
+        operation.budget_manager = other
+        operation.save()
+        self.assertEqual(self.search('water'), [])
+        self.assertEqual(self.search('water', other), [operation.id])
+
+        operation.delete()
+        self.assertEqual(self.search('water', other), [])
+
+    def test_prefix_and_every_word(self):
+        electricity = self.add('Electricity bill')
+        self.add('Electric scooter')
+
+        self.assertEqual(sorted(self.search('electr')), sorted(Operation.objects.values_list('id', flat=True)))
+        self.assertEqual(self.search('electr bill'), [electricity.id])
+
+    def test_fuzzy(self):
+        electricity = self.add('Electricity bill')
+        self.add('Groceries')
+
+        # the misspelled word is expanded to the indexed terms within the edit distance
+        self.assertEqual(search._fuzzy_terms(connection, 'electicity'), ['electricity'])
+        self.assertEqual(search._fuzzy_terms(connection, 'bil'), []) # shorter than MIN_FUZZY_LENGTH
+        self.assertEqual(self.search('electicity'), [electricity.id])
+        self.assertEqual(self.search('elektrizitaet'), [])
+
+    def test_edit_distance(self):
+        self.assertEqual(search._edit_distance('electicity', 'electricity', 2), 1)
+        self.assertEqual(search._edit_distance('kitten', 'sitting', 2), 3) # stopped early
+        self.assertEqual(search._edit_distance('same', 'same', 2), 0)
+
+    def test_view(self):
+        electricity = self.add('Electricity bill')
+        for i in range(3):
+            self.add(f'Electric scooter {i}')
+        url = f'/api/budget-managers/{self.budget_manager.id}/operations/search/'
+
+        response = self.client.get(url, {'q': 'electicity bil'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([operation['id'] for operation in response.data['results']], [electricity.id])
+
+        response = self.client.get(url, {'q': 'electric', 'page_size': 2, 'compact': 'true'})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(self.client.get(response.data['next']).data['results']), 2)
+
+        self.assertEqual(self.client.get(url, {'q': '!!'}).status_code, 400)
+
+# migrating back over 0012 and forward again rebuilds the operation table twice, the triggers have to survive both
+class SearchTriggerMigrationTests(APITransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('budgetmanager', target)])
+
+    def test_restored_by_0012(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('budgetmanager')[0][1]
+        try:
+            self.migrate('0011_operation_search')
+            self.assertEqual(search_triggers(), SEARCH_TRIGGERS)
+            self.migrate('0012_operation_sync')
+            self.assertEqual(search_triggers(), SEARCH_TRIGGERS)
+        finally:
+            self.migrate(latest)
+        self.assertEqual(search_triggers(), SEARCH_TRIGGERS)
+
+class OperationImportTests(BudgetTestCase):
+    def run_import(self, csv_text, **options):
+        importer = OperationImporter(self.budget_manager, default_category='groceries', **options)
+        return importer.run(StringIO(csv_text)).as_dict()
+
+    def test_chunks(self):
+        rows = ''.join(f'2024-01-0{i},Operation {i},-{i}.00\n' for i in range(1, 6))
+        with mock.patch.object(Operation.objects, 'bulk_create', wraps=Operation.objects.bulk_create) as bulk_create:
+            result = self.run_import('date,title,value\n' + rows, chunk_size=2)
+
+        self.assertEqual(result['imported'], 5)
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [2, 2, 1])
+        self.assertEqual(Operation.objects.filter(budget_manager=self.budget_manager).count(), 5)
+
+    def test_sign_decides_type(self):
+        self.run_import('date,title,value\n2024-01-01,Salary,"2500,00"\n2024-01-02,Bread,-3.20\n')
+
+        salary = Operation.objects.get(title='Salary')
+        bread = Operation.objects.get(title='Bread')
+        self.assertEqual((salary.type, salary.value), (self.income, Decimal('2500.00')))
+        self.assertEqual((bread.type, bread.value), (self.expense, Decimal('3.20')))
+
+    def test_type_column_wins(self):
+        self.run_import('date,title,value,type\n2024-01-01,Refund,-5.00,income\n')
+        self.assertEqual(Operation.objects.get(title='Refund').type, self.income)
+
+    def test_missing_inferred_type(self):
+        self.expense.delete()
+        result = self.run_import('date,title,value\n2024-01-01,Bread,-3.20\n2024-01-02,Salary,100\n')
+
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual(result['errors'], [
+            {'line': 2, 'errors': ["type: No 'expense' operation type to infer from the sign of the value."]},
+        ])
+
+    def test_dedupe(self):
+        Operation.objects.create(
+            budget_manager=self.budget_manager, type=self.expense, category=self.category,
+            date=date(2024, 1, 1), title='Bread', value='3.20',
+        )
+        result = self.run_import(
+            'date,title,value\n2024-01-01,Bread,-3.20\n2024-01-02,Milk,-1.00\n2024-01-02,Milk,-1.00\n', dedupe=True,
+        )
+
+        self.assertEqual((result['imported'], result['duplicates']), (1, 2))
+        self.assertEqual(Operation.objects.filter(title='Milk').count(), 1)
+
+    def test_row_errors(self):
+        result = self.run_import(
+            'date,title,value,category,by\n'
+            '2024-01-01,Bread,-3.20,,\n'
+            '01/02/2024,Milk,-1.00,,\n'
+            '2024-01-03,,abc,,\n'
+            '2024-01-04,Tickets,-10.00,Travel,stranger\n'
+            '2024-01-05,Nothing,0,,\n',
+            max_reported_errors=3,
+        )
+
+        self.assertEqual((result['imported'], result['rejected']), (1, 4))
+        self.assertTrue(result['errors_truncated'])
+        self.assertEqual([error['line'] for error in result['errors']], [3, 4, 5])
+        self.assertEqual(result['errors'][1]['errors'], ["title: This field is required.", "value: 'abc' is not a number."])
+        self.assertEqual(result['errors'][2]['errors'], [
+            "category: Unknown category 'Travel'.", "by: 'stranger' is not a member of this budget manager.",
+        ])
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(OperationImportError, 'Missing columns: value.'):
+            self.run_import('date,title\n2024-01-01,Bread\n')
+
+    def test_upload(self):
+        self.client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile('statement.csv', 'Booking date;Text;Amount\n01.02.2024;Bread;-3,20\n'.encode('utf-8'))
+
+        response = self.client.post(f'/api/budget-managers/{self.budget_manager.id}/operations/import/', {
+            'file': upload,
+            'delimiter': ';',
+            'date_format': '%d.%m.%Y',
+            'default_category': 'Groceries',
+            'columns': '{"date": "Booking date", "title": "Text", "value": "Amount"}',
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual(Operation.objects.get(title='Bread').date, date(2024, 2, 1))
+
+# the export streams a budget's operations in the importer's CSV columns, or as NDJSON (exporters.py)
+class OperationExportTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = self.add_member('member')
+        self.post_operation('Salary', '100.00', '2024-01-31', type=self.income.id, by=self.member.id)
+        self.post_operation('Bread, rye', '3.50', '2024-01-15')
+        self.post_operation('Milk', '1.20', '2024-02-02')
+        self.url = f'/api/budget-managers/{self.budget_manager.id}/operations/export/'
+
+    def export(self, **query):
+        response = self.client.get(self.url, query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        response, content = self.export(date_to='2024-01-31')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="budget-{self.budget_manager.id}-operations.csv"')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'id,date,title,value,type,category,by')
+        self.assertEqual([line.split(',', 2)[2] for line in lines[1:]], ['"Bread, rye",3.50,Expense,Groceries,', 'Salary,100.00,Income,Groceries,member'])
+
+    def test_ndjson(self):
+        response, content = self.export(output='ndjson', date_from='2024-01-20')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(row['date'], row['title'], row['value'], row['by']) for row in rows], [
+            ('2024-01-31', 'Salary', '100.00', 'member'), ('2024-02-02', 'Milk', '1.20', None),
+        ])
+
+    def test_invalid_query(self):
+        self.assertEqual(self.client.get(self.url, {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': '2024-02-01', 'date_to': '2024-01-01'}).status_code, 400)
+        self.client.force_authenticate(self.create_user('outsider'))
+        self.assertIn(self.client.get(self.url).status_code, (403, 404))
+
+    def test_chunks(self):
+        rows = operation_rows(self.budget_manager.id, chunk_size=1)
+        chunks = list(csv_chunks(rows, lines_per_chunk=2))
+        # the header on its own, then the rows two at a time
+        self.assertEqual(chunks[0], 'id,date,title,value,type,category,by\r\n')
+        self.assertEqual([chunk.count('\r\n') for chunk in chunks[1:]], [2, 1])
+
+    def test_reimport(self):
+        content = self.export()[1]
+        other = self.create_budget('Copy', self.admin)
+        UserAccess.objects.create(user=self.member, budget_manager=other, role=UserAccess.READ_ONLY)
+        result = OperationImporter(other).run(StringIO(content)).as_dict()
+        self.assertEqual(result['imported'], 3, result)
+        self.assertEqual(
+            sorted(Operation.objects.filter(budget_manager=other).values_list('date', 'title', 'value', 'type__name', 'category__name')),
+            sorted(Operation.objects.filter(budget_manager=self.budget_manager).values_list('date', 'title', 'value', 'type__name', 'category__name')),
+        )
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'operations.ndjson')
+            call_command('export_operations', self.budget_manager.id, '--output', 'ndjson', '--date-from', '2024-02-01', '--file', path)
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual([json.loads(line)['title'] for line in file], ['Milk'])
+
+        with self.assertRaisesMessage(CommandError, 'BudgetManager does not exist.'):
+            call_command('export_operations', 1000)
+
+# the benchmark dataset generator and endpoint benchmark suite (benchmarking.py), on a tiny dataset
+class BenchmarkCommandTests(APITestCase):
+    SEED_OPTIONS = ['--seed', '7', '--households', '2', '--users', '6', '--members', '2', '--operations', '30', '--access-requests', '1', '--chunk-size', '7']
+
+    def seed(self, *options):
+        out = StringIO()
+        call_command('seed_benchmark_data', *self.SEED_OPTIONS, *options, stdout=out)
+        return out.getvalue()
+
+    def operations(self):
+        return list(Operation.objects.order_by('id').values_list('budget_manager__name', 'date', 'title', 'value', 'type__name', 'category__name', 'by__username'))
+
+    def test_seed(self):
+        output = self.seed()
+        self.assertIn('8 users, 2 budget managers, 6 memberships, 60 operations, 2 access requests', output)
+        out = StringIO()
+        call_command('rebuild_operation_rollups', '--verify', stdout=out)
+        self.assertIn('in sync', out.getvalue())
+
+        with self.assertRaisesMessage(CommandError, 'A dataset with seed 7 already exists, clear it first.'):
+            self.seed()
+
+        # the same seed gives the same data
+        operations = self.operations()
+        self.assertIn('Deleted', self.seed('--clear'))
+        self.assertEqual(self.operations(), operations)
+
+    def test_benchmark(self):
+        self.seed()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            out = StringIO()
+            call_command('benchmark_endpoints', '--seed', '7', '--iterations', '1', '--output', path, stdout=out)
+            with open(path, encoding='utf-8') as file:
+                report = json.load(file)
+
+            self.assertEqual(report['meta']['dataset']['operations'], 60)
+            measured = [result for result in report['endpoints'] if 'skipped' not in result]
+            self.assertGreater(len(measured), 20)
+            for result in measured:
+                self.assertTrue(all(status < 500 for status in result['status']), result)
+            skipped = {result['label']: result['skipped'] for result in report['endpoints'] if 'skipped' in result}
+            self.assertEqual(skipped.get('async-budget-events'), 'endless event stream')
+
+            # a report compared with itself, only the latencies can differ between the runs
+            out = StringIO()
+            call_command(
+                'benchmark_endpoints', '--seed', '7', '--iterations', '1', '--only', 'operation-list',
+                '--compare', path, '--latency-threshold', '1000', stdout=out,
+            )
+            self.assertIn('No regressions', out.getvalue())
+
+    def test_compare_reports(self):
+        def report(queries, status, median):
+            return {'endpoints': [
+                {'label': 'operation-list', 'method': 'GET', 'queries': queries, 'queries_cold': queries, 'status': status, 'latency_ms': {'median': median}},
+                {'label': 'async-budget-events', 'method': None, 'skipped': 'endless event stream'},
+            ]}
+
+        baseline = report(3, [200], 10.0)
+        self.assertEqual(benchmarking.compare_reports(baseline, report(3, [200], 12.0)), [])
+        self.assertEqual(benchmarking.compare_reports(baseline, report(4, [500], 20.0)), [
+            'GET operation-list: 3 -> 4 queries',
+            'GET operation-list: 3 -> 4 queries with cold caches',
+            'GET operation-list: status [200] -> [500]',
+            'GET operation-list: median 10.0 -> 20.0 ms',
+        ])
+
+    def test_unknown_seed(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_endpoints', '--seed', '8', '--iterations', '0', stdout=StringIO())
+
+class FailingTransport:
+    def send(self, email):
+        raise ConnectionError('webhook unreachable')
+
+@override_settings(EMAIL_OUTBOX_TRANSPORT='budgetmanager.mail.LocmemTransport')
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        mail.LocmemTransport.outbox = []
+        self.email = mail.enqueue_email('someone@example.com', 'Welcome', 'Hello')
+
+    def expire_leases(self):
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    def send_batch(self, transport):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return mail.process_batch(executor, transport, batch_size=10)
+
+    def test_claim_leases_emails(self):
+        self.assertEqual(mail.claim_batch(10), [self.email])
+        # leased to the first worker until EMAIL_OUTBOX_LEASE_SECONDS have passed
+        self.assertEqual(mail.claim_batch(10), [])
+        self.expire_leases()
+        self.assertEqual(mail.claim_batch(10), [self.email])
+
+    @override_settings(EMAIL_OUTBOX_BACKOFF_BASE_SECONDS=30, EMAIL_OUTBOX_BACKOFF_MAX_SECONDS=100)
+    def test_backoff(self):
+        with mock.patch('budgetmanager.mail.random.uniform', return_value=1.0):
+            self.assertEqual([mail.backoff_delay(attempts).total_seconds() for attempts in (1, 2, 3, 4)], [30, 60, 100, 100])
+        for _ in range(20):
+            self.assertTrue(24 <= mail.backoff_delay(1).total_seconds() <= 36)
+
+    def test_failure_is_retried_later(self):
+        with self.assertLogs('budgetmanager.mail', 'WARNING'):
+            self.assertEqual(self.send_batch(FailingTransport()), 1)
+
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.PENDING, 1))
+        self.assertIn('webhook unreachable', self.email.last_error)
+        self.assertGreater(self.email.next_attempt_at, timezone.now() + timedelta(seconds=20))
+        self.assertEqual(mail.claim_batch(10), [])
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_dead_after_max_attempts(self):
+        with self.assertLogs('budgetmanager.mail', 'WARNING'):
+            self.send_batch(FailingTransport())
+            self.expire_leases()
+            self.send_batch(FailingTransport())
+
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.DEAD, 2))
+        self.expire_leases()
+        self.assertEqual(mail.claim_batch(10), [])
+
+    def test_run_email_outbox_once(self):
+        mail.enqueue_email('other@example.com', 'Access granted', 'Welcome aboard')
+        call_command('run_email_outbox', '--once', '--threads', '2')
+
+        self.assertEqual(sorted(email['to'] for email in mail.LocmemTransport.outbox), ['other@example.com', 'someone@example.com'])
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT).count(), 2)
+        self.assertFalse(OutboundEmail.objects.filter(sent_at__isnull=True).exists())
+
+# the api/async/ endpoints answer exactly like their api/ counterparts
+class AsyncViewParityTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = self.add_member('member')
+        AccessRequest.objects.create(user=self.create_user('applicant'), budget_manager=self.budget_manager)
+        for i in range(25):
+            self.post_operation(
+                f'Operation {i}', f'{i + 1}.50', f'2024-{1 + i % 3:02d}-{1 + i:02d}',
+                type=(self.income if i % 5 == 0 else self.expense).id, by=self.member.id,
+            )
+        self.client.force_authenticate(None)
+
+    def assertSameResponse(self, path, user=None):
+        user = user or self.admin
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(user)['Authorization'])
+        expected = self.client.get(f'/api/{path}')
+        actual = async_to_sync(self.async_client.get)(f'/api/async/{path}', headers=bearer(user))
+
+        self.assertEqual(actual.status_code, expected.status_code, path)
+        # links (next/previous pages) point to the endpoint that was called
+        self.assertEqual(json.loads(actual.content.decode().replace('/api/async/', '/api/')), json.loads(expected.content), path)
+
+    def test_budget_manager_list(self):
+        self.assertSameResponse('budget-managers/')
+        self.assertSameResponse('budget-managers/', self.member)
+
+    def test_members(self):
+        url = f'budget-managers/{self.budget_manager.id}/members/'
+        self.assertSameResponse(url)
+        self.assertSameResponse(f'{url}?compact=true')
+
+    def test_operations(self):
+        url = f'budget-managers/{self.budget_manager.id}/operations/'
+        self.assertSameResponse(url)
+        self.assertSameResponse(f'{url}?compact=true&page_size=10')
+        self.assertSameResponse(f'{url}?unpaginated=true&ordering=value')
+        self.assertSameResponse(f'{url}?type=expense&date_from=2024-02-01', self.member)
+
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.admin)['Authorization'])
+        next_page = self.client.get(f'/api/{url}?page_size=10').data['next']
+        self.assertSameResponse(next_page.split('/api/', 1)[1])
+
+    def test_analytics(self):
+        self.assertSameResponse(f'budget-managers/{self.budget_manager.id}/analytics/')
+        self.assertSameResponse(f'budget-managers/{self.budget_manager.id}/analytics/?date_from=2024-02-01', self.member)
+
+    def test_errors(self):
+        outsider = self.create_user('outsider')
+        self.assertSameResponse(f'budget-managers/{self.budget_manager.id}/operations/', outsider)
+        self.assertSameResponse(f'budget-managers/{self.budget_manager.id}/analytics/?date_from=2024-13-01')
@@ -2,10 +2,12 @@ from django.urls import path
 from .views import RegisterView, CustomTokenObtainPairView, EmailConfirmView
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import OperationCategoryListView, OperationTypeListView
-from .views import BudgetManagerListCreateView, BudgetManagerUpdateView, BudgetManagerDeleteView, BudgetManagerMembersView
-from .views import OperationListView, OperationCreateView, OperationUpdateView, OperationDeleteView
-from .views import UserAccessListView, UserAccessCreateView, UserAccessUpdateView, UserAccessDeleteView
-from .views import AccessRequestListView, AccessRequestCreateView, AccessRequestUpdateView
+from .views import BudgetManagerListCreateView, BudgetManagerUpdateView, BudgetManagerDeleteView, BudgetManagerMembersView, BudgetBootstrapView
+from .views import OperationListView, OperationChangesView, OperationCreateView, OperationBulkCreateView, OperationImportView, OperationExportView, OperationUpdateView, OperationDeleteView
+from .views import UserAccessListView, UserAccessCreateView, UserAccessUpdateView, UserAccessDeleteView, UserAccessBatchUpdateView
+from .views import AccessRequestListView, AccessRequestCreateView, AccessRequestUpdateView, AccessRequestBatchUpdateView
+from .views import OperationAnalyticsView, OperationSearchView
+from .views import ResponseCacheStatsView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
@@ -17,14 +19,23 @@ urlpatterns = [
     path('operation-categories/', OperationCategoryListView.as_view(), name='operation_category_list'), # GET for operation categories
     path('operation-types/', OperationTypeListView.as_view(), name='operation_type_list'), # GET for operation types
 
+    path('response-cache/stats/', ResponseCacheStatsView.as_view(), name='response-cache-stats'), # GET for response cache counters of the worker (staff only)
+
     path('budget-managers/', BudgetManagerListCreateView.as_view(), name='budget_manager_list_create'), # GET & POST for household budget managers
     path('budget-managers/<int:pk>/edit/', BudgetManagerUpdateView.as_view(), name='budget-manager-update'), # PUT for household budget managers
     path('budget-managers/<int:pk>/delete/', BudgetManagerDeleteView.as_view(), name='budget-manager-delete'), # DELETE for household budget managers
 
+    path('budget-managers/<int:budget_manager_id>/bootstrap/', BudgetBootstrapView.as_view(), name='budget-manager-bootstrap'), # GET for role, members, reference data, totals and first operations page in one response
     path('budget-managers/<int:budget_manager_id>/members/', BudgetManagerMembersView.as_view(), name='budget-manager-members'), # GET for members of a household budget
 
     path('budget-managers/<int:budget_manager_id>/operations/', OperationListView.as_view(), name='operation-list'), # GET for operations within a household with id of budget_manager_id
+    path('budget-managers/<int:budget_manager_id>/operations/changes/', OperationChangesView.as_view(), name='operation-changes'), # GET for operations changed since a sync token
+    path('budget-managers/<int:budget_manager_id>/operations/search/', OperationSearchView.as_view(), name='operation-search'), # GET for operations ranked by title match
+    path('budget-managers/<int:budget_manager_id>/analytics/', OperationAnalyticsView.as_view(), name='operation-analytics'), # GET for operations grouped by month, category, type and member
     path('budget-managers/<int:budget_manager_id>/operations/add/', OperationCreateView.as_view(), name='operation-create'), # POST for operations
+    path('budget-managers/<int:budget_manager_id>/operations/bulk-add/', OperationBulkCreateView.as_view(), name='operation-bulk-create'), # POST for a list of operations
+    path('budget-managers/<int:budget_manager_id>/operations/import/', OperationImportView.as_view(), name='operation-import'), # POST (multipart) for a CSV file of operations
+    path('budget-managers/<int:budget_manager_id>/operations/export/', OperationExportView.as_view(), name='operation-export'), # GET for a CSV/NDJSON stream of operations
     path('budget-managers/<int:budget_manager_id>/operations/<int:pk>/edit/', OperationUpdateView.as_view(), name='operation-edit'), # PATCH for operations
     path('budget-managers/<int:budget_manager_id>/operations/<int:pk>/delete/', OperationDeleteView.as_view(), name='operation-delete'), # DELETE for operations
 
@@ -32,9 +43,11 @@ urlpatterns = [
     path('budget-managers/<int:budget_manager_id>/user-access/add/', UserAccessCreateView.as_view(), name='user_access_create'), # POST for user access
     path('budget-managers/<int:budget_manager_id>/user-access/<int:pk>/edit/', UserAccessUpdateView.as_view(), name='user-access-update'), # PUT for user access
     path('budget-managers/<int:budget_manager_id>/user-access/<int:pk>/delete/', UserAccessDeleteView.as_view(), name='user-access-delete'), # DELETE for user access
+    path('budget-managers/<int:budget_manager_id>/user-access/batch/', UserAccessBatchUpdateView.as_view(), name='user-access-batch'), # POST for the role of several members
 
     path('access-requests/send/', AccessRequestCreateView.as_view(), name='access-request-create'), # POST for access requests
     path('budget-managers/<int:budget_manager_id>/access-requests/', AccessRequestListView.as_view(), name='access-request-list'), # GET for access requests
     path('budget-managers/<int:budget_manager_id>/access-requests/<int:pk>/edit/', AccessRequestUpdateView.as_view(), name='access-request-update'), # PUT for access requests 
+    path('budget-managers/<int:budget_manager_id>/access-requests/batch/', AccessRequestBatchUpdateView.as_view(), name='access-request-batch'), # POST for accepting/denying several access requests
     # (there's no DELETE for access requests because access requests can have status of "pending", "accepted", "denied")
 ]
\ No newline at end of file
@@ -0,0 +1,7 @@
+# boolean query parameter switch, e.g. ?compact=true
+def query_flag(request, name):
+    return query_params(request).get(name, '').lower() in ('1', 'true', 'yes')
+
+# query parameters of a DRF request or of a plain Django request (async views)
+def query_params(request):
+    return getattr(request, 'query_params', request.GET)
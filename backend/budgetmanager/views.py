@@ -1,24 +1,58 @@
+import io
+
 from rest_framework import generics, status
 from rest_framework.mixins import UpdateModelMixin
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
 from django.core.exceptions import PermissionDenied
-from django.db import models
-from django.http import JsonResponse
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils.encoding import force_str
 from django.utils.http import urlsafe_base64_decode
 from .serializers import RegisterSerializer, CustomTokenObtainPairSerializer
-from .models import OperationCategory, OperationType, BudgetManager, Operation, UserAccess, AccessRequest
+from .models import OperationCategory, OperationType, BudgetManager, Operation, OperationTombstone, UserAccess, AccessRequest
 from .serializers import OperationCategorySerializer, OperationTypeSerializer # Serializers for OperationCategory and OperationType
-from .serializers import BudgetManagerSerializer # Serializer for BudgetManager
-from .serializers import OperationSerializer, OperationListSerializer # Serializers for Operation
-from .serializers import UserAccessSerializer, UserAccessUpdateSerializer # Serializers for UserAccess
-from .serializers import AccessRequestSerializer, AccessRequestCreateSerializer, AccessRequestUpdateSerializer # Serializers for AccessRequest
+from .serializers import BudgetManagerSerializer, BudgetManagerSummarySerializer # Serializers for BudgetManager
+from .serializers import OperationSerializer, OperationListSerializer, OperationCompactSerializer, OperationBulkItemSerializer # Serializers for Operation
+from .serializers import OperationSyncSerializer, OperationCompactSyncSerializer # Serializers for the delta sync of operations
+from .serializers import UserAccessSerializer, UserAccessUpdateSerializer, UserAccessCompactSerializer # Serializers for UserAccess
+from .serializers import AccessRequestSerializer, AccessRequestCreateSerializer, AccessRequestUpdateSerializer, AccessRequestCompactSerializer # Serializers for AccessRequest
+from .serializers import AccessRequestBatchSerializer, UserAccessBatchSerializer # Serializers for batch decisions
+from .serializers import OperationAnalyticsQuerySerializer # Serializer for analytics query parameters
+from .serializers import OperationListQuerySerializer # Serializer for operations list filters
+from .serializers import OperationSearchQuerySerializer # Serializer for operation search query parameters
+from .serializers import OperationChangesQuerySerializer # Serializer for the delta sync token
+from .serializers import OperationImportSerializer, OperationExportQuerySerializer # Serializers for CSV import options and export query parameters
+from .analytics import aggregate_operations
+from .filters import filter_operations
+from .search import search_operation_ids, operations_in_order
+from .importers import OperationImporter, OperationImportError
+from .exporters import CONTENT_TYPES, export_chunks, operation_rows
+from .deletion import delete_budget_manager
+from .access import decide_access_requests, change_roles
+from . import changes, events, membership, reference
+from .conditional import ConditionalGetMixin, BudgetVersionETagMixin
+from .responsecache import ResponseCacheMixin, get_stats as get_response_cache_stats
+from .pagination import OperationCursorPagination
+from .utils import query_flag
 from .permissions import IsUnauthenticated, IsAuthenticated, IsBudgetEditorOrAdmin, IsAdminOfBudgetManager, IsAdminOfRelatedBudgetManager, IsBudgetMember
 
+# list views that can also render the flattened ?compact=true representation (no nested budget manager on every row)
+class CompactSerializerMixin:
+    compact_serializer_class = None
+
+    def get_serializer_class(self):
+        if self.compact_serializer_class and query_flag(self.request, 'compact'):
+            return self.compact_serializer_class
+        return super().get_serializer_class()
+
 # user registration
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -48,71 +82,252 @@ class EmailConfirmView(APIView):
                 user.delete()
             return JsonResponse({'status': 'error', 'message': 'Invalid or expired token'}, status=400)
         
-class OperationCategoryListView(generics.ListAPIView):
+# categories and types are served from the in-process reference data cache,
+# the long public Cache-Control lets clients and proxies skip these requests until the data changes
+class ReferenceDataListView(ConditionalGetMixin, generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    reference_key = None
+
+    @property
+    def cache_control(self):
+        return {'public': True, 'max_age': getattr(settings, 'REFERENCE_DATA_MAX_AGE', 86400)}
+
+    def get_etag(self, request):
+        return reference.get_reference_data()[f'{self.reference_key}_etag']
+
+    def get_last_modified(self, request):
+        return reference.get_reference_data()['last_modified']
+
+    def list(self, request, *args, **kwargs):
+        return Response(reference.get_reference_data()[self.reference_key])
+
+class OperationCategoryListView(ReferenceDataListView):
     queryset = OperationCategory.objects.all()
     serializer_class = OperationCategorySerializer
-    permission_classes = [IsAuthenticated]
+    reference_key = 'categories'
 
-class OperationTypeListView(generics.ListAPIView):
+class OperationTypeListView(ReferenceDataListView):
     queryset = OperationType.objects.all()
     serializer_class = OperationTypeSerializer
-    permission_classes = [IsAuthenticated]
+    reference_key = 'types'
+
+# hits, misses and memory use of the response cache of this worker (responsecache.py), for tuning its bound
+class ResponseCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response(get_response_cache_stats())
 
-class BudgetManagerMembersView(generics.ListAPIView):
+class BudgetManagerMembersView(BudgetVersionETagMixin, ResponseCacheMixin, CompactSerializerMixin, generics.ListAPIView):
     serializer_class = UserAccessSerializer
+    compact_serializer_class = UserAccessCompactSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         budget_manager_id = self.kwargs['budget_manager_id']
-        return UserAccess.objects.filter(budget_manager_id=budget_manager_id)
+        return UserAccess.objects.filter(budget_manager_id=budget_manager_id).select_related('user', 'budget_manager__admin')
 
     def list(self, request, *args, **kwargs):
         budget_manager_id = self.kwargs['budget_manager_id']
-        try:
-            budget_manager = BudgetManager.objects.get(id=budget_manager_id)
-        except BudgetManager.DoesNotExist:
+        if membership.get_budget_manager(request, budget_manager_id) is None:
             return Response({"detail": "BudgetManager does not exist."}, status=status.HTTP_404_NOT_FOUND)
 
-        if not UserAccess.objects.filter(budget_manager=budget_manager, user=request.user).exists():
+        if not membership.is_member(request, budget_manager_id):
             return Response({"detail": "You do not have access to this BudgetManager."}, status=status.HTTP_403_FORBIDDEN)
 
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+# the budgets of the user with their role and a summary (balance, operation count, last activity, pending access requests),
+# a single query however many budgets the user belongs to
 class BudgetManagerListCreateView(generics.ListCreateAPIView):
     queryset = BudgetManager.objects.all()
-    serializer_class = BudgetManagerSerializer
+    serializer_class = BudgetManagerSummarySerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        return self.queryset.filter(
-            models.Q(admin=user) | models.Q(memberships__user=user)
-        ).distinct()
+        return self.queryset.with_summaries(self.request.user.id)
+
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return BudgetManagerSerializer
+        return super().get_serializer_class()
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        # the new budget in the shape of the list entries
+        instance = self.get_queryset().get(pk=serializer.instance.pk)
+        return Response(BudgetManagerSummarySerializer(instance, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
 
     def perform_create(self, serializer):
         instance = serializer.save()
         # Create UserAccess entry for admin role
-        UserAccess.objects.create(user=self.request.user, budget_manager=instance, role=UserAccess.ADMIN)
+        UserAccess.objects.create(user_id=self.request.user.id, budget_manager=instance, role=UserAccess.ADMIN)
     
 class BudgetManagerUpdateView(generics.UpdateAPIView):
     queryset = BudgetManager.objects.all()
     serializer_class = BudgetManagerSerializer
     permission_classes = [IsAuthenticated, IsAdminOfBudgetManager]
     
+# the budget manager disappears right away, its operations, memberships and access requests are purged in the background
+# (see deletion.py), hence 202 instead of 204
 class BudgetManagerDeleteView(generics.DestroyAPIView):
     queryset = BudgetManager.objects.all()
     serializer_class = BudgetManagerSerializer
     permission_classes = [IsAuthenticated, IsAdminOfBudgetManager]
 
-class OperationListView(generics.ListAPIView):
+    def destroy(self, request, *args, **kwargs):
+        self.perform_destroy(self.get_object())
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+    def perform_destroy(self, instance):
+        delete_budget_manager(instance)
+
+class OperationListView(BudgetVersionETagMixin, ResponseCacheMixin, CompactSerializerMixin, generics.ListAPIView):
     serializer_class = OperationListSerializer
+    compact_serializer_class = OperationCompactSerializer
     permission_classes = [IsAuthenticated, IsBudgetMember]
+    pagination_class = OperationCursorPagination
 
+    # ?date_from, date_to, category, type, by, value_min, value_max and ordering, see filters.py
     def get_queryset(self):
         budget_manager_id = self.kwargs['budget_manager_id']
-        return Operation.objects.filter(budget_manager_id=budget_manager_id)
+        query_serializer = OperationListQuerySerializer(data=self.request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+
+        return filter_operations(
+            Operation.objects.filter(budget_manager_id=budget_manager_id)
+            .select_related('by', 'category', 'type', 'budget_manager__admin'),
+            query_serializer.validated_data
+        )
+
+# delta sync for clients keeping a local copy of the operations: the operations inserted or updated and the ids of those
+# deleted since the token of the previous sync, together with the token to send next time
+# the token is the budget manager version (see changes.py), read before the rows so a write committed in between is
+# returned again on the next sync rather than missed; a missing or unknown token returns everything with reset: true
+class OperationChangesView(BudgetVersionETagMixin, CompactSerializerMixin, generics.RetrieveAPIView):
+    serializer_class = OperationSyncSerializer
+    compact_serializer_class = OperationCompactSyncSerializer
+    permission_classes = [IsAuthenticated, IsBudgetMember]
+    # clients sync right after a change event, a lagging replica wouldn't have the change yet
+    use_primary = True
+
+    def retrieve(self, request, budget_manager_id):
+        query_serializer = OperationChangesQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        since = query_serializer.validated_data.get('since')
+
+        token = membership.get_budget_manager(request, budget_manager_id).version
+        reset = since is None or since > token
+
+        operations = Operation.objects.filter(budget_manager_id=budget_manager_id).select_related('by', 'category', 'type', 'budget_manager__admin')
+        if reset:
+            deleted = []
+        else:
+            operations = operations.filter(change_seq__gt=since)
+            deleted = list(
+                OperationTombstone.objects.filter(budget_manager_id=budget_manager_id, change_seq__gt=since)
+                .order_by('change_seq').values_list('operation_id', flat=True)
+            )
+
+        return Response({
+            'token': str(token),
+            'reset': reset,
+            'operations': self.get_serializer(operations.order_by('change_seq', 'id'), many=True).data,
+            'deleted': deleted,
+        })
+
+# ranked search over operation titles (?q=electr finds "Electricity bill", so does ?q=electicity), see search.py
+# results are ordered by relevance, so they are paged by page number instead of the list's keyset cursor
+class OperationSearchView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsBudgetMember]
+
+    def get(self, request, budget_manager_id):
+        query_serializer = OperationSearchQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        query = query_serializer.validated_data
+        page, page_size = query['page'], query['page_size']
+
+        # one extra id tells whether there is a next page
+        ids = search_operation_ids(budget_manager_id, query['q'], page_size + 1, (page - 1) * page_size)
+        has_next = len(ids) > page_size
+        operations = operations_in_order(
+            ids[:page_size],
+            Operation.objects.filter(budget_manager_id=budget_manager_id).select_related('by', 'category', 'type', 'budget_manager__admin')
+        )
+
+        serializer_class = OperationCompactSerializer if query_flag(request, 'compact') else OperationListSerializer
+        return Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'page', page + 1) if has_next else None,
+            'results': serializer_class(operations, many=True, context=self.get_serializer_context()).data,
+        })
+
+# pre-grouped income/expense series for the budget graphs, computed by the database instead of the browser
+class OperationAnalyticsView(APIView):
+    permission_classes = [IsAuthenticated, IsBudgetMember]
+
+    def get(self, request, budget_manager_id):
+        query_serializer = OperationAnalyticsQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+
+        data = aggregate_operations(budget_manager_id, **query_serializer.validated_data)
+        return Response(data)
+
+# everything the budget page needs when it opens, in place of separate operations, types, categories and members requests:
+# the caller's role, members, reference data, totals per type and the first page of operations (?page_size, ?unpaginated
+# and ?compact work like on the operations list)
+# one authentication and membership check, a fixed number of queries: budget manager, members, rollup totals, operations
+class BudgetBootstrapView(BudgetVersionETagMixin, generics.RetrieveAPIView):
+    permission_classes = [IsAuthenticated, IsBudgetMember]
+
+    # reference data isn't part of the budget version
+    def get_etag(self, request):
+        etag = super().get_etag(request)
+        if etag is None:
+            return None
+        reference_data = reference.get_reference_data()
+        return f"{etag}-{reference_data['categories_etag'][:8]}{reference_data['types_etag'][:8]}"
+
+    def retrieve(self, request, budget_manager_id):
+        budget_manager = membership.get_budget_manager(request, budget_manager_id)
+        members = list(UserAccess.objects.filter(budget_manager_id=budget_manager_id).select_related('user').order_by('id'))
+
+        # the admin is one of the members, reusing the loaded user saves the admin lookup of the serializer
+        for member in members:
+            if member.user_id == budget_manager.admin_id:
+                budget_manager.admin = member.user
+
+        totals = aggregate_operations(budget_manager_id, group_by=['type'])
+        reference_data = reference.get_reference_data()
+
+        paginator = OperationCursorPagination()
+        queryset = (
+            Operation.objects.filter(budget_manager_id=budget_manager_id)
+            .select_related('by', 'category', 'type', 'budget_manager__admin')
+        )
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer_class = OperationCompactSerializer if query_flag(request, 'compact') else OperationListSerializer
+        if page is None:
+            operations = serializer_class(queryset.order_by(*paginator.ordering), many=True).data
+        else:
+            operations = paginator.get_paginated_data(serializer_class(page, many=True).data)
+
+        return Response({
+            'budget_manager': BudgetManagerSerializer(budget_manager).data,
+            'sync_token': str(budget_manager.version), # for operations/changes/, read before the operations
+            'role': membership.get_role(request, budget_manager_id),
+            'members': UserAccessCompactSerializer(members, many=True).data,
+            'operation_types': reference_data['types'],
+            'operation_categories': reference_data['categories'],
+            'summary': {
+                'totals': totals['totals'],
+                'count': sum(row['count'] for row in totals['series']),
+            },
+            'operations': operations,
+        })
 
 class OperationCreateView(generics.CreateAPIView):
     serializer_class = OperationSerializer
@@ -126,7 +341,103 @@ class OperationCreateView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         budget_manager_id = self.kwargs['budget_manager_id']
-        serializer.save(budget_manager_id=budget_manager_id)
+        with transaction.atomic():
+            operation = serializer.save(budget_manager_id=budget_manager_id)
+            changes.operations_created([operation])
+
+# creates a whole list of operations in one request: validated together (members loaded once, categories/types from
+# the reference cache) and inserted with a single bulk_create in one transaction
+# the batch is all-or-nothing, a rejected batch returns a list of per-item errors aligned with the request items
+class OperationBulkCreateView(generics.GenericAPIView):
+    serializer_class = OperationBulkItemSerializer
+    permission_classes = [IsAuthenticated, IsBudgetEditorOrAdmin]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        budget_manager_id = self.kwargs['budget_manager_id']
+        context['members'] = {user.id: user for user in User.objects.filter(memberships__budget_manager_id=budget_manager_id)}
+        return context
+
+    def post(self, request, budget_manager_id):
+        max_batch_size = getattr(settings, 'OPERATION_BULK_MAX_BATCH_SIZE', 500)
+
+        if not isinstance(request.data, list):
+            return Response({"detail": "Expected a list of operations."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > max_batch_size:
+            return Response({"detail": f"A batch can contain at most {max_batch_size} operations."}, status=status.HTTP_400_BAD_REQUEST)
+
+        budget_manager = membership.get_budget_manager(request, budget_manager_id)
+        if budget_manager is None:
+            return Response({"detail": "BudgetManager does not exist."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        operations = [Operation(budget_manager=budget_manager, **item) for item in serializer.validated_data]
+        with transaction.atomic():
+            operations = Operation.objects.bulk_create(operations)
+            changes.operations_created(operations)
+
+        return Response(OperationCompactSerializer(operations, many=True).data, status=status.HTTP_201_CREATED)
+
+# CSV (spreadsheet/bank statement) upload, streamed row by row and committed in chunks
+# rejected rows are reported in the response without aborting the import
+class OperationImportView(generics.GenericAPIView):
+    serializer_class = OperationImportSerializer
+    permission_classes = [IsAuthenticated, IsBudgetEditorOrAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, budget_manager_id):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        options = serializer.validated_data
+
+        budget_manager = membership.get_budget_manager(request, budget_manager_id)
+        if budget_manager is None:
+            return Response({"detail": "BudgetManager does not exist."}, status=status.HTTP_404_NOT_FOUND)
+
+        # uploads above FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to a temporary file, only one chunk is kept in memory
+        stream = io.TextIOWrapper(options['file'].file, encoding=options['encoding'], newline='')
+        try:
+            importer = OperationImporter(
+                budget_manager,
+                columns=options.get('columns'),
+                chunk_size=getattr(settings, 'OPERATION_IMPORT_CHUNK_SIZE', 1000),
+                dedupe=options['dedupe'],
+                delimiter=options['delimiter'],
+                date_format=options['date_format'],
+                default_category=options.get('default_category'),
+            )
+            result = importer.run(stream)
+        except OperationImportError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({"detail": f"The file is not encoded as {options['encoding']}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_status = status.HTTP_201_CREATED if result.imported else status.HTTP_200_OK
+        return Response(result.as_dict(), status=response_status)
+
+# CSV/NDJSON export streamed straight from a chunked queryset iterator,
+# memory use doesn't depend on the size of the history and the first bytes are sent right away
+class OperationExportView(APIView):
+    permission_classes = [IsAuthenticated, IsBudgetMember]
+
+    def get(self, request, budget_manager_id):
+        query_serializer = OperationExportQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        options = query_serializer.validated_data
+
+        rows = operation_rows(
+            budget_manager_id,
+            date_from=options.get('date_from'),
+            date_to=options.get('date_to'),
+            chunk_size=getattr(settings, 'OPERATION_EXPORT_CHUNK_SIZE', 2000),
+        )
+        output = options['output']
+        response = StreamingHttpResponse(export_chunks(output, rows), content_type=CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="budget-{budget_manager_id}-operations.{output}"'
+        return response
 
 class OperationUpdateView(generics.UpdateAPIView):
     queryset = Operation.objects.all()
@@ -143,6 +454,18 @@ class OperationUpdateView(generics.UpdateAPIView):
             raise PermissionDenied("Operation not found in the specified budget manager.")
 
         return obj
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # the row is locked and read again, a concurrent edit or delete could have changed it since get_object
+            # and the rollups have to move the amount from where it is counted now
+            serializer.instance = Operation.objects.select_for_update().filter(id=serializer.instance.id).first()
+            if serializer.instance is None:
+                raise PermissionDenied("Operation not found in the specified budget manager.")
+            # the operation may move to another month, category or type, so remember where it was counted before
+            old_snapshot = changes.snapshot(serializer.instance)
+            operation = serializer.save()
+            changes.operation_updated(old_snapshot, operation)
     
 class OperationDeleteView(generics.DestroyAPIView):
     queryset = Operation.objects.all()
@@ -160,27 +483,26 @@ class OperationDeleteView(generics.DestroyAPIView):
 
         return obj
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # locked and read again, so a concurrent edit is subtracted from the rollups with its current values
+            # and a concurrent delete isn't subtracted twice
+            operation = Operation.objects.select_for_update().filter(id=instance.id).first()
+            if operation is None:
+                raise PermissionDenied("Operation not found in the specified budget manager.")
+            changes.operations_deleted([operation])
+            operation.delete()
+
 # Authenticated users can add new UserAccess entries only for households they are an admin of and it can be only "read_only" role
-class UserAccessListView(generics.ListAPIView):
+class UserAccessListView(BudgetVersionETagMixin, ResponseCacheMixin, CompactSerializerMixin, generics.ListAPIView):
     queryset = UserAccess.objects.all()
     serializer_class = UserAccessSerializer
+    compact_serializer_class = UserAccessCompactSerializer
     permission_classes = [IsAuthenticated, IsBudgetMember]
 
     def get_queryset(self):
         budget_manager_id = self.kwargs.get('budget_manager_id')
-        return UserAccess.objects.filter(budget_manager_id=budget_manager_id)
-    
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-
-        # Check if the user is admin or editor
-        user = self.request.user
-        budget_manager_id = self.kwargs.get('budget_manager_id')
-        user_access = UserAccess.objects.filter(user=user, budget_manager_id=budget_manager_id).first()
-
-        serializer = self.get_serializer(queryset, many=True)
-
-        return Response(serializer.data)
+        return UserAccess.objects.filter(budget_manager_id=budget_manager_id).select_related('user', 'budget_manager__admin')
 
 class UserAccessCreateView(generics.CreateAPIView):
     serializer_class = UserAccessSerializer
@@ -202,37 +524,73 @@ class UserAccessUpdateView(UpdateModelMixin, generics.GenericAPIView):
     def patch(self, request, *args, **kwargs):
         return self.partial_update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        instance = serializer.save()
+        events.publish(instance.budget_manager_id, 'member.updated', user=instance.user_id, role=instance.role)
+
+# base of the batch endpoints of the budget admin, the body is validated as a whole and every item gets an outcome (see access.py)
+class BudgetAdminBatchView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, budget_manager_id):
+        budget_manager = membership.get_budget_manager(request, budget_manager_id)
+        if budget_manager is None:
+            return Response({"detail": "BudgetManager does not exist."}, status=status.HTTP_404_NOT_FOUND)
+        if not membership.is_budget_admin(request, budget_manager):
+            return Response({"detail": "Only the admin can make batch changes."}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({"results": self.apply(budget_manager, serializer.validated_data)})
+
+# role of several members at once: {"ids": [user access ids], "role": "read_only" | "edit"}
+class UserAccessBatchUpdateView(BudgetAdminBatchView):
+    serializer_class = UserAccessBatchSerializer
+
+    def apply(self, budget_manager, data):
+        return change_roles(budget_manager.id, data['ids'], data['role'], self.request.user.id)
+
 class UserAccessDeleteView(generics.DestroyAPIView):
-    queryset = UserAccess.objects.all()
+    queryset = UserAccess.objects.filter(budget_manager__deleted_at__isnull=True)
     serializer_class = UserAccessSerializer
     permission_classes = [IsAuthenticated, IsAdminOfRelatedBudgetManager]
 
     def perform_destroy(self, instance):
         user = instance.user
         # Prevent admin from deleting their own UserAccess entry
-        if instance.user == self.request.user and instance.role == UserAccess.ADMIN:
+        if instance.user_id == self.request.user.id and instance.role == UserAccess.ADMIN:
             raise PermissionDenied('You cannot remove your own admin access.')
 
-        if not (self.request.user == instance.budget_manager.admin or self.request.user.is_superuser):
+        if not (self.request.user.id == instance.budget_manager.admin_id or self.request.user.is_superuser):
             raise PermissionDenied('You do not have permission to delete this user access.')
 
         instance.delete()
+        # also ends the removed member's open streams
+        events.publish(instance.budget_manager_id, 'member.removed', user=instance.user_id)
 
-class AccessRequestListView(generics.ListAPIView):
+class AccessRequestListView(CompactSerializerMixin, generics.ListAPIView):
     serializer_class = AccessRequestSerializer
+    compact_serializer_class = AccessRequestCompactSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         budget_manager_id = self.kwargs['budget_manager_id']
-        budget_manager = BudgetManager.objects.get(id=budget_manager_id)
-        if budget_manager.admin != self.request.user:
+        budget_manager = membership.get_budget_manager(self.request, budget_manager_id)
+        if budget_manager is None or budget_manager.admin_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to view these access requests.")
-        return AccessRequest.objects.filter(budget_manager_id=budget_manager_id)
+        return AccessRequest.objects.filter(budget_manager_id=budget_manager_id).select_related('user', 'budget_manager__admin')
     
 class AccessRequestCreateView(generics.CreateAPIView):
     serializer_class = AccessRequestCreateSerializer
     permission_classes = [IsAuthenticated]
 
+# decision on several pending access requests at once: {"ids": [access request ids], "status": "accepted" | "denied"}
+class AccessRequestBatchUpdateView(BudgetAdminBatchView):
+    serializer_class = AccessRequestBatchSerializer
+
+    def apply(self, budget_manager, data):
+        return decide_access_requests(budget_manager.id, data['ids'], data['status'])
+
 class AccessRequestUpdateView(generics.UpdateAPIView):
     serializer_class = AccessRequestUpdateSerializer
     permission_classes = [IsAuthenticated]
@@ -242,4 +600,5 @@ class AccessRequestUpdateView(generics.UpdateAPIView):
         return AccessRequest.objects.filter(budget_manager_id=budget_manager_id)
 
     def perform_update(self, serializer):
-        serializer.save()
\ No newline at end of file
+        instance = serializer.save()
+        events.publish(instance.budget_manager_id, 'access_request.updated', id=instance.id, user=instance.user_id, status=instance.status)
\ No newline at end of file
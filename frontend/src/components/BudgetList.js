@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useParams } from 'react-router-dom';
 import { Table, Container, Alert, Button, Modal, Form, Badge } from 'react-bootstrap';
 import { PencilSquare, Trash } from 'react-bootstrap-icons'; // Import ikony PencilSquare
@@ -23,6 +23,7 @@ function BudgetOperations() {
   const [operationCategories, setOperationCategories] = useState([]);
   const [members, setMembers] = useState([]);
   const [currentUserRole, setCurrentUserRole] = useState('');
+  const [syncToken, setSyncToken] = useState(null);
   const [form, setForm] = useState({
     type: '',
     date: '',
@@ -33,71 +34,134 @@ function BudgetOperations() {
   });
 
   useEffect(() => {
-    const fetchOperations = async () => {
+    // one request for the operations, types, categories, members, the user's role and the totals
+    const fetchBudget = async () => {
       try {
-        const response = await api.get(`/budget-managers/${budget_manager_id}/operations/`);
-        const sortedOperations = response.data.sort((a, b) => {
-          if (a.date === b.date) {
-            return b.id - a.id;
-          }
-          return new Date(b.date) - new Date(a.date);
-        });
-        setOperations(sortedOperations);
-        const incomeTotal = sortedOperations.filter(op => op.type.name === 'Income').reduce((sum, op) => sum + parseFloat(op.value), 0);
-        const expenseTotal = sortedOperations.filter(op => op.type.name === 'Expense').reduce((sum, op) => sum + parseFloat(op.value), 0);
+        const response = await api.get(`/budget-managers/${budget_manager_id}/bootstrap/?unpaginated=true`);
+        const data = response.data;
+        setOperations(data.operations);
+        setOperationTypes(data.operation_types);
+        setOperationCategories(data.operation_categories);
+        setMembers(data.members);
+        setCurrentUserRole(data.role || '');
+        setSyncToken(data.sync_token);
+
+        const incomeTotal = parseFloat(data.summary.totals.Income || 0);
+        const expenseTotal = parseFloat(data.summary.totals.Expense || 0);
         setIncomeSum(incomeTotal);
         setExpenseSum(expenseTotal);
         setBalance(incomeTotal - expenseTotal);
       } catch (error) {
-        setError('There was an error fetching the operations!');
-        console.error("There was an error fetching the operations!", error);
+        setError('There was an error fetching the budget!');
+        console.error("There was an error fetching the budget!", error);
       }
     };
 
-    const fetchOperationTypes = async () => {
-      try {
-        const response = await api.get('/operation-types/');
-        setOperationTypes(response.data);
-      } catch (error) {
-        setError('There was an error fetching the operation types!');
-        console.error("There was an error fetching the operation types!", error);
+    fetchBudget();
+  }, [budget_manager_id]);
+
+  // applies only what changed since the last sync to the local list instead of reloading the page
+  const syncOperations = async () => {
+    // without a token yet the server sends every operation (reset)
+    const query = syncToken === null ? '' : `?since=${syncToken}`;
+    const response = await api.get(`/budget-managers/${budget_manager_id}/operations/changes/${query}`);
+    const data = response.data;
+
+    const byId = new Map(data.reset ? [] : operations.map(op => [op.id, op]));
+    data.deleted.forEach(id => byId.delete(id));
+    data.operations.forEach(op => byId.set(op.id, op));
+
+    const syncedOperations = [...byId.values()].sort((a, b) => {
+      if (a.date === b.date) {
+        return b.id - a.id;
       }
-    };
+      return new Date(b.date) - new Date(a.date);
+    });
+    setOperations(syncedOperations);
+    setSyncToken(data.token);
 
-    const fetchOperationCategories = async () => {
-      try {
-        const response = await api.get('/operation-categories/');
-        setOperationCategories(response.data);
-      } catch (error) {
-        setError('There was an error fetching the operation categories!');
-        console.error("There was an error fetching the operation categories!", error);
+    const incomeTotal = syncedOperations.filter(op => op.type.name === 'Income').reduce((sum, op) => sum + parseFloat(op.value), 0);
+    const expenseTotal = syncedOperations.filter(op => op.type.name === 'Expense').reduce((sum, op) => sum + parseFloat(op.value), 0);
+    setIncomeSum(incomeTotal);
+    setExpenseSum(expenseTotal);
+    setBalance(incomeTotal - expenseTotal);
+  };
+
+  // the live event stream below always calls the sync of the latest render
+  const syncRef = useRef(syncOperations);
+  syncRef.current = syncOperations;
+
+  // changes made by other members arrive as server-sent events, every operation event triggers a delta sync
+  // (fetch instead of EventSource, which can't send the Authorization header)
+  useEffect(() => {
+    if (syncToken === null) {
+      return undefined;
+    }
+
+    const controller = new AbortController();
+    let reconnectTimer = null;
+
+    const handleEvent = (type) => {
+      if (type.startsWith('operations.') || type === 'overflow') {
+        syncRef.current().catch(error => console.error("There was an error syncing the operations!", error));
+      } else if (type === 'revoked') {
+        setError('Your access to this budget has been removed.');
+        controller.abort();
+      } else if (type === 'budget.deleted') {
+        setError('This budget has been deleted.');
+        controller.abort();
       }
     };
 
-    const fetchMembers = async () => {
+    const connect = async () => {
       try {
-        const response = await api.get(`/budget-managers/${budget_manager_id}/members/`);
-        setMembers(response.data);
-
-        // Find current user in members list and set role
-        const username = localStorage.getItem('username');
-        const currentUser = response.data.find(member => member.user.username === username);
-        if (currentUser) {
-          setCurrentUserRole(currentUser.role);
-        } else {
-          setCurrentUserRole('');
+        const response = await fetch(`${api.defaults.baseURL}/async/budget-managers/${budget_manager_id}/events/`, {
+          headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+          signal: controller.signal,
+        });
+        // 501 when the backend isn't served by an ASGI server, the list then goes without live updates
+        if (!response.ok) {
+          return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) {
+            break;
+          }
+          buffer += decoder.decode(value, { stream: true });
+          const messages = buffer.split('\n\n');
+          buffer = messages.pop();
+          messages.forEach(message => {
+            const typeLine = message.split('\n').find(line => line.startsWith('event: '));
+            if (typeLine) {
+              handleEvent(typeLine.slice('event: '.length));
+            }
+          });
         }
       } catch (error) {
-        setError('There was an error fetching the members!');
-        console.error("There was an error fetching the members!", error);
+        if (controller.signal.aborted) {
+          return;
+        }
+      }
+      // the server ends streams when the token expires, catch up on what was missed while reconnecting
+      if (!controller.signal.aborted) {
+        reconnectTimer = setTimeout(() => {
+          syncRef.current().catch(() => {});
+          connect();
+        }, 3000);
       }
     };
 
-    fetchOperations();
-    fetchOperationTypes();
-    fetchOperationCategories();
-    fetchMembers();
-  }, [budget_manager_id]);
+    connect();
+    return () => {
+      controller.abort();
+      clearTimeout(reconnectTimer);
+    };
+  }, [budget_manager_id, syncToken === null]); // eslint-disable-line react-hooks/exhaustive-deps
 
   const processExpenseIncomeData = (operations) => {
     const dataByMonth = {};
@@ -254,7 +318,7 @@ function BudgetOperations() {
     if (window.confirm(`Are you sure you want to delete the operation "${operation.title}"?`)) {
       try {
         await api.delete(`/budget-managers/${budget_manager_id}/operations/${operation.id}/delete/`);
-        window.location.reload();
+        await syncOperations();
       } catch (error) {
         const errorMessage = error.response?.data?.detail || JSON.stringify(error.response?.data) || error.message;
         setError(`There was an error deleting the operation: ${errorMessage}`);
@@ -295,8 +359,8 @@ function BudgetOperations() {
       } else {
         await api.post(`/budget-managers/${budget_manager_id}/operations/add/`, operationData);
       }
-      setShow(false);
-      window.location.reload(); // Reload the page after adding/editing the operation
+      handleClose();
+      await syncOperations(); // Fetch only the added/edited operation
     } catch (error) {
       const errorMessage = error.response?.data?.detail || JSON.stringify(error.response?.data) || error.message;
       setError(`There was an error ${editMode ? 'editing' : 'creating'} the operation: ${errorMessage}`);
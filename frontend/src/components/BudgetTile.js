@@ -15,7 +15,7 @@ function BudgetTile({ budget, currentUser }) {
   const [newBudgetName, setNewBudgetName] = useState(budget.name);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
-  const [hasPendingRequests, setHasPendingRequests] = useState(false);
+  const [hasPendingRequests, setHasPendingRequests] = useState(budget.pending_access_requests > 0);
   const [accessRequests, setAccessRequests] = useState([]);
   const [members, setMembers] = useState([]);
   const [userRole, setUserRole] = useState('');
@@ -33,22 +33,6 @@ function BudgetTile({ budget, currentUser }) {
     }
   }, [members]);
 
-  useEffect(() => {
-    if (currentUser && currentUser.username === budget.admin.username) {
-      api.get(`/budget-managers/${budget.id}/access-requests/`)
-        .then(response => {
-          const pendingRequests = response.data.filter(request => request.status === 'pending');
-          if (pendingRequests.length > 0) {
-            setHasPendingRequests(true);
-            setAccessRequests(pendingRequests);
-          }
-        })
-        .catch(error => {
-          console.error("There was an error fetching the access requests!", error);
-        });
-    }
-  }, [budget.id, currentUser, budget.admin.username]);
-
   const handleClick = () => {
     navigate(`/budget-managers/${budget.id}/operations`);
   };
@@ -72,9 +56,17 @@ function BudgetTile({ budget, currentUser }) {
 
   const handleEditModalClose = () => setShowEditModal(false);
 
+  // the budget list only carries the number of pending requests, the requests themselves are loaded when the modal opens
   const handleRequestsModalShow = (e) => {
     e.stopPropagation(); // Prevent card click event
-    setShowRequestsModal(true);
+    api.get(`/budget-managers/${budget.id}/access-requests/`)
+      .then(response => {
+        setAccessRequests(response.data.filter(request => request.status === 'pending'));
+        setShowRequestsModal(true);
+      })
+      .catch(error => {
+        console.error("There was an error fetching the access requests!", error);
+      });
   };
 
   const handleRequestsModalClose = () => setShowRequestsModal(false);
@@ -219,6 +211,10 @@ function BudgetTile({ budget, currentUser }) {
               />
             )
           )}
+          <Card.Text className="budget-card-text">
+            Balance: ${parseFloat(budget.balance).toFixed(2)} ({budget.operation_count} operations)
+            {budget.last_activity && <><br />Last activity: {budget.last_activity}</>}
+          </Card.Text>
           <PeopleFill
             onClick={handleMembersModalShow}
             className="budget-card-people"